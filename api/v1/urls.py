@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import users, sfpr
+from .views import users, sfpr, stats, monitoring, async_views
 
 # 创建路由器
 router = DefaultRouter()
@@ -25,6 +26,8 @@ def api_root(request):
             'players': '/api/v1/players/',
             'players_search': '/api/v1/players/search/',
             'records': '/api/v1/records/',
+            'stats_servers': '/api/v1/stats/servers/',
+            'stats_daily': '/api/v1/stats/daily/',
         }
     })
 
@@ -35,4 +38,19 @@ urlpatterns = [
     # JWT 认证
     path('auth/token/', users.CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-] 
\ No newline at end of file
+    # 统计
+    path('stats/servers/', stats.ServerStatsView.as_view(), name='stats-servers'),
+    path('stats/daily/', stats.DailyStatsView.as_view(), name='stats-daily'),
+    # 监控
+    path('monitoring/metrics/', monitoring.MetricsView.as_view(), name='monitoring-metrics'),
+    path('monitoring/profiles/', monitoring.ProfileListView.as_view(), name='monitoring-profiles'),
+    path('monitoring/profiles/<str:profile_id>/', monitoring.ProfileDetailView.as_view(),
+         name='monitoring-profile-detail'),
+    path('monitoring/slow-queries/', monitoring.SlowQueryListView.as_view(), name='monitoring-slow-queries'),
+    path('monitoring/db-pool/', monitoring.DatabasePoolView.as_view(), name='monitoring-db-pool'),
+    path('monitoring/memory/', monitoring.WorkerMemoryView.as_view(), name='monitoring-memory'),
+]
+
+if settings.ASYNC_VIEWS_ENABLED:
+    # 异步实现与同步路由同名同正则，放在路由器之前优先匹配
+    urlpatterns[1:1] = async_views.async_urlpatterns(router.urls)
@@ -0,0 +1,362 @@
+"""
+I/O 密集端点的异步实现
+
+ASYNC_VIEWS_ENABLED 时，async_urlpatterns() 为下列路由生成同名、同正则的异步路由，
+放在同步路由之前优先匹配；ASGI（uvicorn 工作进程）下这些请求不再占用线程：
+缓存与数据库通过 Django 的异步接口访问，发送邮件在线程池中执行。
+
+异步实现只覆盖常见请求，其余情况（非 GET/POST、可浏览 API、MessagePack、?format=、认证失败、
+无效的页码或过滤参数等）交给原同步视图处理，保证响应与同步版本完全一致。
+
+启用响应缓存（API_CACHE_ENABLED）时，列表与搜索只在缓存命中时由异步实现直接返回（包括
+ETag 匹配时的 304），未命中交给同步视图在单飞锁的保护下计算并写入缓存。关闭缓存时异步实现的响应不带验证器。
+
+限流（utils/throttling.py）在进入异步实现前检查一次，转交同步视图时不再重复扣减。
+"""
+import json
+import logging
+import math
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import send_mail
+from django.http import HttpResponse
+from django.urls import re_path
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.sfpr.models import Player, Record
+from apps.sfpr.serializers import (
+    LeanPlayerListSerializer, LeanRecordSerializer, PlayerListSerializer, RecordSerializer,
+)
+from apps.users.authentication import CachedJWTAuthentication
+from apps.users.models import User
+from utils import caching, conditional, throttling
+from utils.middleware import route_label
+
+from . import sfpr, users
+
+logger = logging.getLogger(__name__)
+
+# 与同步视图的默认渲染器（ORJSONRenderer）一致
+_renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+_jwt = CachedJWTAuthentication()
+_throttle = throttling.TokenBucketThrottle()
+_user_view = users.UserViewSet()
+
+
+def _render(data, status_code=status.HTTP_200_OK):
+    """与同步视图输出完全相同的 JSON 响应"""
+    response = HttpResponse(_renderer.render(data), status=status_code, content_type=_renderer.media_type)
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def _authenticate(request):
+    """JWT 认证，结果保存在请求上供限流与 _accepts 共用；未携带令牌返回 None，令牌无效时抛出 APIException"""
+    if not hasattr(request, '_async_auth'):
+        try:
+            request._async_auth = await sync_to_async(_jwt.authenticate)(request)
+        except APIException as exc:
+            request._async_auth = exc
+    if isinstance(request._async_auth, APIException):
+        raise request._async_auth
+    return request._async_auth
+
+
+async def _accepts(request, methods):
+    """请求是否由异步实现处理：方法匹配、要求 JSON 输出、认证（如有）通过"""
+    if request.method not in methods:
+        return False
+    accept = request.headers.get('Accept', '')
+    if 'format' in request.GET or 'text/html' in accept or 'msgpack' in accept:
+        return False
+    if _jwt.get_header(request) is None:
+        return True
+    # 这些端点不区分用户，但与 DRF 一样，携带无效令牌时应返回 401
+    try:
+        await _authenticate(request)
+    except APIException:
+        return False
+    return True
+
+
+async def _throttled(request):
+    """与 TokenBucketThrottle 相同的限流检查，超出预算时返回 429 响应"""
+    try:
+        auth = await _authenticate(request)
+    except APIException:
+        # 令牌无效，由同步视图返回 401
+        return None
+    user = auth[0] if auth else None
+    tier = throttling.user_tier(user)
+    ident = user.pk if user is not None else _throttle.get_ident(request)
+    decision = await throttling.aconsume(route_label(request), ident, tier)
+    if decision is None or decision.allowed:
+        return None
+    exc = Throttled(decision.wait)
+    response = _render({'detail': str(exc.detail)}, exc.status_code)
+    response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def _request_data(request):
+    """解析 JSON 或表单请求体，与 DRF 默认解析器一致；无法解析时返回 None"""
+    if request.content_type == 'application/json':
+        if not request.body:
+            return {}
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        return request.POST
+    return None
+
+
+def _ordering(request, view_class):
+    """与 OrderingFilter 一致：忽略无效字段，没有有效字段时使用默认排序"""
+    param = request.GET.get('ordering')
+    if param:
+        fields = [field.strip() for field in param.split(',')]
+        valid = [field for field in fields if field.lstrip('-') in view_class.ordering_fields]
+        if valid:
+            return valid
+    return view_class.ordering
+
+
+async def _paginate(request, queryset):
+    """
+    与 PageNumberPagination 一致的分页，计数与取数使用异步 ORM
+    返回 (当前页对象, 生成分页响应数据的函数)；页码无效时返回 None
+    """
+    page_size = api_settings.PAGE_SIZE
+    try:
+        number = int(request.GET.get('page') or 1)
+    except ValueError:
+        return None
+    if number < 1:
+        return None
+
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    if number > num_pages:
+        return None
+    offset = (number - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', number + 1) if number < num_pages else None
+    if number == 1:
+        previous_url = None
+    elif number == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', number - 1)
+
+    def paginated(results):
+        return {'count': count, 'next': next_url, 'previous': previous_url, 'results': results}
+
+    return objects, paginated
+
+
+async def _cached(request, namespace, view_class):
+    """
+    读取同步视图写入的缓存，命中时返回响应（验证器匹配时返回 304）
+    缓存启用但响应或验证器未命中时返回 None，由同步视图计算（见模块说明）
+    """
+    tags = [caching.model_tag(model) for model in view_class.cache_models]
+    params = caching.request_params(request)
+    values = await caching.aget(f'{namespace}:validators', params, tags)
+    if values is None:
+        return None
+    etag, last_modified = conditional.make_validators(values, _renderer.media_type)
+    response = conditional.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    data = await caching.aget(namespace, params, tags)
+    if data is None:
+        return None
+    return conditional.set_validators(_render(data), etag, last_modified)
+
+
+async def player_search(request):
+    """PlayerViewSet.search 的异步实现"""
+    if not await _accepts(request, ('GET',)):
+        return None
+    nickname = request.GET.get('nickname')
+    game_id = request.GET.get('game_id', '')
+    server_id = request.GET.get('server', '')
+    if not nickname:
+        return _render({"error": "昵称参数必填"}, status.HTTP_400_BAD_REQUEST)
+    if settings.API_CACHE_ENABLED:
+        return await _cached(request, 'player-search', sfpr.PlayerViewSet)
+
+    queryset = sfpr.PlayerViewSet.queryset.filter(nickname=nickname)
+    if game_id:
+        queryset = queryset.filter(game_id=game_id)
+    if server_id:
+        queryset = queryset.filter(server=server_id)
+    queryset = queryset.order_by(*sfpr.PlayerViewSet.ordering)
+
+    if settings.LEAN_SERIALIZERS_ENABLED:
+        serializer = LeanPlayerListSerializer()
+        queryset = serializer.prepare(queryset)
+    page = await _paginate(request, queryset)
+    if page is None:
+        return None
+    objects, paginated = page
+    if settings.LEAN_SERIALIZERS_ENABLED:
+        return _render(paginated(serializer.serialize(objects)))
+    return _render(paginated(PlayerListSerializer(objects, many=True).data))
+
+
+async def record_list(request):
+    """RecordViewSet.list 的异步实现，支持 player、status 过滤与 ordering 排序"""
+    if not await _accepts(request, ('GET',)):
+        return None
+    if settings.API_CACHE_ENABLED:
+        return await _cached(request, 'record-list', sfpr.RecordViewSet)
+    queryset = sfpr.RecordViewSet.queryset.all()
+
+    record_status = request.GET.get('status')
+    if record_status:
+        if record_status not in dict(Record.STATUS_CHOICES):
+            return None
+        queryset = queryset.filter(status=record_status)
+
+    player_id = request.GET.get('player')
+    if player_id:
+        # 与 ModelChoiceFilter 一样先确认玩家存在，否则由同步视图返回 400
+        try:
+            player_id = uuid.UUID(player_id)
+        except ValueError:
+            return None
+        if not await Player.objects.filter(pk=player_id).aexists():
+            return None
+        queryset = queryset.filter(player_id=player_id)
+
+    queryset = queryset.order_by(*_ordering(request, sfpr.RecordViewSet))
+    if settings.LEAN_SERIALIZERS_ENABLED:
+        serializer = LeanRecordSerializer(context={'request': request})
+        queryset = serializer.prepare(queryset)
+    page = await _paginate(request, queryset)
+    if page is None:
+        return None
+    objects, paginated = page
+    if settings.LEAN_SERIALIZERS_ENABLED:
+        return _render(paginated(serializer.serialize(objects)))
+    serializer = RecordSerializer(objects, many=True, context={'request': request})
+    return _render(paginated(serializer.data))
+
+
+async def users_config(request):
+    """UserViewSet.config 的异步实现"""
+    if not await _accepts(request, ('GET',)):
+        return None
+    return _render({'require_invitation_code': settings.REQUIRE_INVITATION_CODE})
+
+
+async def send_verify_code(request):
+    """UserViewSet.send_verify_code 的异步实现：SMTP 发送在线程池中进行，不占用事件循环"""
+    if not await _accepts(request, ('POST',)):
+        return None
+    data = _request_data(request)
+    if data is None:
+        return None
+
+    email = data.get('email')
+    if not email:
+        return _render({'error': '请提供邮箱地址'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if await User.objects.filter(email=email).aexists():
+            return _render({'error': '该邮箱已被注册'}, status.HTTP_400_BAD_REQUEST)
+    except Exception:
+        logger.exception('检查邮箱是否存在时出错')
+        return _render({'error': '系统错误，请稍后重试'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    decision = await throttling.aconsume('verify-code-email', email)
+    if decision is not None and not decision.allowed:
+        response = _render({'error': '发送太频繁，请稍后再试'}, status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = throttling.retry_after(decision)
+        return response
+
+    verify_code = _user_view._generate_verify_code()
+    try:
+        html_message, plain_message = users.render_verify_code_email(verify_code)
+    except Exception:
+        logger.exception('准备邮件内容时出错')
+        return _render({'error': '系统错误，请稍后重试'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        await sync_to_async(send_mail, thread_sensitive=False)(
+            subject=users.VERIFY_CODE_SUBJECT,
+            message=plain_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[email],
+            html_message=html_message,
+            fail_silently=False,
+        )
+        logger.info('验证码已发送至: %s', email)
+    except Exception as e:
+        logger.error('发送邮件失败: %s', e)
+        message, status_code = users.verify_code_mail_error(e)
+        return _render({'error': message}, status_code)
+
+    try:
+        code_key = _user_view._get_verify_code_cache_key(email)
+        await cache.aset(code_key, verify_code, timeout=60 * 10)
+    except Exception:
+        logger.exception('保存验证码到缓存时出错')
+        return _render({'error': '系统错误，请稍后重试'}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return _render({'message': '验证码发送成功'})
+
+
+# 路由名称 -> 异步实现
+ASYNC_HANDLERS = {
+    'player-search': player_search,
+    'record-list': record_list,
+    'user-config': users_config,
+    'user-send-verify-code': send_verify_code,
+}
+
+
+def as_view(handler, fallback):
+    """把异步实现包装成视图：返回 None 时交给同步视图 fallback 处理"""
+    sync_fallback = sync_to_async(fallback)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        response = await _throttled(request)
+        if response is not None:
+            return response
+        # 交给同步视图处理时不再重复限流
+        request.throttle_checked = True
+        response = await handler(request, *args, **kwargs)
+        if response is None:
+            response = await sync_fallback(request, *args, **kwargs)
+        return response
+
+    view.__name__ = view.__qualname__ = handler.__name__
+    view.__doc__ = handler.__doc__
+    return view
+
+
+def async_urlpatterns(sync_patterns):
+    """为 sync_patterns（如 router.urls）中有异步实现的路由生成同名、同正则的异步路由"""
+    patterns = []
+    for pattern in sync_patterns:
+        handler = ASYNC_HANDLERS.get(pattern.name)
+        # 跳过 .json 等格式后缀路由，交给同步视图
+        if handler is None or 'format' in pattern.pattern.regex.groupindex:
+            continue
+        patterns.append(re_path(pattern.pattern.regex.pattern, as_view(handler, pattern.callback), name=pattern.name))
+    return patterns
@@ -0,0 +1,165 @@
+import hmac
+import os
+
+from django.conf import settings
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions, status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.users.permissions import IsSuperUser
+from utils import memory, profiling, slow_queries, tasks
+from utils.database import pool_stats
+from utils.metrics import estimate_quantile, registry, render_prometheus
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """
+    持有抓取令牌（X-Metrics-Token 头）的请求可以访问
+    未配置 METRICS_SCRAPE_TOKEN 时不放行任何请求
+    """
+    def has_permission(self, request, view):
+        expected = settings.METRICS_SCRAPE_TOKEN
+        provided = request.headers.get('X-Metrics-Token', '')
+        return bool(expected) and hmac.compare_digest(provided, expected)
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, list):
+            return render_prometheus(data).encode(self.charset)
+        # 错误信息（如 403）
+        return str(data).encode(self.charset)
+
+
+class FoldedStacksRenderer(BaseRenderer):
+    """输出折叠栈文本，可直接导入 speedscope 或 flamegraph.pl"""
+    media_type = 'text/plain'
+    format = 'folded'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'folded' in data:
+            return data['folded'].encode(self.charset)
+        return str(data).encode(self.charset)
+
+
+class MetricsView(APIView):
+    """
+    指标抓取端点
+
+    默认输出 Prometheus 文本格式；?format=json 返回 JSON，
+    并附带每个直方图序列估算的 p50/p95/p99。Celery 队列积压在抓取时从 broker 读取。
+    """
+    permission_classes = [HasMetricsToken | IsSuperUser]
+    renderer_classes = [PrometheusRenderer, JSONRenderer]
+
+    @swagger_auto_schema(
+        operation_summary="指标抓取",
+        operation_description="汇总所有工作进程的指标，需要超级管理员权限或 X-Metrics-Token 头",
+    )
+    def get(self, request):
+        snapshot = registry.snapshot()
+        queue_depth = tasks.queue_depth_metric()
+        if queue_depth is not None:
+            snapshot.append(queue_depth)
+        if request.accepted_renderer.format == 'json':
+            for metric in snapshot:
+                if metric['type'] != 'histogram':
+                    continue
+                for sample in metric['samples']:
+                    for quantile in (0.5, 0.95, 0.99):
+                        sample[f'p{int(quantile * 100)}'] = estimate_quantile(quantile, sample['buckets'])
+                    sample['buckets'] = [
+                        ['+Inf' if bound == float('inf') else bound, count]
+                        for bound, count in sample['buckets']
+                    ]
+        return Response(snapshot)
+
+
+class ProfileListView(APIView):
+    """最近的请求分析记录"""
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    @swagger_auto_schema(
+        operation_summary="请求分析列表",
+        operation_description="返回最近的请求分析摘要，需要超级管理员权限",
+    )
+    def get(self, request):
+        return Response(profiling.recent_profiles())
+
+
+class ProfileDetailView(APIView):
+    """
+    单个请求的分析结果
+    默认返回 JSON（调用树、折叠栈或函数耗时表）；?format=folded 返回折叠栈文本
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+    renderer_classes = [JSONRenderer, FoldedStacksRenderer]
+
+    @swagger_auto_schema(
+        operation_summary="请求分析详情",
+        operation_description="按请求 ID 返回分析结果，需要超级管理员权限",
+    )
+    def get(self, request, profile_id):
+        data = profiling.get_profile(profile_id)
+        if data is None:
+            return Response({'error': '分析记录不存在或已过期'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+
+class SlowQueryListView(APIView):
+    """
+    慢查询环形缓冲
+    可选参数 route（路由名称）与 flag（执行计划标记前缀，如 seq_scan 或 sort:sfpr_player）
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    @swagger_auto_schema(
+        operation_summary="慢查询列表",
+        operation_description="返回最近捕获的慢查询及其执行计划，需要超级管理员权限",
+    )
+    def get(self, request):
+        return Response(slow_queries.recent_slow_queries(
+            route=request.query_params.get('route'),
+            flag=request.query_params.get('flag'),
+        ))
+
+
+class DatabasePoolView(APIView):
+    """
+    数据库连接状态
+    返回处理本次请求的工作进程中各数据库别名的连接模式与连接池状态
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    @swagger_auto_schema(
+        operation_summary="数据库连接池状态",
+        operation_description="返回当前工作进程的连接模式、池大小、可用连接数与排队情况，需要超级管理员权限",
+    )
+    def get(self, request):
+        return Response(pool_stats())
+
+
+class WorkerMemoryView(APIView):
+    """
+    工作进程内存
+    返回各工作进程最近一次上报的 RSS/PSS/USS（字节），以及处理本次请求的进程的实时数据
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    @swagger_auto_schema(
+        operation_summary="工作进程内存",
+        operation_description="返回各工作进程的常驻内存、按比例分摊内存与独占内存，需要超级管理员权限",
+    )
+    def get(self, request):
+        return Response({
+            'current': dict(memory.process_memory(), pid=os.getpid()),
+            'max_memory_mb': settings.WORKER_MAX_MEMORY_MB,
+            'workers': memory.worker_reports(),
+        })
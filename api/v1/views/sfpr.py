@@ -1,4 +1,6 @@
-from django.db.models import Q, Count
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Count, Max, Prefetch
 import logging
 from rest_framework import viewsets, status, filters, permissions
 from rest_framework.decorators import action
@@ -10,17 +12,52 @@ from apps.sfpr.serializers import (
     PlayerCreateSerializer, 
     PlayerListSerializer, 
     PlayerDetailSerializer,
-    RecordSerializer
+    RecordSerializer,
+    LeanPlayerListSerializer,
+    LeanRecordSerializer,
 )
 from apps.sfpr.permissions import IsAuthenticatedForCreate, IsRecordOwnerOrReadOnly
+from apps.users.models import User
+from utils.caching import CachedResponseMixin
+from utils.conditional import ConditionalResponseMixin
 
 # 获取logger
 logger = logging.getLogger(__name__)
 
 
-class PlayerViewSet(viewsets.ModelViewSet):
+def _aggregate_values(queryset, **aggregates):
+    """条件请求的验证器：按给定顺序返回聚合值"""
+    return list(queryset.aggregate(**aggregates).values())
+
+
+def _filter_by_pk(queryset, pk):
+    """按 URL 中的主键过滤；主键格式无效时返回 None，由 get_object 返回 404"""
+    try:
+        return queryset.filter(pk=pk)
+    except (TypeError, ValueError, ValidationError):
+        return None
+
+
+class LeanListMixin:
+    """列表接口在 LEAN_SERIALIZERS_ENABLED 时使用精简序列化器，输出与完整序列化器一致"""
+
+    def lean_list(self, queryset, serializer_class):
+        serializer = serializer_class(context=self.get_serializer_context())
+        rows = serializer.prepare(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+
+class PlayerViewSet(ConditionalResponseMixin, CachedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """玩家视图集"""
-    queryset = Player.objects.all().annotate(records_count=Count('records'))
+    # 列表与搜索结果的缓存依赖玩家与记录（records_count）
+    cache_models = (Player, Record)
+    # records_count 只统计已发布的记录，与列表展示一致
+    queryset = Player.objects.all().annotate(
+        records_count=Count('records', filter=Q(records__status='approved'))
+    )
     permission_classes = [IsAuthenticatedForCreate]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['server']
@@ -35,30 +72,100 @@ class PlayerViewSet(viewsets.ModelViewSet):
             return PlayerDetailSerializer
         return PlayerListSerializer
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # 详情页一次性预取记录及其提交者
+            queryset = queryset.prefetch_related(
+                Prefetch('records', queryset=Record.objects.select_related('submitter'))
+            )
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            'player-list',
+            lambda: self.list_validators(self.filter_queryset(self.validator_queryset())),
+            lambda: self.cached_response('player-list', lambda: self.uncached_list(request, *args, **kwargs)),
+        )
+
+    def uncached_list(self, request, *args, **kwargs):
+        if not settings.LEAN_SERIALIZERS_ENABLED:
+            return super().list(request, *args, **kwargs)
+        return self.lean_list(self.filter_queryset(self.get_queryset()), LeanPlayerListSerializer)
+
+    def validator_queryset(self):
+        """计算验证器用的玩家查询集：只有按 records_count 排序时才需要注解记录数"""
+        if 'records_count' in self.request.query_params.get(filters.OrderingFilter.ordering_param, ''):
+            return self.get_queryset()
+        return Player.objects.all()
+
+    def list_validators(self, queryset):
+        """
+        列表与搜索的验证器：总数、当前页玩家的主键、更新时间与查看次数，以及这些玩家的记录
+        （records_count 随记录变化）。与列表使用相同的排序与分页，只统计当前页玩家的记录
+        """
+        rows = queryset.values_list('pk', 'updated_at', 'views_count')
+        if self.paginator is not None:
+            rows = self.paginator.paginate_queryset(rows, self.request, view=self)
+            count = self.paginator.page.paginator.count
+        else:
+            rows = list(rows)
+            count = len(rows)
+        pks = [pk for pk, _, _ in rows]
+        updated = max((updated_at for _, updated_at, _ in rows), default=None)
+        page = [[str(pk), views_count] for pk, _, views_count in rows]
+        return [count, updated, page] + _aggregate_values(
+            Record.objects.filter(player__in=pks), records_updated=Max('updated_at'), records=Count('pk'),
+        )
+    
     def create(self, request, *args, **kwargs):
         """创建玩家"""
-        logger.info(f"接收到创建玩家请求，数据: {request.data}")
-        
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            logger.error(f"数据验证失败: {serializer.errors}")
+            logger.error("数据验证失败: %s", serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
             player = serializer.save()
-            logger.info(f"玩家创建成功，玩家ID: {player.id}")
+            logger.info("玩家创建成功，玩家ID: %s", player.id)
             headers = self.get_success_headers(serializer.data)
             return Response(PlayerDetailSerializer(player).data, status=status.HTTP_201_CREATED, headers=headers)
         except Exception as e:
-            logger.exception(f"创建玩家时发生异常: {str(e)}")
+            logger.exception("创建玩家时发生异常: %s", e)
             return Response({"detail": f"创建失败: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        # 304 时不取出玩家，但同样计入查看次数
+        return self.conditional_response(
+            'player-detail',
+            lambda: self.detail_validators(pk),
+            lambda: self.uncached_retrieve(request),
+            models=(Player, Record, User),
+            on_not_modified=lambda: Player.add_view(pk),
+        )
+
+    def uncached_retrieve(self, request):
         instance = self.get_object()
         # 增加查看次数
         instance.increment_views()
         serializer = self.get_serializer(instance, context={'request': request})
         return Response(serializer.data)
+
+    def detail_validators(self, pk):
+        """详情的验证器：玩家、其记录与记录提交者的最大更新时间，记录数与查看次数"""
+        players = _filter_by_pk(Player.objects.all(), pk)
+        if players is None:
+            return None
+        values = _aggregate_values(
+            players,
+            updated=Max('updated_at'),
+            views=Max('views_count'),
+            records_updated=Max('records__updated_at'),
+            submitters_updated=Max('records__submitter__updated_at'),
+            records=Count('records'),
+        )
+        return values if values[0] is not None else None
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -78,13 +185,25 @@ class PlayerViewSet(viewsets.ModelViewSet):
             )
         
         # 使用精确查询而不是模糊查询
-        queryset = self.get_queryset().filter(nickname=nickname)
+        lookups = {'nickname': nickname}
         
         if game_id:
-            queryset = queryset.filter(game_id=game_id)
+            lookups['game_id'] = game_id
         
         if server_id:
-            queryset = queryset.filter(server=server_id)
+            lookups['server'] = server_id
+        
+        # 分页需要确定的顺序，验证器与结果使用同一排序
+        queryset = self.get_queryset().filter(**lookups).order_by(*self.ordering)
+        return self.conditional_response(
+            'player-search',
+            lambda: self.list_validators(Player.objects.filter(**lookups).order_by(*self.ordering)),
+            lambda: self.cached_response('player-search', lambda: self.search_response(queryset)),
+        )
+
+    def search_response(self, queryset):
+        if settings.LEAN_SERIALIZERS_ENABLED:
+            return self.lean_list(queryset, LeanPlayerListSerializer)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -138,18 +257,20 @@ class PlayerViewSet(viewsets.ModelViewSet):
                 # 如果有图片，保存记录
                 if has_images:
                     record.save()
-                    logger.info(f"为记录 {record.id} 保存了图片")
+                    logger.info("为记录 %s 保存了图片", record.id)
             
-            logger.info(f"为玩家 {player.id} 添加神人事迹记录成功，记录ID: {record.id}")
+            logger.info("为玩家 %s 添加神人事迹记录成功，记录ID: %s", player.id, record.id)
             return Response(RecordSerializer(record, context={'request': request}).data, status=status.HTTP_201_CREATED)
         except Exception as e:
-            logger.exception(f"添加神人事迹记录时发生异常: {str(e)}")
+            logger.exception("添加神人事迹记录时发生异常: %s", e)
             return Response({"detail": f"添加失败: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class RecordViewSet(viewsets.ModelViewSet):
+class RecordViewSet(ConditionalResponseMixin, CachedResponseMixin, LeanListMixin, viewsets.ModelViewSet):
     """神人事迹记录视图集"""
-    queryset = Record.objects.all()
+    # 列表缓存依赖记录、玩家与提交者（用户名）
+    cache_models = (Record, Player, User)
+    queryset = Record.objects.select_related('player', 'submitter')
     serializer_class = RecordSerializer
     permission_classes = [IsAuthenticatedForCreate, IsRecordOwnerOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -164,24 +285,63 @@ class RecordViewSet(viewsets.ModelViewSet):
         context = super().get_serializer_context()
         return context
     
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            'record-list',
+            lambda: self.record_validators(DjangoFilterBackend().filter_queryset(request, Record.objects.all(), self)),
+            lambda: self.cached_response('record-list', lambda: self.uncached_list(request, *args, **kwargs)),
+        )
+
+    def uncached_list(self, request, *args, **kwargs):
+        if not settings.LEAN_SERIALIZERS_ENABLED:
+            return super().list(request, *args, **kwargs)
+        return self.lean_list(self.filter_queryset(self.get_queryset()), LeanRecordSerializer)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+
+        def validators():
+            records = _filter_by_pk(Record.objects.all(), pk)
+            if records is None:
+                return None
+            values = self.record_validators(records)
+            return values if values[1] else None
+
+        return self.conditional_response(
+            'record-detail', validators, lambda: super(RecordViewSet, self).retrieve(request, *args, **kwargs),
+        )
+
+    def record_validators(self, records):
+        """记录的验证器：记录、所属玩家与提交者的最大更新时间，以及记录数"""
+        return _aggregate_values(
+            records,
+            updated=Max('updated_at'),
+            count=Count('pk'),
+            players_updated=Max('player__updated_at'),
+            submitters_updated=Max('submitter__updated_at'),
+        )
+    
     @action(detail=False, methods=['get'], url_path='my-records')
     def my_records(self, request):
         """获取当前用户的投稿记录"""
-        logger.info(f"接收到获取投稿记录请求，用户: {request.user}")
-        
         if not request.user.is_authenticated:
-            logger.warning(f"未登录用户尝试访问投稿记录")
+            logger.warning("未登录用户尝试访问投稿记录")
             return Response(
                 {"error": "未登录用户无法查看投稿记录"}, 
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
         # 获取用户的所有投稿记录
-        queryset = self.get_queryset().filter(submitter=request.user)
-        logger.info(f"用户 {request.user} 的投稿记录数量: {queryset.count()}")
-        
-        # 包含玩家信息
-        queryset = queryset.select_related('player')
+        return self.conditional_response(
+            'record-my-records',
+            lambda: self.record_validators(Record.objects.filter(submitter=request.user)),
+            lambda: self.my_records_response(self.get_queryset().filter(submitter=request.user)),
+            params=[request.user.pk],
+        )
+
+    def my_records_response(self, queryset):
+        if settings.LEAN_SERIALIZERS_ENABLED:
+            return self.lean_list(queryset, LeanRecordSerializer)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -0,0 +1,113 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.sfpr.models import DailyServerStats, ServerStats, get_server_name
+from apps.sfpr.stats import DAILY_COLUMNS, SERVER_COLUMNS
+
+server_param = openapi.Parameter('server', openapi.IN_QUERY, description='服务器ID', type=openapi.TYPE_INTEGER)
+
+
+def _server_filter(request):
+    """?server= 参数，未指定时返回 None；格式无效时抛出 ValueError"""
+    server = request.query_params.get('server')
+    return int(server) if server else None
+
+
+def _totals(rows, columns):
+    return {column: sum(row[column] for row in rows) for column in columns}
+
+
+class ServerStatsView(APIView):
+    """
+    按服务器的统计：玩家数、各状态的记录数（records_pending 即待审核积压）
+    读取增量维护的汇总表，不统计玩家与记录表
+    """
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="服务器统计",
+        operation_description="各服务器的玩家数与各状态的记录数，totals 为所有服务器的合计",
+        manual_parameters=[server_param],
+    )
+    def get(self, request):
+        try:
+            server = _server_filter(request)
+        except ValueError:
+            return Response({"error": "服务器ID无效"}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = ServerStats.objects.all()
+        if server is not None:
+            queryset = queryset.filter(server=server)
+        rows = list(queryset.values('server', *SERVER_COLUMNS, 'updated_at'))
+        for row in rows:
+            row['server_name'] = get_server_name(row['server'])
+        return Response({'results': rows, 'totals': _totals(rows, SERVER_COLUMNS)})
+
+
+class DailyStatsView(APIView):
+    """
+    按天的统计：当天新增的玩家数，以及当天创建的记录按当前状态的数量
+    默认返回最近 STATS_DEFAULT_DAYS 天，每个 (日期, 服务器) 一行；group=day 时合并所有服务器
+    """
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="每日统计",
+        operation_description="按日期范围查询（含首尾两天），没有数据的日期不返回",
+        manual_parameters=[
+            openapi.Parameter('from', openapi.IN_QUERY, description='开始日期 YYYY-MM-DD',
+                              type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            openapi.Parameter('to', openapi.IN_QUERY, description='结束日期 YYYY-MM-DD，默认今天',
+                              type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+            server_param,
+            openapi.Parameter('group', openapi.IN_QUERY, description='day：合并所有服务器',
+                              type=openapi.TYPE_STRING, enum=['server', 'day']),
+        ],
+    )
+    def get(self, request):
+        params = request.query_params
+        try:
+            end = parse_date(params['to']) if params.get('to') else timezone.localdate()
+            start = (
+                parse_date(params['from']) if params.get('from')
+                else end - datetime.timedelta(days=settings.STATS_DEFAULT_DAYS - 1)
+            )
+            server = _server_filter(request)
+        except ValueError:
+            start = None
+        if start is None or end is None:
+            return Response({"error": "日期格式应为 YYYY-MM-DD，服务器ID应为整数"}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({"error": "开始日期不能晚于结束日期"}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= settings.STATS_MAX_DAYS:
+            return Response(
+                {"error": f"查询范围不能超过 {settings.STATS_MAX_DAYS} 天"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = DailyServerStats.objects.filter(date__range=(start, end))
+        if server is not None:
+            queryset = queryset.filter(server=server)
+        if params.get('group') == 'day':
+            rows = list(
+                queryset.values('date')
+                .annotate(**{column: Sum(column) for column in DAILY_COLUMNS})
+                .order_by('date')
+            )
+        else:
+            rows = list(queryset.values('date', 'server', *DAILY_COLUMNS).order_by('date', 'server'))
+            for row in rows:
+                row['server_name'] = get_server_name(row['server'])
+        return Response({
+            'from': start,
+            'to': end,
+            'results': rows,
+            'totals': _totals(rows, DAILY_COLUMNS),
+        })
@@ -1,6 +1,7 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.mail import send_mail
@@ -8,15 +9,14 @@ from django.core.cache import cache
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from django.db.models import Q
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import random
 import logging
 import time
-import os
 
 from apps.users.models import User, BlacklistedUser, InvitationCode
+from apps.users.tasks import delete_user_account
 from apps.users.serializers import (
     EmailRegisterSerializer,
     UserProfileSerializer,
@@ -27,12 +27,36 @@ from apps.users.serializers import (
     ResetPasswordSerializer,
     InvitationCodeSerializer,
     CreateInvitationCodeSerializer,
+    BulkCreateInvitationCodeSerializer,
 )
 from apps.users.permissions import IsSuperUser
-from apps.users.pagination import StandardResultsSetPagination
+from apps.users.pagination import DirectoryPagination, StandardResultsSetPagination
+from utils import throttling
 from django.views.generic import TemplateView
 from rest_framework.permissions import AllowAny
 
+VERIFY_CODE_SUBJECT = '斗魂单排队友评鉴指南 - 邮箱验证码'
+
+
+def render_verify_code_email(verify_code):
+    """注册验证码邮件内容，返回 (HTML, 纯文本)"""
+    html_message = render_to_string('users/verify_code_email.html', {
+        'verify_code': verify_code,
+        'valid_minutes': 10
+    })
+    return html_message, strip_tags(html_message)
+
+
+def verify_code_mail_error(error):
+    """根据发送邮件的异常返回 (错误信息, 状态码)"""
+    error_message = str(error).lower()
+    if "smtp" in error_message:
+        if "recipient address rejected" in error_message:
+            return '邮箱地址不存在，请检查后重试', status.HTTP_400_BAD_REQUEST
+        return '邮件发送失败，请稍后重试', status.HTTP_500_INTERNAL_SERVER_ERROR
+    return '邮件发送失败，请检查邮箱地址是否正确', status.HTTP_400_BAD_REQUEST
+
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
@@ -46,6 +70,13 @@ class UserViewSet(viewsets.GenericViewSet):
     permission_classes = [permissions.AllowAny]
     pagination_class = StandardResultsSetPagination
 
+    @property
+    def paginator(self):
+        # 用户目录不做全表精确计数
+        if self.action == 'list' and not hasattr(self, '_paginator'):
+            self._paginator = DirectoryPagination()
+        return super().paginator
+
     def get_serializer_class(self):
         if self.action == 'register_email':
             return EmailRegisterSerializer
@@ -57,12 +88,14 @@ class UserViewSet(viewsets.GenericViewSet):
             return DeleteAccountSerializer
         elif self.action == 'create_invitation':
             return CreateInvitationCodeSerializer
+        elif self.action == 'bulk_create_invitations':
+            return BulkCreateInvitationCodeSerializer
         elif self.action == 'list_invitations':
             return InvitationCodeSerializer
         return EmailRegisterSerializer
 
     def get_permissions(self):
-        if self.action in ['ban', 'list', 'create_invitation', 'list_invitations']:
+        if self.action in ['ban', 'list', 'create_invitation', 'bulk_create_invitations', 'list_invitations']:
             permission_classes = [permissions.IsAuthenticated, IsSuperUser]
         else:
             permission_classes = [permissions.AllowAny]
@@ -76,10 +109,6 @@ class UserViewSet(viewsets.GenericViewSet):
         """获取验证码缓存键"""
         return f'email_verify_code_{email}'
 
-    def _get_verify_code_limit_cache_key(self, email):
-        """获取验证码发送频率限制缓存键"""
-        return f'email_verify_code_limit_{email}'
-
     @swagger_auto_schema(
         operation_summary="邮箱注册",
         operation_description="使用邮箱注册新用户，需要提供邮箱、密码和验证码",
@@ -116,14 +145,21 @@ class UserViewSet(viewsets.GenericViewSet):
         
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
-            logger.error(f"注册数据验证失败: {serializer.errors}")
+            logger.error("注册数据验证失败: %s", serializer.errors)
             return Response(
                 {'error': serializer.errors},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user = serializer.save()
-        logger.info(f"用户注册成功: {user.email}")
+        try:
+            user = serializer.save()
+        except ValidationError as e:
+            logger.warning("注册失败: %s", e.detail)
+            return Response(
+                {'error': e.detail},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        logger.info("用户注册成功: %s", user.email)
         
         # 生成 JWT token
         refresh = RefreshToken.for_user(user)
@@ -175,39 +211,29 @@ class UserViewSet(viewsets.GenericViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         except Exception as e:
-            logger.error(f"检查邮箱是否存在时出错: {str(e)}")
+            logger.error("检查邮箱是否存在时出错: %s", e)
             return Response(
                 {'error': '系统错误，请稍后重试'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # 3. 检查发送频率限制
-        limit_key = self._get_verify_code_limit_cache_key(email)
-        try:
-            if cache.get(limit_key):
-                return Response(
-                    {'error': '发送太频繁，请稍后再试'}, 
-                    status=status.HTTP_429_TOO_MANY_REQUESTS
-                )
-        except Exception as e:
-            logger.error(f"检查发送频率限制时出错: {str(e)}")
+        # 3. 检查发送频率限制（同一邮箱）
+        decision = throttling.consume('verify-code-email', email)
+        if decision is not None and not decision.allowed:
             return Response(
-                {'error': '系统错误，请稍后重试'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': '发送太频繁，请稍后再试'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': throttling.retry_after(decision)}
             )
-            
+
         # 4. 生成验证码
         verify_code = self._generate_verify_code()
         
         # 5. 准备邮件内容
         try:
-            html_message = render_to_string('users/verify_code_email.html', {
-                'verify_code': verify_code,
-                'valid_minutes': 10
-            })
-            plain_message = strip_tags(html_message)
+            html_message, plain_message = render_verify_code_email(verify_code)
         except Exception as e:
-            logger.error(f"准备邮件内容时出错: {str(e)}")
+            logger.error("准备邮件内容时出错: %s", e)
             return Response(
                 {'error': '系统错误，请稍后重试'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -216,41 +242,26 @@ class UserViewSet(viewsets.GenericViewSet):
         # 6. 发送邮件
         try:
             send_mail(
-                subject='斗魂单排队友评鉴指南 - 邮箱验证码',
+                subject=VERIFY_CODE_SUBJECT,
                 message=plain_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[email],
                 html_message=html_message,
                 fail_silently=False,
             )
-            logger.info(f"验证码已发送至: {email}")
+            logger.info("验证码已发送至: %s", email)
         except Exception as e:
-            logger.error(f"发送邮件失败: {str(e)}")
+            logger.error("发送邮件失败: %s", e)
             # 根据错误类型返回更具体的错误信息
-            error_message = str(e).lower()
-            if "smtp" in error_message:
-                if "recipient address rejected" in error_message:
-                    return Response(
-                        {'error': '邮箱地址不存在，请检查后重试'}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                else:
-                    return Response(
-                        {'error': '邮件发送失败，请稍后重试'}, 
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-            return Response(
-                {'error': '邮件发送失败，请检查邮箱地址是否正确'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            message, status_code = verify_code_mail_error(e)
+            return Response({'error': message}, status=status_code)
             
         # 7. 保存验证码到缓存
         try:
             code_key = self._get_verify_code_cache_key(email)
             cache.set(code_key, verify_code, timeout=60 * 10)  # 10分钟有效期
-            cache.set(limit_key, 1, timeout=60)  # 1分钟内不能重复发送
         except Exception as e:
-            logger.error(f"保存验证码到缓存时出错: {str(e)}")
+            logger.error("保存验证码到缓存时出错: %s", e)
             return Response(
                 {'error': '系统错误，请稍后重试'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -403,12 +414,15 @@ class UserViewSet(viewsets.GenericViewSet):
 
     @swagger_auto_schema(
         operation_summary="获取用户列表",
-        operation_description="获取用户列表，支持搜索功能",
+        operation_description=(
+            "获取用户列表，支持按 UID 前缀、用户名前缀、邮箱或 @域名 搜索；"
+            "超过 USER_DIRECTORY_COUNT_CAP 时 count 为估计值（未搜索）或该上限（搜索）"
+        ),
         manual_parameters=[
             openapi.Parameter(
                 'search',
                 openapi.IN_QUERY,
-                description="搜索关键词(UID、用户名或邮箱)",
+                description="搜索关键词(UID/UID前缀、用户名前缀、完整邮箱或 @域名)",
                 type=openapi.TYPE_STRING,
                 required=False
             )
@@ -420,18 +434,16 @@ class UserViewSet(viewsets.GenericViewSet):
     )
     def list(self, request):
         """获取用户列表（不包括超级用户）"""
-        search = request.query_params.get('search', '')
+        search = request.query_params.get('search', '').strip()
         
-        # 基础查询：过滤掉超级用户
-        queryset = self.get_queryset().filter(is_superuser=False)
-        
-        # 如果有搜索关键词，添加搜索条件
+        # 如果有搜索关键词，按关键词类型走对应的索引查询
         if search:
-            queryset = queryset.filter(
-                Q(uid__icontains=search) |
-                Q(username__icontains=search) |
-                Q(email__icontains=search)
-            )
+            queryset = User.objects.directory_search(search)
+        else:
+            queryset = self.get_queryset()
+        
+        # 过滤掉超级用户
+        queryset = queryset.filter(is_superuser=False)
             
         # 使用分页
         page = self.paginate_queryset(queryset)
@@ -474,10 +486,9 @@ class UserViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def blacklist(self, request):
         """拉黑用户"""
-        print("收到拉黑请求，数据:", request.data)
         serializer = BlacklistedUserSerializer(data=request.data, context={'request': request})
         if not serializer.is_valid():
-            print("序列化器验证失败:", serializer.errors)
+            logging.getLogger('utils.middleware').warning("拉黑请求验证失败: %s", serializer.errors)
             return Response(
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
@@ -582,10 +593,10 @@ class UserViewSet(viewsets.GenericViewSet):
 
     @swagger_auto_schema(
         operation_summary="删除账号",
-        operation_description="永久删除当前用户账号，需要提供密码确认",
+        operation_description="停用当前用户账号并在后台删除账号数据，需要提供密码确认",
         request_body=DeleteAccountSerializer,
         responses={
-            204: "账号删除成功",
+            202: "账号已停用，数据将在后台删除",
             400: "密码错误",
             500: "服务器内部错误"
         }
@@ -600,30 +611,39 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        logger = logging.getLogger('utils.middleware')
+        user = request.user
         try:
-            user = request.user
-            # 1. 删除用户头像
-            if user.avatar:
-                if os.path.isfile(user.avatar.path):
-                    os.remove(user.avatar.path)
-            
-            # 2. 删除用户的黑名单记录
-            BlacklistedUser.objects.filter(
-                Q(user=user) | Q(blocked_user=user)
-            ).delete()
-            
-            # 3. 最后删除用户账号
-            user.delete()
-            
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        
+            # 1. 先停用账号，使其立即无法登录
+            user.is_active = False
+            user.save()
         except Exception as e:
-            logger = logging.getLogger('utils.middleware')
-            logger.error(f"删除账号失败: {str(e)}")
+            logger.error("停用账号失败: %s", e)
             return Response(
                 {'error': '删除账号失败，请稍后重试'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        # 2. 关联数据、头像文件和账号本身交给后台任务分批删除
+        try:
+            task_id = delete_user_account.delay(user.pk).id
+        except Exception as e:
+            # 任务队列不可用时退回到在请求内删除
+            logger.error("提交删除账号任务失败，改为同步删除: %s", e)
+            # apply() 把异常记录在结果中而不是抛出
+            result = delete_user_account.apply(args=[user.pk], throw=False)
+            if result.failed():
+                logger.error("同步删除账号 %s 失败，账号保持停用，需重新执行删除: %r", user.uid, result.result)
+                return Response(
+                    {'error': '删除账号失败，请稍后重试'},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            task_id = result.id
+        
+        return Response(
+            {'message': '账号已停用，数据将在后台删除', 'task_id': task_id},
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @swagger_auto_schema(
         operation_summary="发送重置密码验证码",
@@ -660,19 +680,19 @@ class UserViewSet(viewsets.GenericViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 检查发送频率限制
-        limit_key = self._get_verify_code_limit_cache_key(email)
-        if cache.get(limit_key):
+        # 检查发送频率限制（与注册验证码共用同一邮箱的额度）
+        decision = throttling.consume('verify-code-email', email)
+        if decision is not None and not decision.allowed:
             return Response(
                 {'error': '验证码发送过于频繁，请稍后再试'},
-                status=status.HTTP_400_BAD_REQUEST
+                status=status.HTTP_400_BAD_REQUEST,
+                headers={'Retry-After': throttling.retry_after(decision)}
             )
         
         # 生成验证码并缓存
         verify_code = self._generate_verify_code()
         cache_key = self._get_verify_code_cache_key(email)
         cache.set(cache_key, verify_code, timeout=300)  # 5分钟有效期
-        cache.set(limit_key, True, timeout=60)  # 1分钟发送限制
         
         # 发送邮件
         try:
@@ -768,6 +788,47 @@ class UserViewSet(viewsets.GenericViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @swagger_auto_schema(
+        operation_summary="批量创建邀请码",
+        operation_description="超级管理员批量创建邀请码，同一批邀请码共用一条备注",
+        request_body=BulkCreateInvitationCodeSerializer,
+        responses={
+            201: openapi.Response(
+                description="创建成功",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'note': openapi.Schema(type=openapi.TYPE_STRING),
+                        'codes': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(type=openapi.TYPE_STRING)
+                        )
+                    }
+                )
+            ),
+            403: "没有权限"
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_create_invitations(self, request):
+        """批量创建邀请码"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        note = serializer.validated_data.get('note')
+        invitations = InvitationCode.bulk_create_invitation_codes(
+            created_by=request.user,
+            count=serializer.validated_data['count'],
+            note=note
+        )
+        
+        return Response({
+            'count': len(invitations),
+            'note': note,
+            'codes': [invitation.code for invitation in invitations]
+        }, status=status.HTTP_201_CREATED)
+
     @swagger_auto_schema(
         operation_summary="获取邀请码列表",
         operation_description="获取所有邀请码列表",
@@ -776,7 +837,7 @@ class UserViewSet(viewsets.GenericViewSet):
     @action(detail=False, methods=['get'])
     def list_invitations(self, request):
         """获取邀请码列表"""
-        invitations = InvitationCode.objects.all()
+        invitations = InvitationCode.objects.select_related('created_by', 'used_by')
         page = self.paginate_queryset(invitations)
         serializer = InvitationCodeSerializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Player, Record
+
+from utils.caching import invalidate_models
+from . import stats
+from .models import DailyServerStats, Player, Record, ServerStats
 
 
 @admin.register(Player)
@@ -21,12 +24,39 @@ class RecordAdmin(admin.ModelAdmin):
     actions = ['approve_records', 'reject_records']
     
     def approve_records(self, request, queryset):
-        updated = queryset.update(status='approved')
+        updated = stats.update_record_status(queryset, 'approved')
+        # update() 不触发 post_save，手动使记录相关的缓存失效
+        invalidate_models(Record)
         self.message_user(request, f'{updated} 条记录已批准。')
     approve_records.short_description = "批准选中的神人事迹"
     
     def reject_records(self, request, queryset):
-        updated = queryset.update(status='rejected')
+        updated = stats.update_record_status(queryset, 'rejected')
+        # update() 不触发 post_save，手动使记录相关的缓存失效
+        invalidate_models(Record)
         self.message_user(request, f'{updated} 条记录已拒绝。')
     reject_records.short_description = "拒绝选中的神人事迹"
 
+
+
+@admin.register(ServerStats)
+class ServerStatsAdmin(admin.ModelAdmin):
+    """汇总表由程序维护，后台只读"""
+    list_display = ('server', '__str__', 'players', 'records_pending', 'records_approved', 'records_rejected',
+                    'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyServerStats)
+class DailyServerStatsAdmin(ServerStatsAdmin):
+    list_display = ('date', 'server', 'players_created', 'records_pending', 'records_approved', 'records_rejected')
+    list_filter = ('server',)
+    date_hierarchy = 'date'
@@ -5,3 +5,20 @@ class SfprConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.sfpr"
     verbose_name = "斗魂神人榜"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from utils.caching import invalidate_on_change
+        from . import stats
+        from .models import Player, Record
+
+        # 查看次数只在缓存过期后更新，不使列表缓存失效
+        invalidate_on_change(Player, ignore_fields=('views_count',))
+        invalidate_on_change(Record)
+
+        # 统计汇总随写入增量维护
+        post_save.connect(stats.player_saved, sender=Player, dispatch_uid='sfpr.stats.player_saved')
+        post_delete.connect(stats.player_deleted, sender=Player, dispatch_uid='sfpr.stats.player_deleted')
+        post_save.connect(stats.record_saved, sender=Record, dispatch_uid='sfpr.stats.record_saved')
+        post_delete.connect(stats.record_deleted, sender=Record, dispatch_uid='sfpr.stats.record_deleted')
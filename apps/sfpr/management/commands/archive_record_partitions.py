@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.sfpr import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        '归档 sfpr_record 的旧分区：DETACH CONCURRENTLY 后导出为 gzip 压缩的 CSV 与清单文件，校验行数后删除表。'
+        '恢复：\\copy sfpr_record FROM PROGRAM \'gunzip -c <文件>\' WITH (FORMAT csv, HEADER)（需先有覆盖该范围的分区）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.RECORD_RETENTION_MONTHS,
+                            help='归档整个范围早于本月之前该月数的分区')
+        parser.add_argument('--dir', default=settings.RECORD_ARCHIVE_DIR, help='归档文件目录')
+        parser.add_argument('--keep-table', action='store_true', help='导出后保留分离出的表')
+        parser.add_argument('--dry-run', action='store_true', help='只列出将要归档的分区')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('分区只支持 PostgreSQL')
+        if options['older_than'] < 1:
+            raise CommandError('--older-than 必须大于 0')
+        this_month = partitions.month_start(timezone.localdate())
+        before = partitions.month_bound(partitions.add_months(this_month, -options['older_than']))
+        results = partitions.archive_partitions(
+            before, options['dir'], keep_table=options['keep_table'], dry_run=options['dry_run'],
+        )
+        for result in results:
+            if options['dry_run']:
+                self.stdout.write(f"{result['partition']}: {result['bounds']}")
+            else:
+                self.stdout.write(f"{result['partition']}: {result['rows']} 行 -> {result['file']}")
+        self.stdout.write(f'归档早于 {before:%Y-%m-%d} 的分区 {len(results)} 个')
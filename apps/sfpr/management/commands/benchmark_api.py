@@ -0,0 +1,261 @@
+import json
+import math
+import platform
+import random
+import subprocess
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.sfpr.models import Player, Record, SERVER_NAMES
+from apps.users.models import BlacklistedUser
+from utils.benchmark import HttpClient, Scenario, compare, header_query_count, run_load, summarize
+
+User = get_user_model()
+
+BENCH_PASSWORD = 'benchpass123'
+
+
+def seed_dataset(rng, players, records_per_player, users, blacklists, stdout=None):
+    """生成合成数据集，返回压测场景需要的 ID、昵称与登录凭据"""
+    password = make_password(BENCH_PASSWORD)
+    user_objs = User.objects.bulk_create(
+        [
+            User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com',
+                 password=password, is_email_verified=True)
+            for i in range(users)
+        ],
+        batch_size=1000,
+    )
+
+    pairs = set()
+    while len(pairs) < min(blacklists, users * (users - 1)):
+        user, blocked = rng.sample(user_objs, 2)
+        pairs.add((user.uid, blocked.uid))
+    BlacklistedUser.objects.bulk_create(
+        [BlacklistedUser(user_id=user, blocked_user_id=blocked) for user, blocked in pairs],
+        batch_size=1000,
+    )
+
+    player_objs = []
+    for i in range(players):
+        server = rng.randint(1, len(SERVER_NAMES))
+        player_objs.append(Player(
+            nickname=f'玩家{i % max(1, players // 3)}',
+            game_id=f'game{i}',
+            server=server,
+            server_name=SERVER_NAMES[server],
+        ))
+    Player.objects.bulk_create(player_objs, batch_size=1000)
+
+    statuses = ['approved'] * 8 + ['pending', 'rejected']
+    records = [
+        Record(
+            player=player,
+            description=f'神人事迹 {player.game_id}-{j} ' + '描述' * rng.randint(5, 60),
+            evidence='',
+            submitter=rng.choice(user_objs) if user_objs else None,
+            status=rng.choice(statuses),
+        )
+        for player in player_objs
+        for j in range(records_per_player)
+    ]
+    Record.objects.bulk_create(records, batch_size=2000)
+
+    if stdout:
+        stdout.write(
+            f'数据集：{len(user_objs)} 用户，{len(pairs)} 条拉黑，{len(player_objs)} 玩家，{len(records)} 条记录'
+        )
+    return {
+        'player_ids': [str(player.id) for player in player_objs],
+        'nicknames': sorted({player.nickname for player in player_objs}),
+        'emails': [user.email for user in user_objs],
+        'tokens': [str(RefreshToken.for_user(user).access_token) for user in user_objs],
+    }
+
+
+def build_scenarios(dataset):
+    """读写混合场景，权重约为线上流量比例"""
+    page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 20
+    player_pages = max(1, math.ceil(len(dataset['player_ids']) / page_size))
+
+    def auth(rng):
+        return {'HTTP_AUTHORIZATION': f'Bearer {rng.choice(dataset["tokens"])}'}
+
+    return [
+        Scenario('players_list', 30, lambda client, rng: client.get(
+            '/api/v1/players/', {'page': rng.randint(1, min(player_pages, 10))})),
+        Scenario('players_search', 20, lambda client, rng: client.get(
+            '/api/v1/players/search/', {'nickname': rng.choice(dataset['nicknames'])})),
+        Scenario('player_detail', 20, lambda client, rng: client.get(
+            f'/api/v1/players/{rng.choice(dataset["player_ids"])}/')),
+        Scenario('records_list', 15, lambda client, rng: client.get(
+            '/api/v1/records/', {'page': rng.randint(1, 10)})),
+        Scenario('add_record', 10, lambda client, rng: client.post(
+            f'/api/v1/players/{rng.choice(dataset["player_ids"])}/add_record/',
+            {'description': '压测记录', 'evidence': ''}, **auth(rng)), write=True),
+        Scenario('auth_token', 5, lambda client, rng: client.post(
+            '/api/v1/auth/token/',
+            {'email': rng.choice(dataset['emails']), 'password': BENCH_PASSWORD})),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'v1 API 压测：在独立的测试数据库中生成合成数据，并发调用真实 URLconf，'
+        '输出吞吐量、p50/p95/p99 延迟和每请求查询数，结果写入 JSON 基线。'
+        '指定 --url 时改为通过 HTTP 压测已启动的服务（如 gunicorn 的 WSGI/ASGI 模式），'
+        '数据写入当前配置的数据库，服务须以 THROTTLE_ENABLED=False 启动。'
+        '本地可用 docker-compose.bench.yml 启动 Postgres/Redis。出现被限流（429）的请求时结果无效，命令失败。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1000)
+        parser.add_argument('--records-per-player', type=int, default=5)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--blacklists', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000, help='计入统计的请求总数')
+        parser.add_argument('--warmup', type=int, default=100, help='预热请求数，不计入统计')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='只运行指定场景，可重复')
+        parser.add_argument('--read-only', action='store_true', help='排除写场景')
+        parser.add_argument('--output', default='benchmark_api.json', help='结果 JSON 路径')
+        parser.add_argument('--compare', help='与指定基线 JSON 对比')
+        parser.add_argument('--tolerance', type=float, default=0.10,
+                            help='对比时允许的相对变化，超出视为回退')
+        parser.add_argument('--keepdb', action='store_true', help='保留测试数据库结构')
+        parser.add_argument('--url', help='压测已启动服务的根地址，如 http://127.0.0.1:8000；'
+                                          '会清空并重建当前配置的数据库（库名须包含 bench）')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['url']:
+            result = self.handle_http(rng, options)
+        else:
+            result = self.handle_in_process(rng, options)
+        self.report(result, options)
+
+    def handle_in_process(self, rng, options):
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False
+        )
+        try:
+            if options['keepdb']:
+                call_command('flush', interactive=False, verbosity=0)
+            dataset = seed_dataset(
+                rng, options['players'], options['records_per_player'],
+                options['users'], options['blacklists'], stdout=self.stdout,
+            )
+            return self.run_in_process(dataset, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def run_in_process(self, dataset, options):
+        """所有请求来自同一客户端地址，开启限流时大部分请求会被拒绝，压测的不再是接口本身"""
+        with override_settings(THROTTLE_ENABLED=False):
+            return self.run_scenarios(dataset, options, Client)
+
+    def handle_http(self, rng, options):
+        """服务进程与本命令使用同一数据库：先在其中生成数据，再通过 HTTP 发请求"""
+        if 'bench' not in str(connection.settings_dict['NAME']):
+            raise CommandError('--url 模式会清空当前数据库，数据库名须包含 bench')
+        call_command('migrate', interactive=False, verbosity=0)
+        call_command('flush', interactive=False, verbosity=0)
+        dataset = seed_dataset(
+            rng, options['players'], options['records_per_player'],
+            options['users'], options['blacklists'], stdout=self.stdout,
+        )
+        connection.close()
+        return self.run_scenarios(
+            dataset, options, lambda: HttpClient(options['url']), count_queries=header_query_count
+        )
+
+    def run_scenarios(self, dataset, options, client_factory, count_queries=None):
+        scenarios = build_scenarios(dataset)
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f'未知场景: {", ".join(sorted(unknown))}')
+            scenarios = [s for s in scenarios if s.name in options['scenarios']]
+        if options['read_only']:
+            scenarios = [s for s in scenarios if not s.write]
+        if not scenarios:
+            raise CommandError('没有可运行的场景')
+
+        if options['warmup']:
+            run_load(scenarios, options['warmup'], options['concurrency'], client_factory,
+                     seed=options['seed'] + 1, count_queries=count_queries)
+        samples, wall_time = run_load(
+            scenarios, options['requests'], options['concurrency'], client_factory,
+            seed=options['seed'], count_queries=count_queries,
+        )
+        return summarize(samples, wall_time)
+
+    def report(self, result, options):
+        self.stdout.write(
+            f'{"场景":<16}{"请求":>8}{"错误":>6}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"查询/请求":>10}'
+        )
+        for name, row in result['scenarios'].items():
+            self.stdout.write(
+                f'{name:<16}{row["requests"]:>8}{row["errors"]:>6}{row["throughput"]:>10}'
+                f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["p99_ms"]:>10}{row["queries_per_request"]!s:>10}'
+            )
+        overall = result['overall']
+        self.stdout.write(
+            f'总计 {overall["requests"]} 请求，{overall["throughput"]} req/s，'
+            f'p50 {overall["p50_ms"]} ms，p99 {overall["p99_ms"]} ms，错误 {overall["errors"]}'
+        )
+        if overall['throttled']:
+            # 被限流的请求几乎不耗时，吞吐量与延迟都失真，不写入结果，也不与基线对比
+            raise CommandError(
+                f'{overall["throttled"]} 个请求被限流（429），结果无效；--url 模式下服务须以 THROTTLE_ENABLED=False 启动'
+            )
+
+        result['meta'] = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in (
+                    'players', 'records_per_player', 'users', 'blacklists', 'requests',
+                    'warmup', 'concurrency', 'seed', 'scenarios', 'read_only', 'url',
+                )
+            },
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'结果已写入 {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            lines, regressed = compare(baseline, result, options['tolerance'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressed:
+                raise CommandError(f'存在超出 {options["tolerance"]:.0%} 容差的性能回退')
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
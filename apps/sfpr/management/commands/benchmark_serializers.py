@@ -0,0 +1,91 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.v1.views.sfpr import PlayerViewSet, RecordViewSet
+from apps.sfpr.management.commands.benchmark_api import seed_dataset
+from apps.sfpr.models import Record
+from apps.sfpr.serializers import (
+    LeanPlayerListSerializer, LeanRecordSerializer, PlayerListSerializer, RecordSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        '列表序列化微基准：比较完整 ModelSerializer 与精简序列化器处理一页数据的耗时，'
+        '分别测量“查询+序列化+渲染”和仅序列化两种口径，并校验两者 JSON 输出一致。数据在事务中生成，结束后回滚。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, action='append', dest='page_sizes',
+                            help='每页行数，可重复，默认 20 和 100')
+        parser.add_argument('--rounds', type=int, default=200, help='每个场景的重复次数')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        page_sizes = options['page_sizes'] or [20, 100]
+        rounds = options['rounds']
+        request = Request(APIRequestFactory().get('/api/v1/records/', HTTP_HOST='sfpr.example.com'))
+        context = {'request': request}
+
+        with transaction.atomic():
+            rng = random.Random(options['seed'])
+            seed_dataset(rng, max(page_sizes), 2, 20, 0)
+            # 三分之一的记录带图片，覆盖图片 URL 的生成
+            record_ids = list(Record.objects.values_list('id', flat=True)[::3])
+            Record.objects.filter(id__in=record_ids).update(
+                image_1='records/bench/image_1.jpg', image_2='records/bench/image_2.png'
+            )
+
+            self.stdout.write(f'{"场景":<24}{"行数":>6}{"完整 ms":>10}{"精简 ms":>10}{"加速":>8}')
+            for page_size in page_sizes:
+                players = PlayerViewSet.queryset.order_by('-created_at')[:page_size]
+                records = RecordViewSet.queryset.order_by('-created_at')[:page_size]
+                self.compare('玩家列表', page_size, rounds, players, PlayerListSerializer, LeanPlayerListSerializer, {})
+                self.compare('记录列表', page_size, rounds, records, RecordSerializer, LeanRecordSerializer, context)
+            # 基准数据不落库
+            transaction.set_rollback(True)
+
+    def compare(self, name, page_size, rounds, queryset, serializer_class, lean_class, context):
+        renderer = JSONRenderer()
+
+        def full(instances):
+            return serializer_class(instances, many=True, context=context).data
+
+        def lean(rows):
+            return lean_class(context).serialize(rows)
+
+        if renderer.render(full(queryset.all())) != renderer.render(lean(lean_class().prepare(queryset.all()))):
+            raise CommandError(f'{name}：精简序列化器的输出与完整序列化器不一致')
+
+        self.report(
+            f'{name}（查询+序列化+渲染）', page_size,
+            self._measure(rounds, lambda: renderer.render(full(queryset.all()))),
+            self._measure(rounds, lambda: renderer.render(lean(lean_class().prepare(queryset.all())))),
+        )
+        instances, rows = list(queryset.all()), list(lean_class().prepare(queryset.all()))
+        self.report(
+            f'{name}（仅序列化）', page_size,
+            self._measure(rounds, lambda: full(instances)),
+            self._measure(rounds, lambda: lean(rows)),
+        )
+
+    def report(self, name, page_size, full_seconds, lean_seconds):
+        self.stdout.write(
+            f'{name:<24}{page_size:>6}{full_seconds * 1000:>10.3f}{lean_seconds * 1000:>10.3f}'
+            f'{full_seconds / lean_seconds:>7.1f}x'
+        )
+
+    @staticmethod
+    def _measure(rounds, func):
+        """返回单次调用的平均耗时（秒）"""
+        func()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        return (time.perf_counter() - start) / rounds
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.sfpr import partitions
+
+
+class Command(BaseCommand):
+    help = '创建 sfpr_record 未来几个月的月分区（PostgreSQL），celery beat 每天也会执行'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.RECORD_PARTITION_MONTHS_AHEAD,
+                            help='提前创建的月数')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('分区只支持 PostgreSQL')
+        created = partitions.ensure_partitions(months_ahead=options['months'])
+        for name, lower, upper, _ in partitions.list_partitions():
+            self.stdout.write(f'{name}: {lower or "MINVALUE"} ~ {upper}')
+        self.stdout.write(f'新建 {len(created)} 个分区')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.sfpr import stats
+
+
+class Command(BaseCommand):
+    help = '从玩家与记录表重新计算按服务器、按天的统计汇总并修正偏差（首次部署后执行 --all 回填）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='重算最近的天数（含今天）')
+        parser.add_argument('--all', action='store_true', help='重算全部日期')
+
+    def handle(self, *args, **options):
+        if not options['all'] and options['days'] < 1:
+            raise CommandError('--days 必须大于 0')
+        start = time.perf_counter()
+        result = stats.reconcile(None if options['all'] else options['days'])
+        self.stdout.write(
+            f"修正服务器统计 {result['servers']} 行、每日统计 {result['daily']} 行"
+            f"（耗时 {time.perf_counter() - start:.2f} 秒）"
+        )
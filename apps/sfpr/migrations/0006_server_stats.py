@@ -0,0 +1,97 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sfpr", "0005_record_image_1_record_image_2_record_image_3"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServerStats",
+            fields=[
+                (
+                    "server",
+                    models.IntegerField(
+                        primary_key=True, serialize=False, verbose_name="服务器ID"
+                    ),
+                ),
+                ("players", models.IntegerField(default=0, verbose_name="玩家数")),
+                (
+                    "records_pending",
+                    models.IntegerField(default=0, verbose_name="待审核记录数"),
+                ),
+                (
+                    "records_approved",
+                    models.IntegerField(default=0, verbose_name="已发布记录数"),
+                ),
+                (
+                    "records_rejected",
+                    models.IntegerField(default=0, verbose_name="已拒绝记录数"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "服务器统计",
+                "verbose_name_plural": "服务器统计",
+                "ordering": ["server"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyServerStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="日期")),
+                ("server", models.IntegerField(verbose_name="服务器ID")),
+                (
+                    "players_created",
+                    models.IntegerField(default=0, verbose_name="新增玩家数"),
+                ),
+                (
+                    "records_pending",
+                    models.IntegerField(default=0, verbose_name="待审核记录数"),
+                ),
+                (
+                    "records_approved",
+                    models.IntegerField(default=0, verbose_name="已发布记录数"),
+                ),
+                (
+                    "records_rejected",
+                    models.IntegerField(default=0, verbose_name="已拒绝记录数"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "每日服务器统计",
+                "verbose_name_plural": "每日服务器统计",
+                "ordering": ["date", "server"],
+                "indexes": [
+                    models.Index(
+                        fields=["server", "date"], name="sfpr_daily_stats_server_date"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "server"), name="sfpr_daily_stats_date_server"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_record(apps, schema_editor):
+    """PostgreSQL 上把 sfpr_record 在线转换为按月分区的表（见 apps/sfpr/partitions.py），其他数据库只建索引"""
+    Record = apps.get_model('sfpr', 'Record')
+    index = models.Index(fields=['created_at'], name='sfpr_record_created_at_idx')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_index(Record, index)
+        return
+    from apps.sfpr.partitions import convert_to_partitioned
+    convert_to_partitioned(schema_editor.connection.alias, settings.RECORD_PARTITION_MONTHS_AHEAD)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY 与分步的短事务不能放在一个事务中
+    atomic = False
+
+    dependencies = [
+        ("sfpr", "0006_server_stats"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(partition_record)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="record",
+                    index=models.Index(fields=["created_at"], name="sfpr_record_created_at_idx"),
+                ),
+            ],
+        ),
+    ]
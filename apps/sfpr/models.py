@@ -5,8 +5,24 @@ from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from utils.models import DirtyFieldsMixin
+
 User = get_user_model()
 
+# 服务器ID与名称
+SERVER_NAMES = {
+    1: "艾欧尼亚", 2: "祖安", 3: "诺克萨斯", 4: "班德尔城", 5: "皮尔特沃夫",
+    6: "战争学院", 7: "巨神峰", 8: "雷瑟守备", 9: "裁决之地", 10: "黑色玫瑰",
+    11: "暗影岛", 12: "钢铁烈阳", 13: "水晶之痕", 14: "均衡教派", 15: "影流",
+    16: "守望之海", 17: "征服之海", 18: "卡拉曼达", 19: "皮城警备", 20: "比尔吉沃特",
+    21: "德玛西亚", 22: "弗雷尔卓德", 23: "无畏先锋", 24: "恕瑞玛", 25: "扭曲丛林",
+    26: "巨龙之巢", 27: "教育网专区", 28: "男爵领域", 29: "峡谷之巅", 30: "体验服"
+}
+
+
+def get_server_name(server):
+    return SERVER_NAMES.get(server, f"未知服务器({server})")
+
 
 def record_image_path(instance, filename):
     """生成神人事迹图片的存储路径"""
@@ -38,7 +54,7 @@ def record_image_path(instance, filename):
     return f'records/{player_id}/{record_id}/{new_filename}'
 
 
-class Player(models.Model):
+class Player(DirtyFieldsMixin, models.Model):
     """玩家模型 - 存储唯一的玩家信息"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     nickname = models.CharField(_("昵称"), max_length=100, db_index=True)
@@ -65,26 +81,25 @@ class Player(models.Model):
     
     def increment_views(self):
         """增加查看次数"""
+        Player.add_view(self.pk)
         self.views_count += 1
-        self.save(update_fields=['views_count'])
+        # 数据库中已经递增，快照同步更新；否则之后保存其他字段时会用这里的旧值覆盖并发的递增
+        self._take_snapshot(['views_count'])
+
+    @classmethod
+    def add_view(cls, pk):
+        """在数据库中原子递增查看次数，并发请求不会互相覆盖，也不需要先取出玩家（304 响应）"""
+        cls.objects.filter(pk=pk).update(views_count=models.F('views_count') + 1)
     
     def save(self, *args, **kwargs):
         """保存时自动设置服务器名称"""
         # 根据服务器ID获取服务器名称
-        SERVER_NAMES = {
-            1: "艾欧尼亚", 2: "祖安", 3: "诺克萨斯", 4: "班德尔城", 5: "皮尔特沃夫",
-            6: "战争学院", 7: "巨神峰", 8: "雷瑟守备", 9: "裁决之地", 10: "黑色玫瑰",
-            11: "暗影岛", 12: "钢铁烈阳", 13: "水晶之痕", 14: "均衡教派", 15: "影流",
-            16: "守望之海", 17: "征服之海", 18: "卡拉曼达", 19: "皮城警备", 20: "比尔吉沃特",
-            21: "德玛西亚", 22: "弗雷尔卓德", 23: "无畏先锋", 24: "恕瑞玛", 25: "扭曲丛林",
-            26: "巨龙之巢", 27: "教育网专区", 28: "男爵领域", 29: "峡谷之巅", 30: "体验服"
-        }
         if not self.server_name and self.server:
-            self.server_name = SERVER_NAMES.get(self.server, f"未知服务器({self.server})")
+            self.server_name = get_server_name(self.server)
         super().save(*args, **kwargs)
 
 
-class Record(models.Model):
+class Record(DirtyFieldsMixin, models.Model):
     """神人事迹记录模型 - 存储对玩家的评价记录"""
     STATUS_CHOICES = (
         ('pending', _('待审核')),
@@ -129,6 +144,10 @@ class Record(models.Model):
         verbose_name = _("神人事迹")
         verbose_name_plural = _("神人事迹")
         ordering = ["-created_at"]
+        # PostgreSQL 上 sfpr_record 按 created_at 按月分区（apps/sfpr/partitions.py），数据库主键为 (id, created_at)
+        indexes = [
+            models.Index(fields=['created_at'], name='sfpr_record_created_at_idx'),
+        ]
     
     def __str__(self):
         return f"{self.player} - {self.created_at.strftime('%Y-%m-%d')}"
@@ -184,3 +203,53 @@ class Record(models.Model):
                     print(f"删除玩家文件夹失败: {player_dir}, 错误: {str(e)}")
         
         return result
+
+
+class ServerStats(models.Model):
+    """
+    按服务器的统计汇总：玩家数与各状态的记录数
+    随玩家/记录的写入增量维护（见 apps/sfpr/stats.py），定期与基础表对账
+    """
+    server = models.IntegerField(_("服务器ID"), primary_key=True)
+    players = models.IntegerField(_("玩家数"), default=0)
+    records_pending = models.IntegerField(_("待审核记录数"), default=0)
+    records_approved = models.IntegerField(_("已发布记录数"), default=0)
+    records_rejected = models.IntegerField(_("已拒绝记录数"), default=0)
+    updated_at = models.DateTimeField(_("更新时间"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("服务器统计")
+        verbose_name_plural = _("服务器统计")
+        ordering = ["server"]
+
+    def __str__(self):
+        return get_server_name(self.server)
+
+
+class DailyServerStats(models.Model):
+    """
+    按天、按服务器的统计汇总：当天新增的玩家数，以及当天创建的记录按当前状态的数量
+    （记录审核后从“待审核”移到“已发布/已拒绝”，仍计在创建的那一天）
+    """
+    date = models.DateField(_("日期"))
+    server = models.IntegerField(_("服务器ID"))
+    players_created = models.IntegerField(_("新增玩家数"), default=0)
+    records_pending = models.IntegerField(_("待审核记录数"), default=0)
+    records_approved = models.IntegerField(_("已发布记录数"), default=0)
+    records_rejected = models.IntegerField(_("已拒绝记录数"), default=0)
+    updated_at = models.DateTimeField(_("更新时间"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("每日服务器统计")
+        verbose_name_plural = _("每日服务器统计")
+        ordering = ["date", "server"]
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'server'], name='sfpr_daily_stats_date_server'),
+        ]
+        indexes = [
+            # 单个服务器的时间范围查询
+            models.Index(fields=['server', 'date'], name='sfpr_daily_stats_server_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {get_server_name(self.server)}"
@@ -0,0 +1,369 @@
+"""
+sfpr_record 按月范围分区（PostgreSQL）
+
+sfpr_record 是按 created_at 分区的父表，每月一个分区 sfpr_record_pYYYY_MM（月份按 TIME_ZONE 划分），
+分区表的主键为 (id, created_at)。Django 中 Record 的主键仍是 id，按 id 查询时扫描各分区的主键索引。
+分区前已有的数据整体作为分区 sfpr_record_legacy（MINVALUE 到转换时的下下个月），不搬移数据。
+
+- convert_to_partitioned()：迁移 0007 调用。索引与 CHECK 约束先不阻塞写入地建好，
+  改名、建父表、ATTACH 在一个持有 lock_timeout 的短事务中完成，ATTACH 依据已验证的 CHECK 约束跳过全表扫描。
+  id 为自增列时改用父表所有的独立序列 sfpr_record_id_seq（分区表不复制 identity）
+- ensure_partitions()：提前创建未来 RECORD_PARTITION_MONTHS_AHEAD 个月的分区（celery beat 每天执行）。
+  没有 default 分区，落在已有分区之外的写入会失败，因此要提前创建；新分区先建表再 ATTACH，不锁父表的读写
+- archive_partitions()：把早于指定日期的分区 DETACH CONCURRENTLY 后导出为 gzip 压缩的 CSV 与清单文件，
+  校验行数后删除。中断后重新执行会继续处理已分离的分区
+"""
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'sfpr_record'
+LEGACY = f'{TABLE}_legacy'
+PARTITION_PREFIX = f'{TABLE}_p'
+# 转换期间临时的约束与索引
+LEGACY_BOUND_CHECK = f'{LEGACY}_bound_check'
+LEGACY_PKEY_INDEX = f'{LEGACY}_pkey'
+# id 为自增列（identity/serial）时，父表与各分区共用的独立序列
+ID_SEQUENCE = f'{TABLE}_id_seq'
+# 父表上的分区索引（各分区自动创建或挂接对应的索引）；created_at 的索引与 Record.Meta.indexes 同名
+PARENT_INDEXES = (
+    (f'{TABLE}_created_at_idx', 'created_at'),
+    (f'{TABLE}_player_id_idx', 'player_id'),
+    (f'{TABLE}_submitter_id_idx', 'submitter_id'),
+)
+LEGACY_INDEXES = (
+    (LEGACY_PKEY_INDEX, 'UNIQUE', 'id, created_at'),
+    (f'{LEGACY}_created_at_idx', '', 'created_at'),
+)
+# 改名、ATTACH 等需要排他锁的语句等待锁的上限，超时后整个事务回滚，可以稍后重试
+LOCK_TIMEOUT = '5s'
+# 分离后等待导出的分区，表注释中记录原来的分区范围
+ARCHIVE_PENDING = 'sfpr archive pending: '
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    years, month = divmod(day.month - 1 + months, 12)
+    return datetime.date(day.year + years, month + 1, 1)
+
+
+def month_bound(day):
+    """本地时区的月初时刻，作为分区的边界"""
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def partition_name(day):
+    return f'{PARTITION_PREFIX}{day:%Y_%m}'
+
+
+def parse_bounds(expression):
+    """
+    解析 pg_get_expr(relpartbound) 的结果，如
+    FOR VALUES FROM ('2026-11-01 00:00:00+08') TO ('2026-12-01 00:00:00+08')，MINVALUE/MAXVALUE 返回 None
+    """
+    match = _BOUND_RE.search(expression or '')
+    if match is None:
+        return None, None
+    return tuple(
+        None if value.upper() in ('MINVALUE', 'MAXVALUE') else parse_datetime(value.strip("'"))
+        for value in match.groups()
+    )
+
+
+def _connection(using):
+    return connections[using or DEFAULT_DB_ALIAS]
+
+
+def is_partitioned(cursor):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+    return cursor.fetchone() is not None
+
+
+def list_partitions(using=None):
+    """[(分区名, 下界, 上界, 是否正在分离)]，按上界排序；未分区或不是 PostgreSQL 时返回空列表"""
+    connection = _connection(using)
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        rows = cursor.fetchall()
+    partitions = [(name, *parse_bounds(bounds), pending) for name, bounds, pending in rows]
+    return sorted(partitions, key=lambda partition: partition[2] or datetime.datetime.max.replace(tzinfo=datetime.UTC))
+
+
+def _locked(cursor):
+    cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+
+
+def _drop_invalid_index(cursor, name):
+    """上次中断的 CREATE INDEX CONCURRENTLY 会留下无效索引，IF NOT EXISTS 不会重建"""
+    cursor.execute(
+        'SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name]
+    )
+    row = cursor.fetchone()
+    if row and row[0]:
+        cursor.execute(f'DROP INDEX CONCURRENTLY {name}')
+
+
+def _detach_id_sequence(cursor, table, sequence):
+    """
+    把 table.id 的自增（identity 或 serial）换成独立的序列 sequence，从现有最大值之后继续；返回是否换了序列。
+    CREATE TABLE ... (LIKE ...) 不复制 identity，父表与原表的列定义不一致时也不能 ATTACH，
+    因此原表去掉 identity，改由父表的 DEFAULT nextval() 生成 id（见 _set_id_default）
+    """
+    cursor.execute(
+        "SELECT attidentity, pg_get_serial_sequence(%s, 'id') FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+        [table, table],
+    )
+    identity, current = cursor.fetchone()
+    if current is None:
+        # UUID 等由应用生成的主键
+        return False
+    cursor.execute(f'SELECT last_value, is_called FROM {current}')
+    last_value, is_called = cursor.fetchone()
+    cursor.execute(f'SELECT max(id) FROM {table}')
+    start = max(last_value if is_called else last_value - 1, cursor.fetchone()[0] or 0) + 1
+    if identity:
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN id DROP IDENTITY')
+    else:
+        cursor.execute(f'ALTER TABLE {table} ALTER COLUMN id DROP DEFAULT')
+        cursor.execute(f'DROP SEQUENCE {current}')
+    cursor.execute(f'CREATE SEQUENCE {sequence} START WITH {start}')
+    return True
+
+
+def _set_id_default(cursor, parent, sequence, tables=()):
+    """父表（以及直接写入的分区）的 id 从 sequence 取值，序列归父表的 id 列所有，随父表删除"""
+    for table in (parent, *tables):
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {parent}.id')
+
+
+def convert_to_partitioned(using=None, months_ahead=3):
+    """把普通表 sfpr_record 转换为分区表，已经是分区表时只补建未来的分区"""
+    connection = _connection(using)
+    if connection.in_atomic_block:
+        raise RuntimeError('CREATE INDEX CONCURRENTLY 不能在事务中执行')
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return ensure_partitions(using, months_ahead)
+
+        # 现有数据与转换前写入的数据都在 legacy 分区中，留出一个月的余量
+        boundary = add_months(month_start(timezone.localdate()), 2)
+        bound = month_bound(boundary).isoformat()
+
+        # 1. 在原表上建好分区表需要的索引，不阻塞写入
+        for name, unique, columns in LEGACY_INDEXES:
+            _drop_invalid_index(cursor, name)
+            cursor.execute(f'CREATE {unique} INDEX CONCURRENTLY IF NOT EXISTS {name} ON {TABLE} ({columns})')
+
+        # 2. 范围约束先 NOT VALID 添加（只短暂持锁），VALIDATE 扫表期间不阻塞读写
+        with transaction.atomic(using=connection.alias):
+            _locked(cursor)
+            cursor.execute(f'ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {LEGACY_BOUND_CHECK}')
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT {LEGACY_BOUND_CHECK} CHECK (created_at < '{bound}') NOT VALID"
+            )
+        cursor.execute(f'ALTER TABLE {TABLE} VALIDATE CONSTRAINT {LEGACY_BOUND_CHECK}')
+
+        # 3. 改名、建父表、挂接原表：只修改系统表，持有排他锁的时间很短
+        with transaction.atomic(using=connection.alias):
+            _locked(cursor)
+            cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(
+                "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')",
+                [TABLE],
+            )
+            constraints = cursor.fetchall()
+            cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY}')
+            for name, kind, _ in constraints:
+                if kind == 'p':
+                    cursor.execute(f'ALTER TABLE {LEGACY} DROP CONSTRAINT {name}')
+            cursor.execute(f'ALTER TABLE {LEGACY} ADD CONSTRAINT {LEGACY_PKEY_INDEX} PRIMARY KEY USING INDEX {LEGACY_PKEY_INDEX}')
+            id_sequence = _detach_id_sequence(cursor, LEGACY, ID_SEQUENCE)
+
+            cursor.execute(
+                f'CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS INCLUDING STORAGE) '
+                'PARTITION BY RANGE (created_at)'
+            )
+            if id_sequence:
+                _set_id_default(cursor, TABLE, ID_SEQUENCE, [LEGACY])
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)')
+            # 与原表相同的外键，ATTACH 时直接挂接原表的外键，不重新验证
+            for name, kind, definition in constraints:
+                if kind == 'f':
+                    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+            for name, column in PARENT_INDEXES:
+                cursor.execute(f'CREATE INDEX {name} ON {TABLE} ({column})')
+            cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {LEGACY} FOR VALUES FROM (MINVALUE) TO ('{bound}')")
+            cursor.execute(f'ALTER TABLE {LEGACY} DROP CONSTRAINT {LEGACY_BOUND_CHECK}')
+    logger.info('%s 已转换为分区表，原有数据在 %s 中（早于 %s）', TABLE, LEGACY, bound)
+    return ensure_partitions(using, months_ahead)
+
+
+def ensure_partitions(using=None, months_ahead=3):
+    """创建到 months_ahead 个月之后的月分区，返回新建的分区名"""
+    partitions = list_partitions(using)
+    if not partitions:
+        return []
+    connection = _connection(using)
+    start = month_start(timezone.localtime(partitions[-1][2]).date())
+    end = add_months(month_start(timezone.localdate()), months_ahead + 1)
+    created = []
+    with connection.cursor() as cursor:
+        while start < end:
+            name = partition_name(start)
+            lower, upper = month_bound(start).isoformat(), month_bound(add_months(start, 1)).isoformat()
+            with transaction.atomic(using=connection.alias):
+                _locked(cursor)
+                # 先建独立的表再 ATTACH：ATTACH 只对父表加 SHARE UPDATE EXCLUSIVE 锁，不阻塞读写。
+                # INCLUDING DEFAULTS 复制父表 id 的 DEFAULT nextval()，直接写入分区时也从同一序列取值
+                cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING STORAGE)')
+                cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')")
+            created.append(name)
+            start = add_months(start, 1)
+    if created:
+        logger.info('已创建 %s 的分区: %s', TABLE, ', '.join(created))
+    return created
+
+
+def _pending_archives(cursor):
+    """已分离、尚未导出的分区 [(表名, 原分区范围)]"""
+    cursor.execute(
+        """
+        SELECT c.relname, obj_description(c.oid, 'pg_class')
+        FROM pg_class c
+        WHERE c.relkind = 'r' AND NOT c.relispartition AND starts_with(obj_description(c.oid, 'pg_class'), %s)
+        """,
+        [ARCHIVE_PENDING],
+    )
+    return [(name, comment[len(ARCHIVE_PENDING):]) for name, comment in cursor.fetchall()]
+
+
+def _copy_to(cursor, sql, stream):
+    """COPY ... TO STDOUT 写入 stream"""
+    raw = cursor.cursor
+    if hasattr(raw, 'copy'):
+        # psycopg 3
+        with raw.copy(sql) as copy:
+            for block in copy:
+                stream.write(block)
+    else:
+        raw.copy_expert(sql, stream)
+
+
+def _count_csv_rows(path):
+    """重新读取导出的文件计数（不含表头），同时校验压缩文件完整；字段中可能有换行，按 CSV 解析"""
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return sum(1 for _ in csv.reader(f)) - 1
+
+
+def _export(cursor, name, bounds, directory):
+    """导出为 <表名>.csv.gz 与清单 <表名>.json，返回清单"""
+    cursor.execute(f'SELECT count(*) FROM {name}')
+    expected = cursor.fetchone()[0]
+    path = os.path.join(directory, f'{name}.csv.gz')
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wb') as stream:
+        _copy_to(cursor, f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', stream)
+    rows = _count_csv_rows(tmp_path)
+    if rows != expected:
+        os.remove(tmp_path)
+        raise RuntimeError(f'{name} 导出 {rows} 行，与表中的 {expected} 行不一致')
+    digest = hashlib.sha256()
+    with open(tmp_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    os.replace(tmp_path, path)
+
+    cursor.execute(
+        'SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped '
+        'ORDER BY attnum',
+        [name],
+    )
+    manifest = {
+        'table': TABLE,
+        'partition': name,
+        'bounds': bounds,
+        'rows': rows,
+        'columns': [column for column, in cursor.fetchall()],
+        'file': os.path.basename(path),
+        'sha256': digest.hexdigest(),
+        'archived_at': timezone.now().isoformat(),
+    }
+    with open(os.path.join(directory, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def archive_partitions(before, directory, keep_table=False, dry_run=False, using=None):
+    """
+    归档上界不晚于 before（datetime）的分区：DETACH CONCURRENTLY、导出为 gzip 压缩的 CSV、删除表
+    keep_table 时保留分离后的表（不再属于 sfpr_record）。返回处理的分区清单；dry_run 时只返回分区名与范围
+    """
+    connection = _connection(using)
+    if connection.in_atomic_block:
+        raise RuntimeError('DETACH PARTITION CONCURRENTLY 不能在事务中执行')
+    candidates = [
+        (name, pending) for name, _, upper, pending in list_partitions(using)
+        if upper is not None and upper <= before
+    ]
+    archived = []
+    with connection.cursor() as cursor:
+        bounds = {}
+        for name, pending in candidates:
+            cursor.execute(
+                'SELECT pg_get_expr(relpartbound, oid) FROM pg_class WHERE oid = to_regclass(%s)', [name]
+            )
+            bounds[name] = cursor.fetchone()[0]
+        if dry_run:
+            return [{'partition': name, 'bounds': bounds[name]} for name, _ in candidates]
+
+        os.makedirs(directory, exist_ok=True)
+        for name, pending in candidates:
+            # 先在表注释中记下范围，分离后中断也能继续导出
+            comment = ARCHIVE_PENDING + bounds[name]
+            cursor.execute(f'COMMENT ON TABLE {name} IS %s', [comment])
+            if pending:
+                # 上次的 DETACH CONCURRENTLY 被中断
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name} FINALIZE')
+            else:
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name} CONCURRENTLY')
+            logger.info('已分离分区 %s（%s）', name, bounds[name])
+
+        for name, partition_bounds in _pending_archives(cursor):
+            manifest = _export(cursor, name, partition_bounds, directory)
+            if keep_table:
+                cursor.execute(f'COMMENT ON TABLE {name} IS %s', [f'sfpr archived: {partition_bounds}'])
+            else:
+                cursor.execute(f'DROP TABLE {name}')
+            logger.info('已归档分区 %(partition)s：%(rows)d 行，写入 %(file)s', manifest)
+            archived.append(manifest)
+    return archived
@@ -1,10 +1,14 @@
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 import logging
 import os
 # import magic  # 暂时注释掉
 from .models import Player, Record
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 
 # 获取logger
 logger = logging.getLogger(__name__)
@@ -54,10 +58,10 @@ def validate_image_file(file):
             (header[0:4] == b'\x89PNG') or   # PNG
             (header[0:4] == b'GIF8')         # GIF
         ):
-            logger.warning(f"文件 {file.name} 的文件头不匹配常见图片格式")
+            logger.warning("文件 %s 的文件头不匹配常见图片格式", file.name)
             # 但我们不抛出异常，让Django的ImageField自己验证
     except Exception as e:
-        logger.error(f"检查图片文件头时出错: {str(e)}")
+        logger.error("检查图片文件头时出错: %s", e)
         # 同样，我们不抛出异常
     
     return file
@@ -133,6 +137,9 @@ class PlayerListSerializer(serializers.ModelSerializer):
         fields = ['id', 'nickname', 'game_id', 'server_name', 'created_at', 'views_count', 'records_count']
     
     def get_records_count(self, obj):
+        # 视图查询集已注解已发布记录数，未注解时才单独查询
+        if hasattr(obj, 'records_count'):
+            return obj.records_count
         return obj.records.filter(status='approved').count()
 
 
@@ -156,7 +163,7 @@ class PlayerCreateSerializer(serializers.ModelSerializer):
     
     def validate(self, attrs):
         """添加详细的验证逻辑和日志"""
-        logger.debug(f"验证创建玩家数据: {attrs}")
+        logger.debug("验证创建玩家数据: %s", attrs)
         
         # 验证昵称
         if not attrs.get('nickname'):
@@ -177,7 +184,122 @@ class PlayerCreateSerializer(serializers.ModelSerializer):
         # 验证服务器ID是否有效
         valid_server_ids = list(range(1, 31))  # 1-30
         if server_id not in valid_server_ids:
-            logger.error(f"无效的服务器ID: {server_id}")
+            logger.error("无效的服务器ID: %s", server_id)
             raise serializers.ValidationError({"server": f"无效的服务器ID: {server_id}"})
         
-        return attrs 
\ No newline at end of file
+        return attrs 
+
+
+# ---- 只读列表的精简序列化 ----
+# 列表接口每页 20~100 行，ModelSerializer 的字段遍历、模型实例化和逐个 build_absolute_uri 占了大部分 CPU。
+# 下面的序列化器直接读取 .values() 的行（关联字段通过显式 join 取出），输出与对应 ModelSerializer
+# 渲染后的 JSON 逐字节一致；修改上面的序列化器字段时需同步修改，apps/sfpr/tests.py 中有一致性测试。
+
+def datetime_formatter():
+    """返回与 DRF DateTimeField.to_representation 结果一致的格式化函数，时区只取一次"""
+    field = serializers.DateTimeField()
+    output_format = api_settings.DATETIME_FORMAT
+    field_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    return format_datetime
+
+
+class LeanSerializer:
+    """
+    只读列表的精简序列化器基类
+
+    用法：rows = serializer.prepare(queryset)（可再分页），data = serializer.serialize(rows)
+    """
+    values = ()
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.format_datetime = datetime_formatter()
+
+    def prepare(self, queryset):
+        return queryset.values(*self.values)
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+class LeanPlayerListSerializer(LeanSerializer):
+    """与 PlayerListSerializer 输出一致；queryset 需已注解 records_count（见 PlayerViewSet.queryset）"""
+    values = ('id', 'nickname', 'game_id', 'server_name', 'created_at', 'views_count', 'records_count')
+
+    def to_representation(self, row):
+        return {
+            'id': str(row['id']),
+            'nickname': row['nickname'],
+            'game_id': row['game_id'],
+            'server_name': row['server_name'],
+            'created_at': self.format_datetime(row['created_at']),
+            'views_count': row['views_count'],
+            'records_count': row['records_count'],
+        }
+
+
+class LeanRecordSerializer(LeanSerializer):
+    """与 RecordSerializer 的只读输出一致"""
+    values = (
+        'id', 'description', 'evidence', 'submitter__username', 'created_at', 'status',
+        'player_id', 'player__nickname', 'player__game_id', 'player__server', 'player__server_name',
+        'image_1', 'image_2', 'image_3',
+    )
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.request = self.context.get('request')
+        self.storage = Record._meta.get_field('image_1').storage
+        # 本地存储的图片 URL 都以同一前缀开头，每次序列化只计算一次绝对地址
+        self.media_prefix = None
+        base_url = getattr(self.storage, 'base_url', None) if isinstance(self.storage, FileSystemStorage) else None
+        if base_url and base_url.startswith('/') and not base_url.startswith('//'):
+            self.media_prefix = self.request.build_absolute_uri(base_url) if self.request else base_url
+
+    def image_url(self, name):
+        if not name:
+            return None
+        if self.media_prefix is not None:
+            return self.media_prefix + filepath_to_uri(name).lstrip('/')
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request else url
+
+    def to_representation(self, row):
+        data = {
+            'id': str(row['id']),
+            'description': row['description'],
+            'evidence': row['evidence'],
+        }
+        # 与 ModelSerializer 一致：没有提交者时不输出 submitter_username
+        if row['submitter__username'] is not None:
+            data['submitter_username'] = row['submitter__username']
+        data['created_at'] = self.format_datetime(row['created_at'])
+        data['status'] = row['status']
+        data['player'] = {
+            'id': str(row['player_id']),
+            'nickname': row['player__nickname'],
+            'game_id': row['player__game_id'],
+            'server': row['player__server'],
+            'server_name': row['player__server_name'],
+        }
+        data['image_1_url'] = self.image_url(row['image_1'])
+        data['image_2_url'] = self.image_url(row['image_2'])
+        data['image_3_url'] = self.image_url(row['image_3'])
+        return data
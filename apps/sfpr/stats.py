@@ -0,0 +1,247 @@
+"""
+按服务器、按天的统计汇总（rollup）
+
+ServerStats / DailyServerStats 随玩家与记录的写入增量维护，统计接口只读汇总表，
+不再对 sfpr_player / sfpr_record 做全表 GROUP BY：
+
+    玩家创建、删除、换服            players / players_created ±1
+    记录创建、删除、状态或玩家变化   对应状态列 ±1（按记录的创建日期与玩家的服务器）
+
+增量在触发它的写入所在的事务中用 F() 更新，行不存在时插入；多行按固定顺序更新，避免死锁。
+queryset.update() 不触发信号，批量修改记录状态使用 update_record_status()。
+信号覆盖不到的写入（原生 SQL、导入数据等）由 reconcile() 定期对账修正（reconcile_stats 任务与命令）。
+"""
+import datetime
+import logging
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from utils.conditional import touch_fields
+from utils.metrics import registry
+from .models import DailyServerStats, Player, Record, ServerStats
+
+logger = logging.getLogger(__name__)
+
+STATUSES = tuple(status for status, _ in Record.STATUS_CHOICES)
+SERVER_COLUMNS = ('players',) + tuple(f'records_{status}' for status in STATUSES)
+DAILY_COLUMNS = ('players_created',) + SERVER_COLUMNS[1:]
+
+RECONCILE_CORRECTIONS = registry.counter(
+    'stats_reconcile_corrections_total',
+    '对账时与基础表不一致而被修正的汇总行数',
+    labelnames=('table',),
+)
+
+
+def record_day(created_at):
+    """统计按本地时区（TIME_ZONE）的日期划分"""
+    return timezone.localdate(created_at)
+
+
+def _upsert(model, lookup, deltas):
+    updates = {column: F(column) + delta for column, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates, updated_at=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # 并发插入了同一行
+        model.objects.filter(**lookup).update(**updates, updated_at=timezone.now())
+
+
+def apply_changes(changes):
+    """
+    应用增量 {(服务器, 日期, 'players' 或记录状态): 变化量}
+    """
+    servers = defaultdict(Counter)
+    days = defaultdict(Counter)
+    for (server, day, kind), delta in changes.items():
+        if not delta:
+            continue
+        index = 0 if kind == 'players' else SERVER_COLUMNS.index(f'records_{kind}')
+        servers[server][SERVER_COLUMNS[index]] += delta
+        days[day, server][DAILY_COLUMNS[index]] += delta
+    with transaction.atomic():
+        for server in sorted(servers):
+            deltas = {column: delta for column, delta in servers[server].items() if delta}
+            if deltas:
+                _upsert(ServerStats, {'server': server}, deltas)
+        for day, server in sorted(days):
+            deltas = {column: delta for column, delta in days[day, server].items() if delta}
+            if deltas:
+                _upsert(DailyServerStats, {'date': day, 'server': server}, deltas)
+
+
+def _player_server(player_id, origin=None):
+    if isinstance(origin, Player) and origin.pk == player_id:
+        return origin.server
+    return Player.objects.filter(pk=player_id).values_list('server', flat=True).first()
+
+
+def _record_server(record, origin=None):
+    if Record.player.is_cached(record) and record.player is not None:
+        return record.player.server
+    return _player_server(record.player_id, origin)
+
+
+def _player_record_counts(player_ids):
+    """玩家的记录按 (服务器, 创建日期, 状态) 的数量"""
+    return (
+        Record.objects.filter(player__in=player_ids)
+        .annotate(day=TruncDate('created_at'))
+        .values_list('player__server', 'day', 'status')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+
+
+def player_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    day = record_day(instance.created_at)
+    if created:
+        apply_changes({(instance.server, day, 'players'): 1})
+        return
+    old_server = instance.get_original_value('server')
+    if old_server is None or old_server == instance.server:
+        return
+    # 换服：玩家与其所有记录一起移到新的服务器
+    changes = Counter({(old_server, day, 'players'): -1, (instance.server, day, 'players'): 1})
+    for _, record_date, status, count in _player_record_counts([instance.pk]):
+        changes[old_server, record_date, status] -= count
+        changes[instance.server, record_date, status] += count
+    apply_changes(changes)
+
+
+def player_deleted(sender, instance, **kwargs):
+    # 玩家的记录由级联删除逐条触发 record_deleted
+    apply_changes({(instance.server, record_day(instance.created_at), 'players'): -1})
+
+
+def record_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    day = record_day(instance.created_at)
+    if created:
+        apply_changes({(_record_server(instance), day, instance.status): 1})
+        return
+    dirty = instance.get_dirty_fields()
+    if 'status' not in dirty and 'player' not in dirty:
+        return
+    old_status = dirty.get('status', instance.status)
+    server = _record_server(instance)
+    old_server = _player_server(dirty['player']) if 'player' in dirty else server
+    if old_status is None or old_server is None:
+        # 未从数据库加载的实例不知道原值，交给对账修正
+        return
+    apply_changes(Counter({(old_server, day, old_status): -1, (server, day, instance.status): 1}))
+
+
+def record_deleted(sender, instance, origin=None, **kwargs):
+    # 删除玩家时 origin 是该玩家，级联删除的记录不需要再查询服务器
+    server = _record_server(instance, origin)
+    if server is not None:
+        apply_changes({(server, record_day(instance.created_at), instance.status): -1})
+
+
+def update_record_status(queryset, status):
+    """批量修改记录状态（如后台批准/拒绝），同时更新统计；返回更新的记录数"""
+    with transaction.atomic():
+        pks = list(queryset.exclude(status=status).select_for_update().values_list('pk', flat=True).order_by())
+        rows = (
+            Record.objects.filter(pk__in=pks)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('player__server', 'day', 'status')
+            .annotate(count=Count('pk'))
+            .order_by()
+        )
+        changes = Counter()
+        for server, day, old_status, count in rows:
+            changes[server, day, old_status] -= count
+            changes[server, day, status] += count
+        updated = queryset.update(status=status, **touch_fields(Record))
+        apply_changes(changes)
+    return updated
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _sync(model, key_fields, columns, existing, expected):
+    """把 existing 中的行修正为 expected {键: {列: 值}}，缺少的行插入；返回修正的行数"""
+    changed = []
+    for row in existing:
+        key = tuple(getattr(row, field) for field in key_fields)
+        values = expected.pop(key, {})
+        if any(getattr(row, column) != values.get(column, 0) for column in columns):
+            for column in columns:
+                setattr(row, column, values.get(column, 0))
+            changed.append(row)
+    now = timezone.now()
+    for row in changed:
+        row.updated_at = now
+    model.objects.bulk_update(changed, columns + ('updated_at',), batch_size=500)
+    created = [
+        model(**dict(zip(key_fields, key)), **values)
+        for key, values in expected.items()
+        if any(values.values())
+    ]
+    model.objects.bulk_create(created, batch_size=500)
+    return len(changed) + len(created)
+
+
+def reconcile(days=None):
+    """
+    从基础表重新计算汇总并修正偏差，返回 {'servers': 修正行数, 'daily': 修正行数}
+    days 为重算的最近天数（含今天），None 时重算全部日期；ServerStats 总是全部重算。
+
+    先锁住已有的汇总行再统计：与对账并发的写入在对账提交后才能应用增量，
+    增量叠加在重算的结果上，不会丢失或重复计算。
+    """
+    players = Player.objects.order_by()
+    records = Record.objects.order_by()
+    daily = DailyServerStats.objects.all()
+    if days is not None:
+        start = timezone.localdate() - datetime.timedelta(days=days - 1)
+        daily = daily.filter(date__gte=start)
+        day_players = players.filter(created_at__gte=_day_start(start))
+        day_records = records.filter(created_at__gte=_day_start(start))
+    else:
+        day_players, day_records = players, records
+
+    with transaction.atomic():
+        existing_servers = list(ServerStats.objects.select_for_update())
+        existing_daily = list(daily.select_for_update())
+
+        servers = defaultdict(dict)
+        for server, count in players.values_list('server').annotate(count=Count('pk')):
+            servers[server,]['players'] = count
+        for server, status, count in records.values_list('player__server', 'status').annotate(count=Count('pk')):
+            servers[server,][f'records_{status}'] = count
+
+        by_day = defaultdict(dict)
+        for day, server, count in (
+            day_players.annotate(day=TruncDate('created_at')).values_list('day', 'server').annotate(count=Count('pk'))
+        ):
+            by_day[day, server]['players_created'] = count
+        for day, server, status, count in (
+            day_records.annotate(day=TruncDate('created_at'))
+            .values_list('day', 'player__server', 'status').annotate(count=Count('pk'))
+        ):
+            by_day[day, server][f'records_{status}'] = count
+
+        result = {
+            'servers': _sync(ServerStats, ('server',), SERVER_COLUMNS, existing_servers, servers),
+            'daily': _sync(DailyServerStats, ('date', 'server'), DAILY_COLUMNS, existing_daily, by_day),
+        }
+    for table, corrected in result.items():
+        if corrected:
+            RECONCILE_CORRECTIONS.inc(corrected, table=table)
+    logger.info('统计对账完成，修正 %(servers)d 行服务器统计、%(daily)d 行每日统计', result)
+    return result
@@ -0,0 +1,22 @@
+from celery import shared_task
+from django.conf import settings
+
+from utils.tasks import MaintenanceTask
+from . import partitions, stats
+
+
+@shared_task(base=MaintenanceTask)
+def reconcile_stats(days=None):
+    """
+    统计汇总对账（celery beat 每天执行）
+    默认重算最近 STATS_RECONCILE_DAYS 天的每日统计，days=0 时重算全部日期
+    """
+    if days is None:
+        days = settings.STATS_RECONCILE_DAYS
+    return stats.reconcile(days or None)
+
+
+@shared_task(base=MaintenanceTask)
+def create_record_partitions():
+    """提前创建 sfpr_record 未来 RECORD_PARTITION_MONTHS_AHEAD 个月的分区（celery beat 每天执行）"""
+    return partitions.ensure_partitions(months_ahead=settings.RECORD_PARTITION_MONTHS_AHEAD)
@@ -1,3 +1,430 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import tempfile
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.sfpr.admin import RecordAdmin
+from apps.sfpr import partitions, stats
+from apps.sfpr.models import DailyServerStats, Player, Record, ServerStats
+from apps.sfpr.serializers import (
+    LeanPlayerListSerializer, LeanRecordSerializer, PlayerListSerializer, RecordSerializer,
+)
+from utils.queries import QueryBudgetExceeded
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, QUERY_STATS_HEADER=True, API_CACHE_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    """热点接口在严格模式下不得超出查询预算，也不应出现 N+1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'submitter{i}', email=f'submitter{i}@example.com', password='pass12345')
+            for i in range(3)
+        ]
+        cls.players = []
+        for i in range(12):
+            player = Player.objects.create(nickname=f'玩家{i}', game_id=f'id{i}', server=i % 30 + 1)
+            for j, status in enumerate(['approved', 'approved', 'pending']):
+                Record.objects.create(
+                    player=player, description=f'记录{j}', status=status, submitter=cls.users[j]
+                )
+            cls.players.append(player)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertNoRepeatedQueries(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Query-Repeated'], '0')
+
+    def test_player_list(self):
+        response = self.client.get('/api/v1/players/')
+        self.assertNoRepeatedQueries(response)
+        results = response.json()
+        results = results.get('results', results)
+        self.assertTrue(all(player['records_count'] == 2 for player in results))
+
+    def test_player_search(self):
+        response = self.client.get('/api/v1/players/search/', {'nickname': '玩家1'})
+        self.assertNoRepeatedQueries(response)
+
+    def test_player_detail(self):
+        response = self.client.get(f'/api/v1/players/{self.players[0].id}/')
+        self.assertNoRepeatedQueries(response)
+        records = response.json()['records']
+        self.assertEqual(len(records), 3)
+        self.assertEqual({record['submitter_username'] for record in records}, {'submitter0', 'submitter1', 'submitter2'})
+
+    def test_record_list(self):
+        response = self.client.get('/api/v1/records/')
+        self.assertNoRepeatedQueries(response)
+
+    def test_my_records(self):
+        self.client.force_authenticate(user=self.users[0])
+        response = self.client.get('/api/v1/records/my-records/')
+        self.assertNoRepeatedQueries(response)
+
+    @override_settings(QUERY_BUDGETS={'player-list': 1})
+    def test_strict_mode_raises_when_over_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/v1/players/')
+
+
+@override_settings(API_CACHE_ENABLED=False)
+class LeanSerializerTests(TestCase):
+    """精简序列化器的 JSON 输出应与完整序列化器逐字节一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='submitter', email='submitter@example.com', password='pass12345')
+        player = Player.objects.create(nickname='玩家', game_id='id1', server=27)
+        Player.objects.create(nickname='无记录', game_id='id2', server=99)
+        Record.objects.create(player=player, description='有图片', submitter=cls.user,
+                              image_1='records/a/b/20240101_x.jpg', image_3='records/a/b/空 格.png')
+        # 提交者已删除、待审核
+        Record.objects.create(player=player, description='匿名', evidence='证据', status='pending')
+
+    def assertSameJSON(self, lean, full):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(lean), renderer.render(full))
+
+    def test_records(self):
+        request = Request(APIRequestFactory().get('/api/v1/records/', HTTP_HOST='sfpr.example.com'))
+        queryset = Record.objects.select_related('player', 'submitter')
+        for context in ({'request': request}, {}):
+            serializer = LeanRecordSerializer(context=context)
+            self.assertSameJSON(
+                serializer.serialize(serializer.prepare(queryset)),
+                RecordSerializer(queryset, many=True, context=context).data,
+            )
+
+    def test_players(self):
+        from api.v1.views.sfpr import PlayerViewSet
+        queryset = PlayerViewSet.queryset.all()
+        serializer = LeanPlayerListSerializer()
+        self.assertSameJSON(serializer.serialize(serializer.prepare(queryset)),
+                            PlayerListSerializer(queryset, many=True).data)
+
+    def test_endpoints(self):
+        """开启与关闭精简序列化时接口响应一致"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        for path in ('/api/v1/players/', '/api/v1/players/search/?nickname=玩家',
+                     '/api/v1/records/?ordering=created_at', '/api/v1/records/my-records/'):
+            lean = client.get(path)
+            with self.settings(LEAN_SERIALIZERS_ENABLED=False):
+                full = client.get(path)
+            self.assertEqual(lean.status_code, 200)
+            self.assertEqual(lean.content, full.content)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'conditional-tests'},
+        'hot': {'BACKEND': 'utils.cache_backends.TieredCache', 'LOCATION': 'default'},
+    },
+    API_CACHE_ENABLED=True, THROTTLE_ENABLED=False,
+)
+class ConditionalRequestTests(TestCase):
+    """ETag / Last-Modified：验证器匹配时在序列化之前返回 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='submitter', email='submitter@example.com', password='pass12345')
+        cls.player = Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        cls.record = Record.objects.create(player=cls.player, description='记录', submitter=cls.user, status='pending')
+
+    def setUp(self):
+        from django.core.cache import caches
+        caches['default'].clear()
+        self.client = APIClient()
+
+    def assertNotModified(self, path, response, **params):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        again = self.client.get(path, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        return again
+
+    def test_player_detail_counts_views(self):
+        path = f'/api/v1/players/{self.player.id}/'
+        response = self.client.get(path)
+        # 验证器已缓存，304 只执行递增查看次数的一条 UPDATE
+        with self.assertNumQueries(1):
+            self.assertNotModified(path, response)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.views_count, 2)
+
+        # 查看次数不使验证器缓存失效，缓存过期后反映到 ETag
+        from django.core.cache import caches
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        caches['default'].clear()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['views_count'], 4)
+
+        # 记录变更后返回新内容
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.record.description = '修改后的记录'
+        self.record.save()
+        changed = self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(self.client.get('/api/v1/players/not-a-uuid/').status_code, 404)
+
+    def test_lists(self):
+        response = self.client.get('/api/v1/players/')
+        self.assertNotModified('/api/v1/players/', response)
+        Player.objects.create(nickname='新玩家', game_id='id2', server=2)
+        self.assertEqual(self.client.get('/api/v1/players/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        # 只统计当前页玩家的记录：其他玩家的记录变更不改变验证器
+        other = Player.objects.create(nickname='其他玩家', game_id='id3', server=3)
+        response = self.client.get('/api/v1/players/', {'server': 1})
+        self.assertNotModified('/api/v1/players/', response, server=1)
+        Record.objects.create(player=other, description='其他记录', submitter=self.user, status='approved')
+        self.assertEqual(
+            self.client.get('/api/v1/players/', {'server': 1}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+        )
+        self.record.description = '修改后的记录'
+        self.record.save()
+        self.assertEqual(
+            self.client.get('/api/v1/players/', {'server': 1}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200
+        )
+
+        response = self.client.get('/api/v1/players/search/', {'nickname': '玩家'})
+        self.assertNotModified('/api/v1/players/search/', response, nickname='玩家')
+        response = self.client.get('/api/v1/players/search/', {'nickname': '玩家'}, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        path = '/api/v1/records/'
+        response = self.client.get(path, {'status': 'pending'})
+        self.assertNotModified(path, response, status='pending')
+        # 管理后台的批量审核同时更新 updated_at
+        with mock.patch.object(RecordAdmin, 'message_user'):
+            RecordAdmin(Record, None).approve_records(None, Record.objects.all())
+        self.assertEqual(self.client.get(path, {'status': 'pending'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_my_records_per_user(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/v1/records/my-records/')
+        self.assertNotModified('/api/v1/records/my-records/', response)
+        self.client.force_authenticate(other)
+        response = self.client.get('/api/v1/records/my-records/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class PlayerViewsTests(TestCase):
+    def test_increment_does_not_overwrite_concurrent_views(self):
+        """递增查看次数后保存其他字段，不覆盖并发请求的递增"""
+        player = Player.objects.get(pk=Player.objects.create(nickname='玩家', game_id='id1', server=1).pk)
+        player.increment_views()
+        self.assertEqual(player.views_count, 1)
+        self.assertFalse(player.has_changed('views_count'))
+        Player.add_view(player.pk)
+
+        player.nickname = '改名'
+        player.save()
+        player.refresh_from_db()
+        self.assertEqual((player.nickname, player.views_count), ('改名', 2))
+
+
+class ServerStatsTests(TestCase):
+    """统计汇总随写入增量维护，与基础表对账的结果一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.player = Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        Player.objects.create(nickname='玩家', game_id='id2', server=2)
+        for status in ('approved', 'approved', 'pending'):
+            Record.objects.create(player=cls.player, description='记录', status=status)
+
+    def assertStats(self, server, **expected):
+        row = ServerStats.objects.filter(server=server).values(*expected).first()
+        self.assertEqual(row, expected)
+
+    def assertReconciled(self):
+        """增量维护的结果与从基础表重算的相同"""
+        self.assertEqual(stats.reconcile(), {'servers': 0, 'daily': 0})
+
+    def test_incremental(self):
+        self.assertStats(1, players=1, records_approved=2, records_pending=1)
+        self.assertStats(2, players=1, records_approved=0)
+        today = timezone.localdate()
+        daily = DailyServerStats.objects.get(date=today, server=1)
+        self.assertEqual((daily.players_created, daily.records_approved, daily.records_pending), (1, 2, 1))
+
+        record = Record.objects.get(status='pending')
+        record.status = 'rejected'
+        record.save()
+        self.assertStats(1, records_pending=0, records_rejected=1)
+
+        # 换服时记录一起移动
+        player = Player.objects.get(pk=self.player.pk)
+        player.server = 2
+        player.save()
+        self.assertStats(1, players=0, records_approved=0, records_rejected=0)
+        self.assertStats(2, players=2, records_approved=2, records_rejected=1)
+        self.assertReconciled()
+
+        player.delete()
+        self.assertStats(2, players=1, records_approved=0, records_rejected=0)
+        self.assertReconciled()
+
+    def test_bulk_status_update(self):
+        with mock.patch.object(RecordAdmin, 'message_user'):
+            RecordAdmin(Record, None).reject_records(None, Record.objects.all())
+        self.assertStats(1, records_pending=0, records_approved=0, records_rejected=3)
+        self.assertReconciled()
+
+    def test_reconcile_fixes_drift(self):
+        # 信号覆盖不到的写入
+        Record.objects.bulk_create([Record(player=self.player, description='导入', status='pending')])
+        ServerStats.objects.filter(server=2).delete()
+        self.assertEqual(stats.reconcile(days=1), {'servers': 2, 'daily': 1})
+        self.assertStats(1, records_pending=2)
+        self.assertStats(2, players=1)
+        self.assertReconciled()
+
+    def test_api(self):
+        response = self.client.get('/api/v1/stats/servers/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['totals'], {'players': 2, 'records_pending': 1, 'records_approved': 2, 'records_rejected': 0})
+        self.assertEqual(data['results'][0]['server_name'], '艾欧尼亚')
+
+        today = timezone.localdate()
+        DailyServerStats.objects.create(date=today - datetime.timedelta(days=40), server=1, records_pending=5)
+        response = self.client.get('/api/v1/stats/daily/', {'server': 1})
+        self.assertEqual(response.json()['totals']['records_pending'], 1)
+        start = (today - datetime.timedelta(days=40)).isoformat()
+        response = self.client.get('/api/v1/stats/daily/', {'from': start, 'group': 'day'})
+        results = response.json()['results']
+        self.assertEqual([row['players_created'] for row in results], [0, 2])
+        self.assertEqual(response.json()['totals']['records_pending'], 6)
+
+        self.assertEqual(self.client.get('/api/v1/stats/daily/', {'from': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/stats/daily/', {'from': today.isoformat(), 'to': start}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/stats/daily/', {'from': '2000-01-01'}).status_code, 400)
+
+
+class RecordPartitionTests(SimpleTestCase):
+    """分区的边界计算与归档导出；DDL 只在 PostgreSQL 上执行"""
+
+    def test_bounds(self):
+        self.assertEqual(partitions.add_months(datetime.date(2026, 11, 1), 2), datetime.date(2027, 1, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2026, 1, 1), -13), datetime.date(2024, 12, 1))
+        self.assertEqual(partitions.partition_name(datetime.date(2027, 1, 1)), 'sfpr_record_p2027_01')
+        # 按 TIME_ZONE 的月初划分
+        self.assertEqual(partitions.month_bound(datetime.date(2026, 11, 1)).isoformat(), '2026-11-01T00:00:00+08:00')
+
+        lower, upper = partitions.parse_bounds(
+            "FOR VALUES FROM ('2026-10-31 16:00:00+00') TO ('2026-11-30 16:00:00+00')"
+        )
+        self.assertEqual(timezone.localtime(lower).date(), datetime.date(2026, 11, 1))
+        self.assertEqual(upper - lower, datetime.timedelta(days=30))
+        lower, upper = partitions.parse_bounds("FOR VALUES FROM (MINVALUE) TO ('2026-12-01 00:00:00+08')")
+        self.assertIsNone(lower)
+        self.assertEqual(upper, partitions.month_bound(datetime.date(2026, 12, 1)))
+
+    def test_export(self):
+        rows = 'id,description\n1,"两行\n记录"\n2,记录\n'.encode()
+        cursor = mock.Mock(spec=['execute', 'fetchone', 'fetchall', 'cursor'])
+        cursor.cursor = mock.Mock(spec=['copy_expert'])
+        cursor.cursor.copy_expert.side_effect = lambda sql, stream: stream.write(rows)
+        cursor.fetchone.return_value = (2,)
+        cursor.fetchall.return_value = [('id',), ('description',)]
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = partitions._export(cursor, 'sfpr_record_p2024_01', 'FOR VALUES ...', directory)
+            self.assertEqual((manifest['rows'], manifest['columns']), (2, ['id', 'description']))
+            with gzip.open(f'{directory}/sfpr_record_p2024_01.csv.gz', 'rb') as f:
+                self.assertEqual(f.read(), rows)
+            with open(f'{directory}/sfpr_record_p2024_01.json', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['sha256'], manifest['sha256'])
+
+            # 导出的行数与表中不一致时不写入归档文件
+            cursor.fetchone.return_value = (3,)
+            with self.assertRaises(RuntimeError):
+                partitions._export(cursor, 'sfpr_record_p2024_02', 'FOR VALUES ...', directory)
+            self.assertFalse(any(name.startswith('sfpr_record_p2024_02') for name in os.listdir(directory)))
+
+
+class RecordPartitionDatabaseTests(TestCase):
+    """分区表由迁移 0007 创建：PostgreSQL 上为 legacy 分区加提前创建的月分区"""
+
+    @skipIf(connection.vendor == 'postgresql', '其他数据库上不分区')
+    def test_requires_postgresql(self):
+        self.assertEqual(partitions.list_partitions(), [])
+        self.assertEqual(partitions.ensure_partitions(), [])
+        with self.assertRaises(CommandError):
+            call_command('archive_record_partitions', '--dry-run')
+
+    @skipUnless(connection.vendor == 'postgresql', '分区只支持 PostgreSQL')
+    def test_partitions(self):
+        months_ahead = settings.RECORD_PARTITION_MONTHS_AHEAD
+        rows = partitions.list_partitions()
+        (legacy, legacy_lower, legacy_upper, _), *monthly = rows
+        self.assertEqual(legacy, partitions.LEGACY)
+        self.assertIsNone(legacy_lower)
+        self.assertFalse(any(pending for *_, pending in rows))
+
+        # 月分区从 legacy 的上界开始首尾相接，覆盖到 months_ahead 个月之后
+        previous = legacy_upper
+        for name, lower, upper, _ in monthly:
+            day = timezone.localtime(lower).date()
+            self.assertEqual(name, partitions.partition_name(day))
+            self.assertEqual(lower, previous)
+            self.assertEqual(upper, partitions.month_bound(partitions.add_months(day, 1)))
+            previous = upper
+        this_month = partitions.month_start(timezone.localdate())
+        self.assertEqual(previous, partitions.month_bound(partitions.add_months(this_month, months_ahead + 1)))
+        self.assertEqual(partitions.ensure_partitions(months_ahead=months_ahead), [])
+
+        player = Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        record = Record.objects.create(player=player, description='记录')
+        self.assertEqual(Record.objects.get(pk=record.pk).player_id, player.pk)
+
+    @skipUnless(connection.vendor == 'postgresql', '分区只支持 PostgreSQL')
+    def test_identity_id_sequence(self):
+        """自增 id（identity 或 serial）转换后由父表的独立序列继续生成"""
+        for column in ('bigint GENERATED BY DEFAULT AS IDENTITY', 'bigserial'):
+            with self.subTest(column=column), connection.cursor() as cursor:
+                cursor.execute(f'CREATE TABLE scratch_legacy (id {column}, created_at timestamptz NOT NULL)')
+                cursor.execute('INSERT INTO scratch_legacy (created_at) SELECT now() FROM generate_series(1, 3)')
+                self.assertTrue(partitions._detach_id_sequence(cursor, 'scratch_legacy', 'scratch_id_seq'))
+                cursor.execute(
+                    'CREATE TABLE scratch (LIKE scratch_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+                )
+                partitions._set_id_default(cursor, 'scratch', 'scratch_id_seq', ['scratch_legacy'])
+                cursor.execute('ALTER TABLE scratch ATTACH PARTITION scratch_legacy FOR VALUES FROM (MINVALUE) TO (MAXVALUE)')
+                cursor.execute('INSERT INTO scratch (created_at) VALUES (now()) RETURNING id')
+                self.assertEqual(cursor.fetchone()[0], 4)
+                cursor.execute("SELECT pg_get_serial_sequence('scratch', 'id')")
+                self.assertEqual(cursor.fetchone()[0], 'public.scratch_id_seq')
+                cursor.execute('DROP TABLE scratch')
+                cursor.execute("SELECT to_regclass('scratch_id_seq')")
+                self.assertIsNone(cursor.fetchone()[0])
+
+        with connection.cursor() as cursor:
+            # Record 的主键是 UUID，没有需要转换的序列
+            self.assertFalse(partitions._detach_id_sequence(cursor, partitions.LEGACY, partitions.ID_SEQUENCE))
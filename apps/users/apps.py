@@ -5,3 +5,16 @@ class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.users"
     verbose_name = "用户管理"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from utils.caching import invalidate_on_change
+        from .authentication import forget_user_snapshot
+        from .models import User
+
+        post_save.connect(forget_user_snapshot, sender=User, dispatch_uid='users:forget-snapshot:save')
+        post_delete.connect(forget_user_snapshot, sender=User, dispatch_uid='users:forget-snapshot:delete')
+
+        # 登录只更新 last_login，不使记录列表（提交者用户名）的缓存失效
+        invalidate_on_change(User, ignore_fields=('last_login',))
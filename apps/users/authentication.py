@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+SNAPSHOT_KEY = 'user:snapshot:v2:{}'
+# 不写入缓存的字段：缓存在 Redis 与各工作进程内存中，不能包含密码哈希；用到时（修改密码等）再从数据库加载
+SNAPSHOT_EXCLUDED_FIELDS = ('password',)
+
+
+def snapshot_cache():
+    return caches[settings.HOT_CACHE_ALIAS]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT 认证，按 uid 缓存用户对象（两级缓存，见 utils.cache_backends.TieredCache）
+
+    每个认证请求原本都要查询一次用户表；用户保存或删除后缓存立即失效（forget_user_snapshot），
+    启用状态与密码变更的校验与 JWTAuthentication 一致。
+    缓存的是字段值而不是用户对象，不含密码哈希（SNAPSHOT_EXCLUDED_FIELDS），
+    吊销校验只需要其摘要（与令牌中的 REVOKE_TOKEN_CLAIM 相同）。
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = SNAPSHOT_KEY.format(user_id)
+        snapshot = snapshot_cache().get(key)
+        if snapshot is None:
+            user = super().get_user(validated_token)
+            snapshot_cache().set(key, self.make_snapshot(user), settings.USER_SNAPSHOT_TIMEOUT)
+            return user
+
+        user, password_hash = self.from_snapshot(snapshot)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != password_hash:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    @staticmethod
+    def make_snapshot(user):
+        """(数据库别名, {字段: 值}, 密码哈希的摘要)"""
+        values = {
+            # 文件字段只存文件名：FieldFile 会连同所属的用户对象（含密码）一起序列化
+            field.attname: field.get_prep_value(getattr(user, field.attname))
+            if isinstance(field, models.FileField) else getattr(user, field.attname)
+            for field in user._meta.concrete_fields
+            if field.name not in SNAPSHOT_EXCLUDED_FIELDS
+        }
+        return user._state.db, values, get_md5_hash_password(user.password)
+
+    def from_snapshot(self, snapshot):
+        """还原为未加载排除字段（延迟加载）的用户对象"""
+        db, values, password_hash = snapshot
+        return self.user_model.from_db(db, list(values), list(values.values())), password_hash
+
+
+def forget_user_snapshot(sender, instance, **kwargs):
+    """用户保存或删除后丢弃其缓存（事务中再在提交后丢弃一次，避免其他请求缓存提交前的数据）"""
+    key = SNAPSHOT_KEY.format(getattr(instance, api_settings.USER_ID_FIELD))
+    snapshot_cache().delete(key)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: snapshot_cache().delete(key))
@@ -1,29 +1,55 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.db.models.functions import Lower
 
 User = get_user_model()
 
 class EmailBackend(ModelBackend):
     """
     邮箱认证后端
-    
-    允许用户使用邮箱和密码进行登录
+
+    允许用户使用邮箱或用户名和密码进行登录
     """
-    
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # 支持使用邮箱或用户名登录
-            user = User.objects.get(
-                Q(username=username) | Q(email=username)
-            )
-            if user.check_password(password):
+
+    def _find_user(self, field, value):
+        """按 LOWER(field) 查找用户，命中 LOWER() 表达式索引"""
+        candidates = list(
+            User._default_manager.alias(lookup=Lower(field)).filter(lookup=value.lower())[:2]
+        )
+        if len(candidates) == 1:
+            return candidates[0]
+        # 存在仅大小写不同的多个账号时只接受完全一致的那个
+        for user in candidates:
+            if getattr(user, field) == value:
                 return user
-        except User.DoesNotExist:
+        return None
+
+    def get_user_by_login(self, username):
+        """根据输入形态选择查询：包含 @ 的按邮箱查询，否则按用户名查询"""
+        if '@' in username:
+            user = self._find_user('email', username)
+            if user is not None:
+                return user
+        return self._find_user('username', username)
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_user_by_login(username)
+        if user is None:
+            # 用户不存在时同样执行一次密码哈希，避免通过响应时间探测账号是否存在
+            User().set_password(password)
             return None
-        
+        # 密码正确且哈希参数已变化时，check_password 会自动按新参数重新哈希
+        if user.check_password(password):
+            return user
+        return None
+
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
-            return None 
\ No newline at end of file
+            return None
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    迭代次数可配置的 PBKDF2 哈希器
+
+    与 Django 默认哈希器使用同一算法标识，已有密码可以直接校验；
+    迭代次数与 PASSWORD_HASH_ITERATIONS 不一致的密码会在下次登录成功时重新哈希。
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,52 @@
+import time
+import uuid
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = '登录性能基准：测量单个工作进程每秒可完成的登录次数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20, help='每个场景的登录次数')
+        parser.add_argument('--hash-iterations', type=int, default=None,
+                            help='临时覆盖 PASSWORD_HASH_ITERATIONS，用于比较不同哈希参数')
+
+    def handle(self, *args, **options):
+        rounds = options['rounds']
+        overrides = {}
+        if options['hash_iterations']:
+            overrides['PASSWORD_HASH_ITERATIONS'] = options['hash_iterations']
+
+        with override_settings(**overrides), transaction.atomic():
+            suffix = uuid.uuid4().hex[:8]
+            password = uuid.uuid4().hex
+            user = User.objects.create_user(
+                username=f'bench_{suffix}',
+                email=f'bench_{suffix}@example.com',
+                password=password,
+            )
+            scenarios = [
+                ('邮箱登录', user.email, password),
+                ('用户名登录(大小写不敏感)', user.username.upper(), password),
+                ('密码错误', user.email, password + 'x'),
+                ('用户不存在', f'missing_{suffix}@example.com', password),
+            ]
+            for name, username, secret in scenarios:
+                elapsed = self._measure(rounds, username, secret)
+                self.stdout.write(
+                    f'{name}: {rounds / elapsed:.1f} 次/秒，平均 {elapsed * 1000 / rounds:.1f} ms'
+                )
+            # 基准数据不落库
+            transaction.set_rollback(True)
+
+    def _measure(self, rounds, username, password):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            authenticate(username=username, password=password)
+        return time.perf_counter() - start
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:19
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.db.models.expressions
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 并发建索引不能在事务中执行
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0006_invitationcode"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="user",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Lower("username"),
+                    name="text_pattern_ops",
+                ),
+                name="users_user_username_lower_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.text.Substr(
+                    django.db.models.functions.text.Lower("email"),
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.text.StrIndex(
+                            django.db.models.functions.text.Lower("email"),
+                            models.Value("@"),
+                        ),
+                        "+",
+                        models.Value(1),
+                    ),
+                ),
+                name="users_user_email_domain_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:28
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 并发建索引不能在事务中执行
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0007_user_directory_search_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.text.Lower("email"),
+                name="users_user_email_lower_idx",
+            ),
+        ),
+    ]
@@ -1,17 +1,21 @@
-from django.db import models
+import re
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Lower, StrIndex, Substr
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.contrib.postgres.indexes import OpClass
 from django.core.validators import EmailValidator
 from django.utils import timezone
-from PIL import Image
-import shortuuid
 import os
 from django.conf import settings
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from utils.models import DirtyFieldsMixin
 
 def generate_uid():
     """生成10位纯数字的UID"""
-    # 使用 shortuuid 生成纯数字的唯一标识符
+    # 使用 shortuuid 生成纯数字的唯一标识符（用到时才导入，缩短工作进程启动时间）
+    import shortuuid
     return 'smtx' + shortuuid.ShortUUID(alphabet="0123456789").uuid()[:10]
 
 def avatar_upload_path(instance, filename):
@@ -20,6 +24,31 @@ def avatar_upload_path(instance, filename):
     timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
     return f'avatars/avatar_{instance.uid}_{timestamp}.{ext}'
 
+UID_QUERY_RE = re.compile(r'^(smtx)?\d{1,10}$|^smtx$', re.IGNORECASE)
+UID_LENGTH = 14
+
+def email_domain_expression():
+    """邮箱域名表达式，查询与索引共用同一定义才能命中表达式索引"""
+    email = Lower('email')
+    return Substr(email, StrIndex(email, Value('@')) + 1)
+
+def classify_directory_query(query):
+    """
+    识别用户目录搜索的查询类型
+    :return: (类型, 规范化后的关键词)，类型为 uid / digits / email / email_domain / username
+    纯数字既可能是省略 smtx 前缀的 UID，也可能是用户名的开头，归为 digits
+    """
+    query = query.strip()
+    if UID_QUERY_RE.match(query):
+        if query.isdigit():
+            return 'digits', query
+        return 'uid', 'smtx' + query[4:]
+    if query.startswith('@'):
+        return 'email_domain', query[1:].lower()
+    if '@' in query:
+        return 'email', query.lower()
+    return 'username', query.lower()
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, password=None, **extra_fields):
         """
@@ -54,7 +83,32 @@ class CustomUserManager(BaseUserManager):
         
         return self.create_user(username=username, password=password, **extra_fields)
 
-class User(AbstractUser):
+    def directory_search(self, query):
+        """
+        管理后台用户目录搜索
+        - UID（smtx 前缀）：完整 UID 精确匹配，否则前缀匹配
+        - 纯数字：按省略前缀的 UID 匹配，或用户名前缀匹配
+        - 邮箱：完整邮箱精确匹配（不区分大小写），@域名 按域名过滤
+        - 其他：用户名前缀匹配（不区分大小写）
+        所有分支都只使用前缀或等值条件，可以走索引
+        """
+        kind, term = classify_directory_query(query)
+        queryset = self.get_queryset().alias(username_lower=Lower('username'))
+        if kind == 'uid':
+            return queryset.filter(self._uid_condition(term))
+        if kind == 'digits':
+            return queryset.filter(self._uid_condition('smtx' + term) | Q(username_lower__startswith=term))
+        if kind == 'email':
+            return queryset.alias(email_lower=Lower('email')).filter(email_lower=term)
+        if kind == 'email_domain':
+            return queryset.alias(email_domain=email_domain_expression()).filter(email_domain=term)
+        return queryset.filter(username_lower__startswith=term)
+
+    @staticmethod
+    def _uid_condition(uid):
+        return Q(uid=uid) if len(uid) == UID_LENGTH else Q(uid__startswith=uid)
+
+class User(DirtyFieldsMixin, AbstractUser):
     # 基本信息
     uid = models.CharField(max_length=14, unique=True, editable=False, 
                          default=generate_uid, verbose_name='UID')
@@ -81,6 +135,16 @@ class User(AbstractUser):
         verbose_name = '用户'
         verbose_name_plural = verbose_name
         ordering = ['-created_at']
+        indexes = [
+            # uid 前缀匹配使用唯一约束自带的 varchar_pattern_ops 索引
+            models.Index(
+                OpClass(Lower('username'), name='text_pattern_ops'),
+                name='users_user_username_lower_idx',
+            ),
+            models.Index(email_domain_expression(), name='users_user_email_domain_idx'),
+            # 登录时按 LOWER(email) 等值查询
+            models.Index(Lower('email'), name='users_user_email_lower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username}({self.uid})"
@@ -89,22 +153,23 @@ class User(AbstractUser):
         if not self.pk and not self.username:
             self.username = self.uid
             
-        # 处理头像更新
-        if self.pk:
-            try:
-                old_instance = User.objects.get(pk=self.pk)
-                # 如果头像发生变化且存在旧头像，则删除旧头像文件
-                if old_instance.avatar and self.avatar != old_instance.avatar:
-                    if os.path.isfile(old_instance.avatar.path):
-                        os.remove(old_instance.avatar.path)
-            except User.DoesNotExist:
-                pass
+        # 处理头像更新，只有头像真正变化时才需要处理文件
+        avatar_changed = self.has_changed('avatar')
+        if avatar_changed and self.pk:
+            # 如果存在旧头像，则删除旧头像文件
+            old_avatar = self.get_original_value('avatar')
+            if old_avatar:
+                old_path = self.avatar.storage.path(old_avatar)
+                if os.path.isfile(old_path):
+                    os.remove(old_path)
             
         super().save(*args, **kwargs)
         
         # 处理新上传的头像
-        if self.avatar:
+        if avatar_changed and self.avatar:
             try:
+                # Pillow 只在处理头像时导入
+                from PIL import Image
                 img = Image.open(self.avatar.path)
                 # 统一调整为 300x300 像素
                 output_size = (300, 300)
@@ -151,9 +216,10 @@ class BlacklistedUser(models.Model):
 
 def generate_invitation_code():
     """生成8位邀请码"""
+    import shortuuid
     return shortuuid.ShortUUID(alphabet="23456789ABCDEFGHJKLMNPQRSTUVWXYZ").random(length=8)
 
-class InvitationCode(models.Model):
+class InvitationCode(DirtyFieldsMixin, models.Model):
     code = models.CharField(
         max_length=8,
         unique=True,
@@ -190,14 +256,27 @@ class InvitationCode(models.Model):
         return f"邀请码: {self.code}"
 
     def use(self, user):
-        """使用邀请码"""
+        """
+        使用邀请码
+        通过 UPDATE ... WHERE is_used = false 单条语句完成核销，
+        并发请求中只有一个能更新成功，其余的抛出 ValueError
+        """
         if self.is_used:
             raise ValueError('邀请码已被使用')
             
+        used_at = timezone.now()
+        updated = InvitationCode.objects.filter(pk=self.pk, is_used=False).update(
+            is_used=True,
+            used_by=user,
+            used_at=used_at
+        )
+        if not updated:
+            raise ValueError('邀请码已被使用')
+        
         self.is_used = True
         self.used_by = user
-        self.used_at = timezone.now()
-        self.save()
+        self.used_at = used_at
+        self._take_snapshot(['is_used', 'used_by', 'used_at'])
 
     @classmethod
     def create_invitation_code(cls, created_by, note=None):
@@ -212,6 +291,48 @@ class InvitationCode(models.Model):
             note=note
         )
 
+    @classmethod
+    def bulk_create_invitation_codes(cls, created_by, count, note=None,
+                                     batch_size=1000, max_attempts=5):
+        """
+        批量创建邀请码
+        :param created_by: 创建者（User对象）
+        :param count: 创建数量
+        :param note: 这一批邀请码共用的备注
+        :return: 新建的 InvitationCode 列表
+        """
+        created = []
+        remaining = count
+        for _ in range(max_attempts):
+            codes = set()
+            while len(codes) < remaining:
+                codes.add(generate_invitation_code())
+            
+            # 剔除数据库中已存在的邀请码，剩余数量在下一轮重新生成
+            codes = list(codes)
+            existing = set()
+            for start in range(0, len(codes), batch_size):
+                chunk = codes[start:start + batch_size]
+                existing.update(cls.objects.filter(code__in=chunk).values_list('code', flat=True))
+            
+            invitations = [
+                cls(code=code, created_by=created_by, note=note)
+                for code in codes if code not in existing
+            ]
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create(invitations, batch_size=batch_size)
+            except IntegrityError:
+                # 与并发生成的邀请码冲突，整批重新生成
+                continue
+            
+            created.extend(invitations)
+            remaining -= len(invitations)
+            if not remaining:
+                return created
+        
+        raise IntegrityError(f'邀请码生成冲突次数过多，仍有 {remaining} 个未生成')
+
     @property
     def is_valid(self):
         """检查邀请码是否有效"""
@@ -1,6 +1,74 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
-    max_page_size = 100 
\ No newline at end of file
+    max_page_size = 100 
+
+
+def estimated_rows(model, using):
+    """PostgreSQL 统计信息中的表行数估计（pg_class.reltuples），不是 PostgreSQL 或从未 ANALYZE 时返回 None"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class CappedCountPaginator(Paginator):
+    """
+    总数最多精确数到 count_cap 条（COUNT 子查询带 LIMIT），超过时：
+    estimate 为真（未过滤的列表）时使用表的估计行数，否则返回 count_cap
+    """
+
+    def __init__(self, object_list, per_page, count_cap, estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_cap = count_cap
+        self.estimate = estimate
+        self.exact = True
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.exact:
+            return super().page(number)
+        # 总数不精确时不按总数截断最后一页
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    @cached_property
+    def count(self):
+        count = self.object_list[:self.count_cap + 1].count()
+        if count <= self.count_cap:
+            return count
+        self.exact = False
+        if self.estimate:
+            estimate = estimated_rows(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > self.count_cap:
+                return estimate
+        return self.count_cap
+
+
+class DirectoryPagination(StandardResultsSetPagination):
+    """
+    用户目录分页：百万级用户时精确的 COUNT(*) 比查询本身还慢
+    未搜索时超过 USER_DIRECTORY_COUNT_CAP 的总数为估计值；搜索时总数最多为 USER_DIRECTORY_COUNT_CAP
+    """
+    search_param = 'search'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CappedCountPaginator,
+            count_cap=settings.USER_DIRECTORY_COUNT_CAP,
+            estimate=not request.query_params.get(self.search_param, '').strip(),
+        )
+        return super().paginate_queryset(queryset, request, view)
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.core.cache import cache
 from django.conf import settings
+from django.db import transaction
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 import random
 from apps.users.models import BlacklistedUser, InvitationCode
@@ -84,6 +85,11 @@ class CreateInvitationCodeSerializer(serializers.ModelSerializer):
         model = InvitationCode
         fields = ['note']
 
+class BulkCreateInvitationCodeSerializer(serializers.Serializer):
+    """批量创建邀请码序列化器"""
+    count = serializers.IntegerField(min_value=1, max_value=5000)
+    note = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
 class EmailRegisterSerializer(serializers.ModelSerializer):
     """邮箱注册序列化器"""
     email = serializers.EmailField(required=True)
@@ -145,16 +151,20 @@ class EmailRegisterSerializer(serializers.ModelSerializer):
         password = validated_data['password']
         invitation = validated_data.get('invitation_code')
         
-        # 创建用户
-        user = User.objects.create_user(
-            email=email,
-            password=password,
-            is_email_verified=True
-        )
-        
-        # 如果有邀请码，使用它
-        if invitation:
-            invitation.use(user)
+        # 创建用户与核销邀请码在同一事务中，邀请码被并发抢用时回滚用户创建
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=email,
+                password=password,
+                is_email_verified=True
+            )
+            
+            # 如果有邀请码，使用它
+            if invitation:
+                try:
+                    invitation.use(user)
+                except ValueError as e:
+                    raise serializers.ValidationError({'invitation_code': [str(e)]})
         
         return user
 
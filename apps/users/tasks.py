@@ -0,0 +1,86 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+
+from utils.conditional import touch_fields
+from utils.tasks import MaintenanceTask
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_pk_batches(queryset, batch_size):
+    """按主键分批取出待处理的记录，每批处理完后重新查询剩余记录"""
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+
+
+@shared_task(base=MaintenanceTask)
+def delete_stored_files(names):
+    """从存储中删除文件（延迟删除队列）"""
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.exception('删除文件失败: %s', name)
+
+
+@shared_task(bind=True, base=MaintenanceTask)
+def delete_user_account(self, user_pk):
+    """
+    后台删除账号
+    按批处理所有指向该用户的关联数据（SET_NULL 置空，CASCADE 删除），
+    每批一个短事务，最后删除用户本身，头像等文件交给延迟删除队列（在请求内执行时直接删除）。
+    """
+    User = get_user_model()
+    try:
+        user = User.objects.get(pk=user_pk)
+    except User.DoesNotExist:
+        logger.info('待删除的账号不存在: %s', user_pk)
+        return {'user': user_pk, 'processed': 0}
+
+    # 账号已被重新启用时不再删除
+    if user.is_active:
+        logger.warning('账号 %s 仍处于启用状态，取消删除', user.uid)
+        return {'user': user.uid, 'processed': 0}
+
+    batch_size = settings.ACCOUNT_DELETION_BATCH_SIZE
+    progress = {'user': user.uid, 'step': None, 'processed': 0}
+    # 在请求内执行（任务队列不可用时的退路）：不写结果后端、不提交新任务，它们与队列共用同一个 Redis
+    inline = self.request.called_directly or self.request.is_eager
+
+    for relation in User._meta.related_objects:
+        if relation.many_to_many or relation.on_delete not in (models.CASCADE, models.SET_NULL):
+            continue
+
+        related_manager = relation.related_model._base_manager
+        related = related_manager.filter(**{relation.field.name: user})
+        progress['step'] = relation.get_accessor_name()
+        for pks in _iter_pk_batches(related, batch_size):
+            batch = related_manager.filter(pk__in=pks)
+            with transaction.atomic():
+                if relation.on_delete is models.SET_NULL:
+                    # 同时更新 updated_at，列表的 ETag 随之变化
+                    batch.update(**{relation.field.name: None}, **touch_fields(relation.related_model))
+                else:
+                    batch.delete()
+            progress['processed'] += len(pks)
+            if not inline:
+                self.update_state(state='PROGRESS', meta=progress)
+            logger.info('删除账号 %(user)s: %(step)s 已处理 %(processed)d 条', progress)
+
+    files = [user.avatar.name] if user.avatar else []
+    with transaction.atomic():
+        user.delete()
+        if files:
+            transaction.on_commit(lambda: delete_stored_files(files) if inline else delete_stored_files.delay(files))
+
+    progress['step'] = 'done'
+    logger.info('账号 %s 已删除', progress['user'])
+    return progress
@@ -1,5 +1,8 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model, authenticate
+from apps.users.authentication import CachedJWTAuthentication
 from apps.users.backends import EmailBackend
 
 User = get_user_model()
@@ -55,4 +58,70 @@ class EmailBackendTests(TestCase):
     def test_get_nonexistent_user(self):
         """测试获取不存在的用户"""
         user = self.backend.get_user(999)
-        self.assertIsNone(user) 
\ No newline at end of file
+        self.assertIsNone(user) 
+
+    def test_authenticate_case_insensitive(self):
+        """测试邮箱和用户名不区分大小写"""
+        self.assertEqual(authenticate(username='TEST@Example.com', password='testpass123'), self.user)
+        self.assertEqual(authenticate(username='TestUser', password='testpass123'), self.user)
+
+    def test_username_containing_at_sign(self):
+        """测试按邮箱未命中时回退到用户名"""
+        user = User.objects.create_user(username='at@name', email='other@example.com', password='pass12345')
+        self.assertEqual(authenticate(username='at@name', password='pass12345'), user)
+
+    def test_nonexistent_user_still_hashes(self):
+        """测试用户不存在时同样执行密码哈希"""
+        with mock.patch.object(User, 'set_password') as set_password:
+            self.assertIsNone(authenticate(username='nobody', password='testpass123'))
+        set_password.assert_called_once_with('testpass123')
+
+    def test_rehash_on_iteration_change(self):
+        """测试迭代次数变化后登录自动重新哈希"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.assertIsNotNone(authenticate(username='testuser', password='testpass123'))
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.password.split('$')[1], '1000')
+            self.assertTrue(self.user.check_password('testpass123'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-snapshot-tests'},
+    'hot': {'BACKEND': 'utils.cache_backends.TieredCache', 'LOCATION': 'default'},
+})
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from apps.users.authentication import snapshot_cache
+
+        snapshot_cache().clear()
+        self.user = User.objects.create_user(username='snapshot', email='snapshot@example.com', password='testpass123')
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_user_snapshot_cached_until_saved(self):
+        """测试认证用户被缓存，保存后失效"""
+        from rest_framework.test import APIClient
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/users/profile/', **self.headers).json()['username'], 'snapshot')
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/v1/users/profile/', **self.headers).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get('/api/v1/users/profile/', **self.headers).status_code, 401)
+
+    def test_snapshot_excludes_password(self):
+        """测试缓存中没有密码哈希，修改密码后旧令牌仍被拒绝"""
+        import pickle
+        from rest_framework.test import APIClient
+        from apps.users.authentication import SNAPSHOT_KEY, snapshot_cache
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/users/profile/', **self.headers).status_code, 200)
+        snapshot = snapshot_cache().get(SNAPSHOT_KEY.format(self.user.uid))
+        self.assertIsNotNone(snapshot)
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(snapshot))
+
+        # 缓存还原的用户按需加载密码
+        user, _ = CachedJWTAuthentication().from_snapshot(snapshot)
+        self.assertTrue(user.check_password('testpass123'))
+
@@ -1,6 +1,12 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+
+from apps.users.models import InvitationCode
 
 User = get_user_model()
 
@@ -66,4 +72,95 @@ class UserModelTests(TestCase):
         
         # 测试UID唯一性
         uids = [user.uid for user in users]
-        self.assertEqual(len(uids), len(set(uids))) 
\ No newline at end of file
+        self.assertEqual(len(uids), len(set(uids))) 
+
+class DirectoryQueryClassificationTests(TestCase):
+    def test_classify(self):
+        """测试用户目录搜索关键词类型识别"""
+        from apps.users.models import classify_directory_query
+
+        self.assertEqual(classify_directory_query('smtx0123'), ('uid', 'smtx0123'))
+        self.assertEqual(classify_directory_query('SMTX0123'), ('uid', 'smtx0123'))
+        self.assertEqual(classify_directory_query('0123'), ('digits', '0123'))
+        self.assertEqual(classify_directory_query('@QQ.com'), ('email_domain', 'qq.com'))
+        self.assertEqual(classify_directory_query('A@QQ.com'), ('email', 'a@qq.com'))
+        self.assertEqual(classify_directory_query(' Alice '), ('username', 'alice'))
+
+
+class DirtyFieldsTrackingTests(TestCase):
+    def setUp(self):
+        created = User.objects.create_user(email='dirty@example.com', password='testpass123')
+        self.user = User.objects.get(pk=created.pk)
+
+    def test_no_changes_skips_write(self):
+        """测试 skip_if_clean 时没有变化不写库也不发送信号"""
+        with CaptureQueriesContext(connection) as ctx, mock.patch.object(post_save, 'send') as send:
+            self.user.save(skip_if_clean=True)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        send.assert_not_called()
+
+    def test_no_changes_still_sends_signals(self):
+        """测试没有变化时只更新 updated_at，仍然发送 post_save（缓存失效依赖它）"""
+        received = []
+        handler = lambda sender, update_fields=None, **kwargs: received.append(update_fields)
+        post_save.connect(handler, sender=User)
+        self.addCleanup(post_save.disconnect, handler, sender=User)
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"password"', ctx.captured_queries[0]['sql'])
+        self.assertEqual(received, [frozenset({'updated_at'})])
+
+    def test_only_changed_columns_written(self):
+        """测试只更新变化的字段"""
+        self.user.is_active = False
+        self.assertTrue(self.user.has_changed('is_active'))
+        self.assertFalse(self.user.has_changed('avatar'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"is_active"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"password"', sql)
+        self.assertFalse(self.user.has_changed('is_active'))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_original_value(self):
+        """测试获取字段原始值"""
+        self.user.bio = 'hello'
+        self.assertEqual(self.user.get_original_value('bio'), None)
+        self.assertEqual(self.user.get_dirty_fields(), {'bio': None})
+
+
+class InvitationCodeTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.user = User.objects.create_user(email='user@example.com', password='testpass123')
+
+    def test_use_is_single_shot(self):
+        """测试同一邀请码被并发读取后只能核销一次"""
+        code = InvitationCode.create_invitation_code(created_by=self.admin)
+        first = InvitationCode.objects.get(pk=code.pk)
+        second = InvitationCode.objects.get(pk=code.pk)
+
+        first.use(self.user)
+        with self.assertRaises(ValueError):
+            second.use(self.admin)
+
+        code.refresh_from_db()
+        self.assertTrue(code.is_used)
+        self.assertEqual(code.used_by, self.user)
+
+    def test_bulk_create_invitation_codes(self):
+        """测试批量生成邀请码"""
+        codes = InvitationCode.bulk_create_invitation_codes(
+            created_by=self.admin, count=50, note='batch-1', batch_size=20
+        )
+        self.assertEqual(len(codes), 50)
+        self.assertEqual(len({code.code for code in codes}), 50)
+        self.assertEqual(InvitationCode.objects.filter(note='batch-1').count(), 50)
@@ -0,0 +1,34 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from apps.users.models import BlacklistedUser, InvitationCode
+from apps.users.tasks import delete_user_account
+
+User = get_user_model()
+
+class DeleteUserAccountTaskTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='leaving@example.com', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', password='testpass123')
+
+    @override_settings(ACCOUNT_DELETION_BATCH_SIZE=2)
+    def test_deletes_related_rows_in_batches(self):
+        """测试分批处理关联数据后删除账号"""
+        BlacklistedUser.objects.create(user=self.user, blocked_user=self.other)
+        BlacklistedUser.objects.create(user=self.other, blocked_user=self.user)
+        InvitationCode.bulk_create_invitation_codes(created_by=self.user, count=5)
+        self.user.is_active = False
+        self.user.save()
+
+        result = delete_user_account(self.user.pk)
+
+        self.assertEqual(result['step'], 'done')
+        self.assertEqual(result['processed'], 7)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(BlacklistedUser.objects.exists())
+        self.assertEqual(InvitationCode.objects.filter(created_by__isnull=True).count(), 5)
+
+    def test_active_account_is_not_deleted(self):
+        """测试账号仍启用时不删除"""
+        delete_user_account(self.user.pk)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
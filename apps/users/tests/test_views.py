@@ -3,11 +3,16 @@ from django.urls import reverse
 from django.core.cache import cache
 from django.core import mail
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from rest_framework.test import APIClient
 from rest_framework import status
 import re
+from unittest import mock, skipUnless
 
 from django.contrib.auth import get_user_model
+from apps.users.models import InvitationCode
 User = get_user_model()
 
 class UserViewSetTests(TestCase):
@@ -153,4 +158,216 @@ class UserViewSetTests(TestCase):
 
     def tearDown(self):
         cache.clear()
-        mail.outbox = [] 
\ No newline at end of file
+        mail.outbox = [] 
+
+class UserDirectorySearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='admin123'
+        )
+        self.alice = User.objects.create_user(
+            username='Alice',
+            email='alice@qq.com',
+            password='testpass123'
+        )
+        self.bob = User.objects.create_user(
+            username='bob',
+            email='bob@163.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def _search(self, keyword):
+        response = self.client.get('/api/v1/users/', {'search': keyword})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['uid'] for item in response.data['results']]
+
+    def test_search_by_full_uid(self):
+        """测试完整 UID 精确匹配"""
+        self.assertEqual(self._search(self.alice.uid), [self.alice.uid])
+
+    def test_search_by_uid_prefix(self):
+        """测试 UID 前缀匹配（可省略 smtx 前缀）"""
+        self.assertIn(self.bob.uid, self._search(self.bob.uid[:8]))
+        self.assertIn(self.bob.uid, self._search(self.bob.uid[4:8]))
+
+    def test_search_by_username_prefix(self):
+        """测试用户名前缀匹配不区分大小写"""
+        self.assertEqual(self._search('ali'), [self.alice.uid])
+        self.assertEqual(self._search('lice'), [])
+
+    def test_search_by_digits_matches_username(self):
+        """测试纯数字同时按 UID 和用户名前缀匹配"""
+        carol = User.objects.create_user(username='2024carol', email='carol@qq.com', password='testpass123')
+        self.assertEqual(self._search('2024'), [carol.uid])
+        self.assertEqual(self._search('smtx2024'), [])
+
+    def test_search_by_email_and_domain(self):
+        """测试按完整邮箱（不区分大小写）和 @域名 搜索"""
+        self.assertEqual(self._search('bob@163.com'), [self.bob.uid])
+        self.assertEqual(self._search('Bob@163.COM'), [self.bob.uid])
+        self.assertEqual(self._search('@QQ.com'), [self.alice.uid])
+
+    def test_search_excludes_superuser(self):
+        """测试搜索结果不包含超级用户"""
+        self.assertEqual(self._search('admin'), [])
+
+    @override_settings(USER_DIRECTORY_COUNT_CAP=1)
+    def test_count_is_capped(self):
+        """测试总数查询带 LIMIT，超过上限时返回上限"""
+        User.objects.create_user(username='bobby', email='bobby@163.com', password='testpass123')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/users/', {'search': 'bob'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 2)
+        counts = [query['sql'] for query in ctx.captured_queries if 'COUNT(' in query['sql'].upper()]
+        self.assertEqual(len(counts), 1)
+        self.assertIn('LIMIT', counts[0].upper())
+        self.assertEqual(self.client.get('/api/v1/users/', {'search': 'bobby'}).data['count'], 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', '执行计划与行数估计只在 PostgreSQL 上检查')
+class UserDirectoryQueryPlanTests(TestCase):
+    """目录搜索各分支都走索引，未搜索的列表超过上限时使用表的估计行数"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            User.objects.create_user(username=f'User{i}', email=f'user{i}@example{i % 3}.com', password='x')
+
+    def assertUsesIndex(self, search, index):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = User.objects.directory_search(search).explain()
+        self.assertIn(index, plan)
+
+    def test_search_plans(self):
+        uid = User.objects.first().uid
+        self.assertUsesIndex('user1', 'users_user_username_lower_idx')
+        self.assertUsesIndex('@EXAMPLE1.com', 'users_user_email_domain_idx')
+        self.assertUsesIndex('User1@Example1.com', 'users_user_email_lower_idx')
+        self.assertUsesIndex(uid, 'users_user_uid')
+        self.assertUsesIndex(uid[4:9], 'users_user_uid')
+
+    @override_settings(USER_DIRECTORY_COUNT_CAP=5)
+    def test_list_count_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users_user')
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin123'))
+        # 估计值来自 ANALYZE 时的 30 行
+        self.assertEqual(client.get('/api/v1/users/').data['count'], 30)
+        self.assertEqual(client.get('/api/v1/users/', {'search': 'user'}).data['count'], 5)
+
+
+
+class InvitationCodeViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='admin123'
+        )
+
+    def test_bulk_create_invitations(self):
+        """测试批量创建邀请码接口"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/v1/users/bulk_create_invitations/', {
+            'count': 30,
+            'note': '活动批次'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(set(response.data['codes'])), 30)
+        self.assertEqual(InvitationCode.objects.filter(note='活动批次').count(), 30)
+
+    def test_bulk_create_invitations_requires_superuser(self):
+        """测试普通用户不能批量创建邀请码"""
+        user = User.objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/api/v1/users/bulk_create_invitations/', {'count': 1})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(REQUIRE_INVITATION_CODE=True)
+    def test_register_rolls_back_when_code_taken(self):
+        """测试邀请码在校验后被抢用时注册回滚"""
+        invitation = InvitationCode.create_invitation_code(created_by=self.admin)
+        cache.set('email_verify_code_new@example.com', '123456', timeout=300)
+
+        original_use = InvitationCode.use
+
+        def use_after_race(code, user):
+            # 模拟另一个注册请求在校验之后抢先核销
+            InvitationCode.objects.filter(pk=code.pk).update(is_used=True)
+            return original_use(code, user)
+
+        with mock.patch.object(InvitationCode, 'use', use_after_race):
+            response = self.client.post('/api/v1/users/register_email/', {
+                'email': 'new@example.com',
+                'password': 'newpass123',
+                'verify_code': '123456',
+                'invitation_code': invitation.code
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('invitation_code', response.data['error'])
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def tearDown(self):
+        cache.clear()
+
+
+class DeleteAccountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='leaving@example.com', password='testpass123')
+        self.other = User.objects.create_user(email='other@example.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch('api.v1.views.users.delete_user_account.delay')
+    def test_delete_account_deactivates_and_enqueues(self, delay):
+        """测试删除账号立即停用并提交后台任务"""
+        delay.return_value = mock.Mock(id='task-1')
+        response = self.client.delete('/api/v1/users/delete_account/', {'password': 'testpass123'})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['task_id'], 'task-1')
+        delay.assert_called_once_with(self.user.pk)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    @mock.patch('apps.users.tasks.delete_user_account.update_state', side_effect=ConnectionError)
+    @mock.patch('apps.users.tasks.default_storage.delete')
+    @mock.patch('api.v1.views.users.delete_user_account.delay', side_effect=ConnectionError)
+    def test_delete_account_without_broker(self, delay, storage_delete, update_state):
+        """测试任务队列不可用时在请求内删除，不写结果后端，文件直接删除"""
+        User.objects.filter(pk=self.user.pk).update(avatar='avatars/leaving.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete('/api/v1/users/delete_account/', {'password': 'testpass123'})
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        storage_delete.assert_called_once_with('avatars/leaving.jpg')
+        update_state.assert_not_called()
+
+    @mock.patch('apps.users.models.User.delete', side_effect=RuntimeError)
+    @mock.patch('api.v1.views.users.delete_user_account.delay', side_effect=ConnectionError)
+    def test_delete_account_without_broker_failure(self, delay, user_delete):
+        """测试请求内删除失败时返回 500，账号保持停用"""
+        response = self.client.delete('/api/v1/users/delete_account/', {'password': 'testpass123'})
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_delete_account_wrong_password(self):
+        """测试密码错误时不停用账号"""
+        response = self.client.delete('/api/v1/users/delete_account/', {'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
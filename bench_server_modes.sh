@@ -0,0 +1,41 @@
+#!/bin/bash
+# 同一数据集、同样的进程数下对比 WSGI（同步工作进程）与 ASGI（uvicorn 工作进程 + 异步视图）
+# 需要先按 README「性能基准」一节启动 Postgres/Redis 并导出环境变量（库名须包含 bench）
+
+set -e
+
+PROJECT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+cd $PROJECT_DIR
+
+PORT=${PORT:-8765}
+WORKERS=${GUNICORN_WORKERS:-4}
+CONCURRENCY=${CONCURRENCY:-64}
+REQUESTS=${REQUESTS:-5000}
+OUT_DIR=${OUT_DIR:-benchmark_results}
+mkdir -p "$OUT_DIR"
+
+run_mode() {
+    local mode=$1
+    echo "=== $mode ==="
+    # 压测流量都来自本机，须关闭限流，否则大部分请求返回 429
+    THROTTLE_ENABLED=False SERVER_MODE=$mode GUNICORN_WORKERS=$WORKERS gunicorn --config=gunicorn.conf.py \
+        --chdir "$PROJECT_DIR" --bind 127.0.0.1:$PORT --pid "$OUT_DIR/gunicorn.pid" \
+        --access-logfile /dev/null --error-logfile "$OUT_DIR/gunicorn_$mode.log" --daemon
+
+    # 等待服务就绪
+    for _ in $(seq 1 30); do
+        curl -sf "http://127.0.0.1:$PORT/api/v1/users/config/" > /dev/null && break
+        sleep 1
+    done
+
+    python manage.py benchmark_api --url "http://127.0.0.1:$PORT" --read-only \
+        --concurrency $CONCURRENCY --requests $REQUESTS --output "$OUT_DIR/$mode.json" \
+        $([ "$mode" = asgi ] && echo "--compare $OUT_DIR/wsgi.json") || true
+
+    kill $(cat "$OUT_DIR/gunicorn.pid")
+    sleep 2
+}
+
+run_mode wsgi
+run_mode asgi
+echo "结果已写入 $OUT_DIR/wsgi.json 与 $OUT_DIR/asgi.json"
@@ -6,7 +6,8 @@ from celery.schedules import crontab
 # 设置 Django 默认设置模块
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
 
-app = Celery('config')
+# 任务默认使用 BaseTask（执行完成后确认），各类任务的基类与队列见 utils/tasks.py
+app = Celery('config', task_cls='utils.tasks:BaseTask')
 
 # 添加新的配置
 app.conf.broker_connection_retry_on_startup = True
@@ -1,7 +1,10 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
@@ -24,6 +27,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -35,6 +39,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'utils',
     'apps.users',
     'apps.sfpr',
 ]
@@ -42,6 +47,11 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'utils.middleware.ServerTimingMiddleware',
+    'utils.middleware.CompressionMiddleware',
+    'utils.middleware.QueryAccountingMiddleware',
+    'utils.middleware.DatabaseUnavailableMiddleware',
+    'utils.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -50,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -71,28 +82,108 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# 服务模式：wsgi（gunicorn 同步/线程工作进程）或 asgi（gunicorn + uvicorn 工作进程），见 gunicorn.conf.py
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi').lower()
+# 为玩家搜索、记录列表、发送验证码等 I/O 密集端点启用异步视图，ASGI 模式下默认开启
+ASYNC_VIEWS_ENABLED = os.environ.get('ASYNC_VIEWS_ENABLED', str(SERVER_MODE == 'asgi')).lower() == 'true'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# 连接模式：
+#   none        每个请求新建连接
+#   persistent  每个工作线程保持一个连接，DB_CONN_MAX_AGE 秒后重建，复用前做健康检查
+#   pool        psycopg 3 连接池，每个工作进程一个池；ASGI 下请求不固定在某个线程上，默认使用连接池
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', 'pool' if SERVER_MODE == 'asgi' else 'persistent').lower()
+# 持久连接的最长复用时间（秒）
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+# 连接池大小；所有进程的 max_size 之和应小于 PostgreSQL 的 max_connections
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+# 池中无可用连接时最多等待的秒数，超时后返回 503
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+# 空闲连接与连接的最长存活时间（秒）
+DB_POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', '3600'))
+# 数据库不可用（连接池耗尽、连不上）时 503 响应的 Retry-After（秒）
+DB_UNAVAILABLE_RETRY_AFTER = int(os.environ.get('DB_UNAVAILABLE_RETRY_AFTER', '5'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django 自带 PostgreSQL 后端，附加获取连接的耗时/失败统计
+        'ENGINE': 'utils.db_backends.postgresql',
         'NAME': os.environ.get('DB_NAME', 'sfprpg'),
         'USER': os.environ.get('DB_USER', 'postgres'),
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE if DB_CONNECTION_MODE == 'persistent' else 0,
+        'CONN_HEALTH_CHECKS': DB_CONNECTION_MODE != 'none',
+        'OPTIONS': {},
     }
 }
+if DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+        'max_idle': DB_POOL_MAX_IDLE,
+        'max_lifetime': DB_POOL_MAX_LIFETIME,
+    }
+
+# 只读副本：逗号分隔的 host[:port]，库名与账号同主库；本地可以把主库自身配置为副本来验证路由
+DB_REPLICA_HOSTS = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(DB_REPLICA_HOSTS):
+    replica_hostname, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{index}'] = dict(
+        DATABASES['default'],
+        HOST=replica_hostname,
+        PORT=replica_port or DATABASES['default']['PORT'],
+        OPTIONS=dict(DATABASES['default']['OPTIONS']),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f'replica_{index}')
+DATABASE_ROUTERS = ['utils.db_router.PrimaryReplicaRouter']
+# 写请求成功后该用户的读请求固定走主库的秒数，应大于正常的复制延迟
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', '5'))
+# 复制延迟超过该秒数的副本暂不使用；延迟检查间隔（秒）
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '2'))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', '5'))
 
 # Cache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'BACKEND': 'utils.cache_backends.InstrumentedRedisCache',
         'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
-    }
+    },
+    # 进程内 LRU + default（Redis）的两级缓存，变更通过 Redis 发布/订阅通知所有工作进程；
+    # 用于体积小、读取极频繁的数据（如认证用户快照）
+    'hot': {
+        'BACKEND': 'utils.cache_backends.TieredCache',
+        'LOCATION': 'default',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'L1_TIMEOUT': int(os.environ.get('HOT_CACHE_L1_TIMEOUT', '30')),
+            'MAX_ENTRIES': int(os.environ.get('HOT_CACHE_MAX_ENTRIES', '2048')),
+        },
+    },
 }
+HOT_CACHE_ALIAS = 'hot'
+# JWT 认证的用户快照缓存时间（秒），用户保存或删除后立即失效
+USER_SNAPSHOT_TIMEOUT = int(os.environ.get('USER_SNAPSHOT_TIMEOUT', '300'))
+# 玩家列表/搜索、记录列表的响应缓存（utils/caching.py），相关模型变更后立即失效
+API_CACHE_ENABLED = os.environ.get('API_CACHE_ENABLED', 'True').lower() == 'true'
+API_CACHE_ALIAS = 'default'
+# 缓存有效期（秒）；查看次数等不触发失效的字段最多延迟这么久
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', '60'))
+# 重新计算的锁有效期与其他请求等待结果的最长时间（秒）
+API_CACHE_LOCK_TIMEOUT = int(os.environ.get('API_CACHE_LOCK_TIMEOUT', '10'))
+API_CACHE_LOCK_WAIT = float(os.environ.get('API_CACHE_LOCK_WAIT', '2'))
+# 概率提前重算的系数，越大越早重算，0 表示关闭
+API_CACHE_EARLY_RECOMPUTE_BETA = float(os.environ.get('API_CACHE_EARLY_RECOMPUTE_BETA', '1.0'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -129,24 +220,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Authentication
 AUTH_USER_MODEL = 'users.User'
+# EmailBackend 已覆盖用户名登录，不再追加 ModelBackend，避免失败的登录重复查询和哈希
 AUTHENTICATION_BACKENDS = [
     'apps.users.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
+# 密码哈希：首个哈希器用于新密码，其余仅用于校验旧密码
+PASSWORD_HASHERS = [
+    'apps.users.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# PBKDF2 迭代次数，留空使用 Django 默认值；修改后用户下次登录成功时自动按新参数重新哈希
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS') or 0) or None
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'utils.throttling.TokenBucketThrottle',
+    ),
+    # 前面的反向代理（Nginx）层数，按 X-Forwarded-For 中代理追加的地址识别匿名用户
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '1')),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # JSON 由 orjson 编码；原生客户端可通过 Accept: application/msgpack 获取 MessagePack
+    'DEFAULT_RENDERER_CLASSES': [
+        'utils.renderers.ORJSONRenderer',
+        'utils.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+# 未安装 msgpack 或需要关闭时不提供 MessagePack 响应
+MSGPACK_RENDERER_ENABLED = os.environ.get('MSGPACK_RENDERER_ENABLED', str(find_spec('msgpack') is not None)).lower() == 'true'
+if not MSGPACK_RENDERER_ENABLED:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].remove('utils.renderers.MessagePackRenderer')
+
+# 限流（utils/throttling.py）：Redis 令牌桶，所有工作进程与容器共享；URL 为空时只在当前进程内限流
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True').lower() == 'true'
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'))
+# 各路由（URL 名称）按身份的预算：(速率, 突发额度)，None 表示不限制；未列出的路由与身份使用 default
+THROTTLE_BUDGETS = {
+    'default': {'anon': ('120/min', 60), 'user': ('600/min', 120), 'superuser': None},
+    'player-list': {'anon': ('60/min', 30), 'user': ('300/min', 60)},
+    'player-search': {'anon': ('30/min', 10), 'user': ('120/min', 30)},
+    'player-add-record': {'user': ('10/min', 5)},
+    'record-list': {'anon': ('60/min', 30), 'user': ('300/min', 60)},
+    'user-send-verify-code': {'anon': ('10/hour', 5)},
+    'user-send-reset-code': {'anon': ('10/hour', 5)},
+    'token_obtain_pair': {'anon': ('20/min', 10)},
+    # 同一邮箱发送验证码（注册与重置密码共用）
+    'verify-code-email': ('1/min', 1),
 }
 
+# 玩家/记录列表接口使用基于 .values() 的精简序列化器（输出与完整序列化器一致），出现问题时可关闭
+LEAN_SERIALIZERS_ENABLED = os.environ.get('LEAN_SERIALIZERS_ENABLED', 'True').lower() == 'true'
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -161,7 +298,7 @@ SIMPLE_JWT = {
 
 # API Documentation
 SWAGGER_SETTINGS = {
-    'DEFAULT_INFO': 'config.urls.schema_view',
+    'DEFAULT_INFO': 'utils.openapi.API_INFO',
     'USE_SESSION_AUTH': False,
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -172,6 +309,9 @@ SWAGGER_SETTINGS = {
     }
 }
 
+# 构建镜像时由 generate_openapi_schema 生成的 schema 文件，不存在时文档接口实时生成
+OPENAPI_SCHEMA_FILE = os.environ.get('OPENAPI_SCHEMA_FILE', str(BASE_DIR / 'openapi' / 'schema.json'))
+
 # File Upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
@@ -196,6 +336,29 @@ CELERY_TASK_DEFAULT_QUEUE = 'default'
 CELERY_TASK_DEFAULT_EXCHANGE = 'default'
 CELERY_TASK_DEFAULT_ROUTING_KEY = 'default'
 
+# 任务队列（见 utils/tasks.py）：各队列由单独的 worker 消费，慢的图片任务不影响验证码邮件
+CELERY_TASK_QUEUES = {
+    name: {'exchange': name, 'routing_key': name}
+    for name in ('email', 'default', 'images', 'counters', 'maintenance')
+}
+# 按任务名称路由，未列出的任务按基类的 default_queue 路由（utils.tasks.route_task）
+CELERY_TASK_ROUTES = (
+    {
+        'apps.users.tasks.delete_stored_files': {'queue': 'maintenance'},
+        'apps.users.tasks.delete_user_account': {'queue': 'maintenance'},
+    },
+    'utils.tasks.route_task',
+)
+# 每个 worker 进程预取的消息数（倍数），任务多为 acks_late，默认只预取一个；
+# counters 队列的 worker 在启动参数中调大（--prefetch-multiplier）
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get('CELERY_WORKER_PREFETCH_MULTIPLIER', '1'))
+# 执行完成才确认的消息在该时间（秒）内未确认时会被重新投递，需大于最长的任务执行时间
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', '7200')),
+}
+# 单个 worker 子进程执行该数量的任务后重启，释放图片处理等任务累积的内存
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.environ.get('CELERY_WORKER_MAX_TASKS_PER_CHILD', '1000'))
+
 # 配置任务的重试策略
 CELERY_TASK_RETRY_POLICY = {
     'max_retries': 3,
@@ -204,6 +367,114 @@ CELERY_TASK_RETRY_POLICY = {
     'interval_max': 0.2,
 }
 
+# 定时任务（celery_beat 服务）
+CELERY_BEAT_SCHEDULE = {
+    # 统计汇总与基础表对账，修正信号覆盖不到的写入
+    'reconcile-stats': {
+        'task': 'apps.sfpr.tasks.reconcile_stats',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    # 提前创建 sfpr_record 未来几个月的分区
+    'create-record-partitions': {
+        'task': 'apps.sfpr.tasks.create_record_partitions',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
+
+# 删除账号时每批处理的关联记录数
+ACCOUNT_DELETION_BATCH_SIZE = int(os.environ.get('ACCOUNT_DELETION_BATCH_SIZE', '500'))
+# 用户目录列表的总数最多精确计数到该值，超过时未搜索的列表使用表的估计行数，搜索结果的总数即为该值
+USER_DIRECTORY_COUNT_CAP = int(os.environ.get('USER_DIRECTORY_COUNT_CAP', '1000'))
+
+# 统计汇总：每日对账重算的天数（0 为全部日期）；统计接口默认与最大的查询天数
+STATS_RECONCILE_DAYS = int(os.environ.get('STATS_RECONCILE_DAYS', '7'))
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = int(os.environ.get('STATS_MAX_DAYS', '366'))
+
+# sfpr_record 按月分区（PostgreSQL）：提前创建的月数；archive_record_partitions 默认保留的月数与归档文件目录
+RECORD_PARTITION_MONTHS_AHEAD = int(os.environ.get('RECORD_PARTITION_MONTHS_AHEAD', '3'))
+RECORD_RETENTION_MONTHS = int(os.environ.get('RECORD_RETENTION_MONTHS', '24'))
+RECORD_ARCHIVE_DIR = os.environ.get('RECORD_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'records'))
+
+# 响应压缩：超过该字节数的响应按 Accept-Encoding 使用 brotli（已安装时）或 gzip 压缩；
+# 由 Nginx 统一压缩时可关闭
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Logging
+# ------------------------------------------------------------------------------
+# INFO 及以下级别日志的采样比例：逗号分隔的 logger=比例，如 django.server=0.1,api.v1.views.sfpr=0.5；
+# 按最长的 logger 名称前缀匹配，WARNING 及以上始终记录
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition('=') for item in os.environ.get('LOG_SAMPLE_RATES', '').split(','))
+    if name.strip() and rate
+}
+# 每个工作进程日志队列的容量，队列满时丢弃新的日志记录（计入 log_records_dropped_total）
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+# Monitoring
+# ------------------------------------------------------------------------------
+# 工作进程内存检查间隔（秒）；独占内存（USS）超过该值（MB）时回收工作进程，0 表示不限制，
+# 与 gunicorn 的 max_requests 配合使用
+WORKER_MEMORY_CHECK_INTERVAL = float(os.environ.get('WORKER_MEMORY_CHECK_INTERVAL', '30'))
+WORKER_MAX_MEMORY_MB = int(os.environ.get('WORKER_MAX_MEMORY_MB', '0'))
+# 响应中添加 Server-Timing 头
+SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True').lower() == 'true'
+# 超过该耗时（秒）的请求记录日志
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '1.0'))
+# 指标开关；指标写入 Redis 以汇总所有工作进程，留空则只统计当前进程
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_REDIS_URL = os.environ.get('METRICS_REDIS_URL', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'))
+# 工作进程把本地累计的指标写入 Redis 的间隔（秒）
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+# 指标 Redis 的连接与读写超时（秒），Redis 不可用时监控接口很快失败而不是挂住工作线程
+METRICS_REDIS_TIMEOUT = float(os.environ.get('METRICS_REDIS_TIMEOUT', '0.5'))
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 抓取 /api/v1/monitoring/metrics/ 的令牌（X-Metrics-Token 头），为空时仅超级管理员可访问
+METRICS_SCRAPE_TOKEN = os.environ.get('METRICS_SCRAPE_TOKEN', '')
+
+# 响应中添加 X-Query-Count / X-Query-Repeated 头
+QUERY_STATS_HEADER = os.environ.get('QUERY_STATS_HEADER', 'True').lower() == 'true'
+# 同一形态查询在一个请求中执行达到该次数时视为疑似 N+1
+QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', '5'))
+# 各路由（URL 名称）的查询次数预算，含 JWT 认证查询用户的 1 次，以及条件请求验证器的聚合查询
+# （启用接口缓存时验证器通常命中缓存）
+QUERY_BUDGETS = {
+    'player-list': 5,
+    'player-search': 5,
+    'player-detail': 5,
+    'record-list': 3,
+    'record-detail': 2,
+    'record-my-records': 3,
+    'user-list-invitations': 3,
+}
+# 严格模式：超出预算时抛出异常（用于测试）
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
+
+# 按需分析：超级管理员请求带 X-Profile 头或 _profile 参数时启用
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True').lower() == 'true'
+# 采样间隔（秒）
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', '0.001'))
+# cprofile 模式保留的函数条数
+PROFILING_MAX_FUNCTIONS = 200
+# 分析结果保留时间（秒）与最近列表长度
+PROFILING_TTL = int(os.environ.get('PROFILING_TTL', '3600'))
+PROFILING_MAX_STORED = 50
+
+# 慢查询捕获：超过阈值的查询记录 SQL、参数形态、来源和执行计划
+SLOW_QUERY_ENABLED = os.environ.get('SLOW_QUERY_ENABLED', 'True').lower() == 'true'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+# 捕获采样率、每个进程每分钟最多捕获次数，以及同一形态的去重窗口（秒）
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', '1.0'))
+SLOW_QUERY_MAX_PER_MINUTE = int(os.environ.get('SLOW_QUERY_MAX_PER_MINUTE', '30'))
+SLOW_QUERY_DEDUP_SECONDS = int(os.environ.get('SLOW_QUERY_DEDUP_SECONDS', '60'))
+# 环形缓冲长度；缓冲存放在 Redis 中供所有进程共享，留空则只保存在当前进程
+SLOW_QUERY_BUFFER_SIZE = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', '200'))
+SLOW_QUERY_REDIS_URL = os.environ.get('SLOW_QUERY_REDIS_URL', os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'))
+
 # Features Configuration
 # ------------------------------------------------------------------------------
 # 邀请码功能开关
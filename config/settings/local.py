@@ -50,13 +50,18 @@ INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
 
 # 简化中间件链，保留必要的中间件
 MIDDLEWARE = [
-    'utils.middleware.MiddlewareTimingMiddleware',
+    'utils.middleware.ServerTimingMiddleware',
+    'utils.middleware.CompressionMiddleware',
+    'utils.middleware.QueryAccountingMiddleware',
+    'utils.middleware.DatabaseUnavailableMiddleware',
+    'utils.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',  # admin 需要
     'django.contrib.messages.middleware.MessageMiddleware',    # admin 需要
+    'utils.middleware.ProfilingMiddleware',
 ]
 
 INTERNAL_IPS = ['127.0.0.1']
@@ -75,6 +80,12 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'utils.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
@@ -85,36 +96,43 @@ LOGGING = {
             'filename': 'debug.log',
             'formatter': 'verbose',
         },
+        # 与生产环境一致，由后台线程写入控制台与文件（见 utils/log.py）
+        'queue': {
+            '()': 'utils.log.QueuedHandler',
+            'handlers': ['console', 'file'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
         'utils.middleware': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'api': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
         'apps': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': True,
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
 }
@@ -67,6 +67,7 @@ EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 
 # Logging
+# 请求线程只把日志记录放入队列，由每个工作进程的后台线程格式化并写入控制台（见 utils/log.py）
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -76,28 +77,45 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'utils.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        'queue': {
+            '()': 'utils.log.QueuedHandler',
+            'handlers': ['console'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'INFO',
         },
         'django.request': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
         'django.server': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
     },
+    # 应用代码的日志（api、apps、utils）
+    'root': {
+        'handlers': ['queue'],
+        'level': os.environ.get('LOG_LEVEL', 'INFO'),
+    },
 }
 
 # Celery
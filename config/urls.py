@@ -19,32 +19,20 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
 
-# API 文档配置
-schema_view = get_schema_view(
-    openapi.Info(
-        title="User Authentication API",
-        default_version='v1',
-        description="用户认证系统 API 文档",
-        terms_of_service="",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from utils.admin import slow_query_admin_view
+from utils.openapi import docs_view
 
 urlpatterns = [
+    # 后台只读页面：慢查询环形缓冲与执行计划
+    path('admin/slow-queries/', slow_query_admin_view, name='admin-slow-queries'),
     path('admin/', admin.site.urls),
     
     # API v1 路由
     path('api/v1/', include('api.v1.urls')),
     
     # API 文档
-    path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('api/docs/', docs_view, name='schema-swagger-ui'),
 ]
 
 # 开发环境下的媒体文件服务
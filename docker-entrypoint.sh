@@ -35,15 +35,23 @@ if [ -d "/app/celerybeat-data" ]; then
 fi
 echo "✓ Directories setup completed"
 
-# 收集静态文件
-echo "=== Collecting Static Files ==="
-python manage.py collectstatic --noinput
-echo "✓ Static files collected"
+# 收集静态文件与数据库迁移只需由一个 web 容器执行；Celery 容器或静态文件、模型未变化的滚动重启
+# 可设置 RUN_COLLECTSTATIC=false / RUN_MIGRATIONS=false 跳过，缩短启动时间
+if [ "${RUN_COLLECTSTATIC:-true}" = "true" ]; then
+    echo "=== Collecting Static Files ==="
+    python manage.py collectstatic --noinput
+    echo "✓ Static files collected"
+else
+    echo "=== Skipping collectstatic (RUN_COLLECTSTATIC=false) ==="
+fi
 
-# 应用数据库迁移
-echo "=== Applying Database Migrations ==="
-python manage.py migrate --noinput
-echo "✓ Database migrations applied"
+if [ "${RUN_MIGRATIONS:-true}" = "true" ]; then
+    echo "=== Applying Database Migrations ==="
+    python manage.py migrate --noinput
+    echo "✓ Database migrations applied"
+else
+    echo "=== Skipping migrations (RUN_MIGRATIONS=false) ==="
+fi
 
 # 启动应用
 echo "=== Starting Application ==="
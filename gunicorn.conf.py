@@ -1,14 +1,32 @@
+import gc
+import os
+
 # 项目目录
 chdir = '/app'
 
+# 服务模式：wsgi 为同步工作进程（threads > 1 时 gunicorn 自动改用 gthread），
+# asgi 为 uvicorn 工作进程，单进程内以事件循环并发处理请求，配合异步视图使用
+server_mode = os.environ.get('SERVER_MODE', 'wsgi').lower()
+
 # 指定进程数
-workers = 4
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
 
-# 指定每个进程开启的线程数
-threads = 2
+if server_mode == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+    # 指定每个进程开启的线程数
+    threads = int(os.environ.get('GUNICORN_THREADS', '2'))
+    # 启动模式
+    worker_class = 'sync'
 
-# 启动模式
-worker_class = 'sync'
+# 预加载：主进程导入应用后再 fork 工作进程，导入的代码与数据以写时复制的方式共享（见 utils/memory.py）。
+# 预加载时 HUP 不会重新加载代码，发布新版本需要重启主进程
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+if preload_app:
+    # 导入期间不做垃圾回收，避免在主进程中留下零散的空洞；应用加载完成后 gc.freeze() 并重新启用（见 when_ready）
+    gc.disable()
 
 # 绑定的ip与端口
 bind = '0.0.0.0:8000'
@@ -40,4 +58,26 @@ daemon = False
 reload = False
 
 # 错误日志输出格式
-error_log_format = '%(asctime)s [%(process)d] [%(levelname)s] %(message)s'
\ No newline at end of file
+error_log_format = '%(asctime)s [%(process)d] [%(levelname)s] %(message)s'
+
+
+def when_ready(server):
+    if preload_app:
+        # 应用已在主进程中加载：导入的对象移入永久代后重新启用垃圾回收，
+        # 主进程与之后 fork 的工作进程都正常回收，回收不会扫描已冻结的对象
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from utils.memory import close_connections
+        close_connections()
+        # 主进程中已有的对象移入永久代，工作进程的垃圾回收不再改写它们，共享页面保持不被复制
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # 定期上报工作进程内存，独占内存超过 WORKER_MAX_MEMORY_MB 时回收工作进程
+    from utils.memory import MemoryWatchdog
+    MemoryWatchdog(worker_id=worker.age).start()
@@ -29,4 +29,4 @@ python manage.py migrate
 
 # 启动 Gunicorn
 echo "Starting Gunicorn..."
-exec gunicorn config.wsgi:application -c gunicorn.conf.py 
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py 
\ No newline at end of file
@@ -0,0 +1,35 @@
+import json
+
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+
+from utils import slow_queries
+
+
+def _slow_query_view(request):
+    """
+    后台只读页面：慢查询环形缓冲
+
+    与 /api/v1/monitoring/slow-queries/ 数据相同，可按 route 与 flag 过滤，执行计划展开查看；
+    只读取缓冲，不提供修改或删除。
+    """
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    route = request.GET.get('route', '')
+    flag = request.GET.get('flag', '')
+    entries = [
+        {**entry, 'plan_text': json.dumps(entry['plan'], indent=2, ensure_ascii=False) if entry.get('plan') else ''}
+        for entry in slow_queries.recent_slow_queries(route=route, flag=flag)
+    ]
+    context = {
+        **admin.site.each_context(request),
+        'title': '慢查询',
+        'entries': entries,
+        'route': route,
+        'flag': flag,
+    }
+    return TemplateResponse(request, 'admin/slow_queries.html', context)
+
+
+slow_query_admin_view = admin.site.admin_view(_slow_query_view)
@@ -0,0 +1,25 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def install_execute_wrappers(sender, connection, **kwargs):
+    """
+    connection_created 信号处理：为连接安装常驻的查询包装
+
+    放在 execute_wrappers 的最前面（最外层），不受 connection.execute_wrapper()
+    临时包装入栈出栈的影响；慢查询捕获在最外层，其计时包含统计本身的开销。
+    """
+    from utils.queries import instrument
+    from utils.slow_queries import capture_slow_query
+
+    for wrapper in (instrument, capture_slow_query):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, wrapper)
+
+
+class UtilsConfig(AppConfig):
+    name = "utils"
+    verbose_name = "通用工具"
+
+    def ready(self):
+        connection_created.connect(install_execute_wrappers, dispatch_uid='utils.install_execute_wrappers')
@@ -0,0 +1,222 @@
+import http.client
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connections
+
+from utils.queries import record_queries
+
+
+class Scenario:
+    """
+    压测场景
+
+    request(client, rng) 使用给定客户端发出一次请求并返回响应；
+    weight 决定该场景在混合负载中所占的比例。
+    """
+
+    def __init__(self, name, weight, request, write=False):
+        self.name = name
+        self.weight = weight
+        self.request = request
+        self.write = write
+
+
+class HttpClient:
+    """
+    通过 HTTP 请求外部服务的客户端，用于压测 gunicorn 的 WSGI/ASGI 部署
+
+    get/post 的参数与 django.test.Client 相同（extra 中的 HTTP_* 转为请求头），
+    返回带 status_code、headers、content 的对象；每个线程一个实例，复用 keep-alive 连接。
+    """
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.netloc, timeout=self.timeout)
+
+    @staticmethod
+    def _headers(extra):
+        return {
+            key[5:].replace('_', '-').title(): value
+            for key, value in extra.items() if key.startswith('HTTP_')
+        }
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = self._connection.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, OSError):
+                # 服务端关闭了空闲连接，重连后重试一次
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+                continue
+            return SimpleNamespace(status_code=response.status, headers=response.headers, content=content)
+
+    def get(self, path, data=None, **extra):
+        if data:
+            path = f'{path}?{urlencode(data)}'
+        return self.request('GET', path, headers=self._headers(extra))
+
+    def post(self, path, data=None, **extra):
+        headers = self._headers(extra)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        return self.request('POST', path, body=urlencode(data or {}), headers=headers)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def header_query_count(response):
+    """从 X-Query-Count 响应头读取服务端统计的查询数（需开启 QUERY_STATS_HEADER）"""
+    value = response.headers.get('X-Query-Count')
+    return int(value) if value is not None else None
+
+
+def percentile(sorted_values, q):
+    """最近秩法分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def build_schedule(scenarios, total, seed):
+    """按权重生成固定随机种子的请求序列，保证多次运行负载一致"""
+    rng = random.Random(seed)
+    return rng.choices(scenarios, weights=[s.weight for s in scenarios], k=total)
+
+
+def run_load(scenarios, total, concurrency, client_factory, seed=0, count_queries=None):
+    """
+    并发执行请求序列
+
+    每个线程持有自己的客户端和数据库连接；count_queries 为空时在线程内
+    通过 execute_wrapper 统计查询数，否则调用 count_queries(response) 获取
+    （例如读取 X-Query-Count 响应头）。
+    返回 (每个场景的样本列表 {name: [(耗时秒, 查询数, 状态码), ...]}, 总耗时秒)。
+    """
+    schedule = build_schedule(scenarios, total, seed)
+    samples = {scenario.name: [] for scenario in scenarios}
+    position = iter(range(len(schedule)))
+    lock = threading.Lock()
+
+    def worker(worker_index):
+        client = client_factory()
+        rng = random.Random(seed * 1000 + worker_index)
+        try:
+            while True:
+                with lock:
+                    index = next(position, None)
+                if index is None:
+                    return
+                scenario = schedule[index]
+                start = time.perf_counter()
+                if count_queries is None:
+                    with record_queries() as recorder:
+                        response = scenario.request(client, rng)
+                    queries = recorder.count
+                else:
+                    response = scenario.request(client, rng)
+                    queries = count_queries(response)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    samples[scenario.name].append((elapsed, queries, response.status_code))
+        finally:
+            if isinstance(client, HttpClient):
+                client.close()
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, index) for index in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall_time):
+    """汇总吞吐量、延迟分位数（毫秒）和平均查询数；throttled 为被限流（429）的请求数，也计入 errors"""
+    scenarios = {}
+    all_latencies = []
+    total_errors = 0
+    total_throttled = 0
+    for name, rows in samples.items():
+        if not rows:
+            continue
+        latencies = sorted(row[0] for row in rows)
+        queries = [row[1] for row in rows if row[1] is not None]
+        errors = sum(1 for row in rows if row[2] >= 400)
+        throttled = sum(1 for row in rows if row[2] == 429)
+        all_latencies.extend(latencies)
+        total_errors += errors
+        total_throttled += throttled
+        scenarios[name] = {
+            'requests': len(rows),
+            'errors': errors,
+            'throttled': throttled,
+            'throughput': round(len(rows) / wall_time, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    all_latencies.sort()
+    overall = {
+        'requests': len(all_latencies),
+        'errors': total_errors,
+        'throttled': total_throttled,
+        'wall_time_s': round(wall_time, 3),
+        'throughput': round(len(all_latencies) / wall_time, 2) if wall_time else None,
+        'p50_ms': round(percentile(all_latencies, 0.50) * 1000, 2) if all_latencies else None,
+        'p95_ms': round(percentile(all_latencies, 0.95) * 1000, 2) if all_latencies else None,
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 2) if all_latencies else None,
+    }
+    return {'overall': overall, 'scenarios': scenarios}
+
+
+# 数值越大越差的指标；throughput 越小越差
+_LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def compare(baseline, current, tolerance):
+    """
+    与基线对比，返回 (对比行, 是否存在超出容差的回退)
+    tolerance 为允许的相对变化（如 0.1 表示 10%）
+    """
+    lines = []
+    regressed = False
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            lines.append(f'{name}: 基线中不存在，跳过')
+            continue
+        for metric in ('throughput',) + _LOWER_IS_BETTER:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if metric in _LOWER_IS_BETTER else change < -tolerance
+            regressed = regressed or worse
+            lines.append(
+                f'{name}.{metric}: {old} -> {new} ({change:+.1%}){"  回退" if worse else ""}'
+            )
+    return lines, regressed
@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+import redis
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.functional import cached_property
+
+from utils.metrics import registry
+from utils.redis_client import get_redis_client
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+CACHE_TIER_REQUESTS = registry.counter(
+    'cache_tier_requests_total',
+    '两级缓存各层的读取：tier 为 l1（进程内）或 l2（Redis），result 为 hit/miss',
+    labelnames=('cache', 'tier', 'result'),
+)
+CACHE_INVALIDATIONS = registry.counter(
+    'cache_l1_invalidations_received_total',
+    '收到的其他进程发布的 L1 失效通知数',
+    labelnames=('cache',),
+)
+
+_MISSING = object()
+
+TIMED_METHODS = (
+    'add', 'get', 'set', 'touch', 'delete', 'has_key', 'incr', 'decr',
+    'get_many', 'set_many', 'delete_many', 'get_or_set', 'clear',
+)
+
+
+class TimedCacheMixin:
+    """缓存操作耗时计入当前请求的 cache 分段（Server-Timing）"""
+
+
+def _timed_method(name):
+    def method(self, *args, **kwargs):
+        with timed('cache'):
+            return getattr(super(TimedCacheMixin, self), name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+for _name in TIMED_METHODS:
+    setattr(TimedCacheMixin, _name, _timed_method(_name))
+
+
+class InstrumentedRedisCache(TimedCacheMixin, RedisCache):
+    pass
+
+
+class InstrumentedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
+
+
+class TieredCache(BaseCache):
+    """
+    两级缓存：进程内 LRU（L1）在前，LOCATION 指定的缓存（L2，通常是 Redis）在后
+
+    读取先查 L1，未命中再读 L2 并回填 L1；L1 条目最多保留 L1_TIMEOUT 秒、MAX_ENTRIES 条。
+    写入、删除与 incr 直接作用于 L2，并通过 Redis 发布/订阅通知所有进程（含 gunicorn 的各个工作进程）
+    丢弃对应的 L1 条目；订阅断开期间无法收到通知，重连后清空 L1。
+    只适合体积小、读取极频繁、允许短暂延迟的数据；锁、计数与限流请直接使用 L2。
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.l2_alias = location
+        self.l1_timeout = params.get('OPTIONS', {}).get('L1_TIMEOUT', 30)
+        self.channel = f'cache:invalidate:{location}'
+        self._sender = uuid.uuid4().hex
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效递增；读取 L2 期间发生过失效时不回填 L1，避免回填已失效的旧值
+        self._generation = 0
+        self._listener_pid = None
+        _tiered_caches.add(self)
+
+    @cached_property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    @cached_property
+    def redis_url(self):
+        """L2 为 Redis 时用于发布/订阅的地址，否则为 None（只在本进程内失效）"""
+        if isinstance(self.l2, RedisCache):
+            return self.l2._servers[0]
+        return None
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return data
+
+    def _l1_set(self, key, value, timeout, generation):
+        ttl = self.l1_timeout if timeout is DEFAULT_TIMEOUT or timeout is None else min(timeout, self.l1_timeout)
+        if ttl <= 0:
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _l1_discard(self, keys):
+        with self._lock:
+            self._generation += 1
+            if keys is None:
+                self._entries.clear()
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+    # 失效通知
+
+    def _publish(self, keys):
+        """丢弃本进程的 L1 条目并通知其他进程；keys 为 None 表示全部"""
+        self._l1_discard(keys)
+        if self.redis_url is None:
+            return
+        message = json.dumps({'sender': self._sender, 'keys': keys})
+        try:
+            get_redis_client(self.redis_url).publish(self.channel, message)
+        except redis.RedisError:
+            logger.warning('缓存失效通知发送失败 %s', self.channel, exc_info=True)
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid() or self.redis_url is None:
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            # fork 出的子进程中订阅线程不存在，丢弃继承的 L1 并重新订阅
+            self._entries.clear()
+            self._generation += 1
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name=f'cache-invalidation-{self.l2_alias}', daemon=True).start()
+
+    def _listen(self):
+        pid = os.getpid()
+        while self._listener_pid == pid:
+            try:
+                pubsub = get_redis_client(self.redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # 订阅之前可能错过了通知
+                self._l1_discard(None)
+                for message in pubsub.listen():
+                    if self._listener_pid != pid:
+                        break
+                    payload = json.loads(message['data'])
+                    if payload['sender'] != self._sender:
+                        self._l1_discard(payload['keys'])
+                        CACHE_INVALIDATIONS.inc(cache=self.l2_alias)
+                pubsub.close()
+            except redis.RedisError:
+                logger.warning('缓存失效订阅断开，1 秒后重连 %s', self.channel, exc_info=True)
+                time.sleep(1)
+
+    # 缓存接口
+
+    def _l2_key(self, key, version):
+        return self.l2.make_and_validate_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        self._ensure_listener()
+        l2_key = self._l2_key(key, version)
+        data = self._l1_get(l2_key)
+        if data is not None:
+            CACHE_TIER_REQUESTS.inc(cache=self.l2_alias, tier='l1', result='hit')
+            return pickle.loads(data)
+        CACHE_TIER_REQUESTS.inc(cache=self.l2_alias, tier='l1', result='miss')
+        generation = self._generation
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            CACHE_TIER_REQUESTS.inc(cache=self.l2_alias, tier='l2', result='miss')
+            return default
+        CACHE_TIER_REQUESTS.inc(cache=self.l2_alias, tier='l2', result='hit')
+        self._l1_set(l2_key, value, DEFAULT_TIMEOUT, generation)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._ensure_listener()
+        found, missing = {}, []
+        for key in keys:
+            data = self._l1_get(self._l2_key(key, version))
+            if data is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(data)
+        CACHE_TIER_REQUESTS.inc(len(found), cache=self.l2_alias, tier='l1', result='hit')
+        if missing:
+            CACHE_TIER_REQUESTS.inc(len(missing), cache=self.l2_alias, tier='l1', result='miss')
+            generation = self._generation
+            values = self.l2.get_many(missing, version=version)
+            CACHE_TIER_REQUESTS.inc(len(values), cache=self.l2_alias, tier='l2', result='hit')
+            CACHE_TIER_REQUESTS.inc(len(missing) - len(values), cache=self.l2_alias, tier='l2', result='miss')
+            for key, value in values.items():
+                self._l1_set(self._l2_key(key, version), value, DEFAULT_TIMEOUT, generation)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._publish([self._l2_key(key, version)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        self._publish([self._l2_key(key, version) for key in data])
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._publish([self._l2_key(key, version)])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version=version)
+        self._publish([self._l2_key(key, version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.l2.delete_many(keys, version=version)
+        self._publish([self._l2_key(key, version) for key in keys])
+
+    def has_key(self, key, version=None):
+        return self._l1_get(self._l2_key(key, version)) is not None or self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version=version)
+        self._publish([self._l2_key(key, version)])
+        return value
+
+    def clear(self):
+        self.l2.clear()
+        self._publish(None)
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+_tiered_caches = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    # fork 时其他线程可能正持有锁，子进程中重新创建
+    for cache in list(_tiered_caches):
+        cache._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,247 @@
+"""
+接口与查询结果缓存（cache-aside）
+
+缓存键由命名空间、请求参数与所依赖标签的当前版本号组成。标签通常是模型（如 'sfpr.player'），
+模型保存/删除时递增其版本号，依赖它的旧缓存键不再被读取，随后按过期时间自然淘汰，
+不需要逐个查找删除。queryset.update() 等不触发信号的批量修改需要调用 invalidate_models()。
+
+防止缓存击穿：
+- 同一个键未命中时只有取得锁（cache.add）的进程重新计算，其他请求等待结果，超时后自行计算；
+- 概率提前重算（XFetch）：条目临近过期时按上次计算耗时提前由一个请求重算，其余请求继续使用旧值。
+"""
+import hashlib
+import json
+import logging
+import math
+import random
+import time
+
+import redis
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'cache-aside:'
+
+CACHE_REQUESTS = registry.counter(
+    'api_cache_requests_total',
+    '缓存读取：result 为 hit、miss、early（提前重算）、stale（他人重算中使用旧值）、wait（等待他人计算）、timeout（等待超时后自行计算）',
+    labelnames=('namespace', 'result'),
+)
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def model_tag(model):
+    return model._meta.label_lower
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}tag:{tag}'
+
+
+def _initial_version():
+    # 标签版本被淘汰后从新的随机起点开始，不会与旧版本号重合
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    """各标签当前的版本号"""
+    cache = get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    versions = cache.get_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        cache.add(key, _initial_version(), timeout=None)
+        versions[key] = cache.get(key)
+    return {tag: versions[key] for key, tag in keys.items()}
+
+
+async def atag_versions(tags):
+    cache = get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    versions = await cache.aget_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        await cache.aadd(key, _initial_version(), timeout=None)
+        versions[key] = await cache.aget(key)
+    return {tag: versions[key] for key, tag in keys.items()}
+
+
+def make_key(namespace, params, versions):
+    payload = json.dumps([params, sorted(versions.items())], sort_keys=True, default=str, separators=(',', ':'))
+    return f'{KEY_PREFIX}{namespace}:{hashlib.sha1(payload.encode()).hexdigest()}'
+
+
+def _bump(tags):
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            cache.set(_tag_key(tag), _initial_version(), timeout=None)
+
+
+def invalidate(*tags):
+    """
+    递增标签版本号
+    在事务中调用时立即递增一次（本事务中的后续读取不使用旧缓存），提交后再递增一次，
+    避免其他请求在提交前按新版本号缓存了未提交前的数据
+    """
+    _bump(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def invalidate_models(*models):
+    invalidate(*(model_tag(model) for model in models))
+
+
+def _should_recompute_early(expires_at, delta):
+    """XFetch：剩余时间越短、上次计算越慢，提前重算的概率越大"""
+    beta = settings.API_CACHE_EARLY_RECOMPUTE_BETA
+    return beta > 0 and time.time() - delta * beta * math.log(1 - random.random()) >= expires_at
+
+
+def get_or_compute(namespace, params, tags, compute, timeout=None):
+    """
+    读取缓存，未命中时计算并写入
+    compute 无参数，返回可 pickle 的值；tags 为结果所依赖的标签
+    """
+    if not settings.API_CACHE_ENABLED:
+        return compute()
+    cache = get_cache()
+    timeout = settings.API_CACHE_TIMEOUT if timeout is None else timeout
+    try:
+        key = make_key(namespace, params, tag_versions(tags))
+        entry = cache.get(key)
+    except redis.RedisError:
+        # 缓存不可用时直接查询，不影响接口可用性
+        logger.warning('读取缓存失败，直接计算 %s', namespace, exc_info=True)
+        return compute()
+    if entry is not None:
+        value, expires_at, delta = entry
+        if not _should_recompute_early(expires_at, delta):
+            CACHE_REQUESTS.inc(namespace=namespace, result='hit')
+            return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, timeout=settings.API_CACHE_LOCK_TIMEOUT):
+        if entry is not None:
+            CACHE_REQUESTS.inc(namespace=namespace, result='stale')
+            return entry[0]
+        entry = _wait_for(cache, key, lock_key)
+        if entry is not None:
+            CACHE_REQUESTS.inc(namespace=namespace, result='wait')
+            return entry[0]
+        CACHE_REQUESTS.inc(namespace=namespace, result='timeout')
+        return compute()
+
+    CACHE_REQUESTS.inc(namespace=namespace, result='early' if entry is not None else 'miss')
+    try:
+        start = time.time()
+        value = compute()
+        delta = time.time() - start
+        cache.set(key, (value, time.time() + timeout, delta), timeout=timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def _wait_for(cache, key, lock_key):
+    """等待持有锁的请求写入结果；锁被释放（计算失败）或超时返回 None"""
+    deadline = time.monotonic() + settings.API_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if not cache.has_key(lock_key):
+            return cache.get(key)
+    return None
+
+
+async def aget(namespace, params, tags):
+    """
+    异步视图只读缓存：命中且不需要提前重算时返回值，否则返回 None，
+    由同步视图在锁的保护下计算（与 get_or_compute 使用同一个键）
+    """
+    if not settings.API_CACHE_ENABLED:
+        return None
+    key = make_key(namespace, params, await atag_versions(tags))
+    entry = await get_cache().aget(key)
+    if entry is None:
+        return None
+    value, expires_at, delta = entry
+    if _should_recompute_early(expires_at, delta):
+        return None
+    CACHE_REQUESTS.inc(namespace=namespace, result='hit')
+    return value
+
+
+def cached_queryset(namespace, queryset, tags=None, timeout=None):
+    """缓存查询结果列表，键为 SQL 与参数；默认依赖查询的模型"""
+    sql, sql_params = queryset.query.sql_with_params()
+    tags = tags if tags is not None else [model_tag(queryset.model)]
+    return get_or_compute(namespace, [sql, sql_params], tags, lambda: list(queryset.all()), timeout)
+
+
+def request_params(request):
+    """请求的缓存参数：主机、路径与排序后的查询参数（分页链接与媒体 URL 含主机）"""
+    query = sorted((name, value) for name in request.GET for value in request.GET.getlist(name))
+    return [request.get_host(), request.path, query]
+
+
+class CachedResponseMixin:
+    """
+    视图集响应缓存
+
+    cache_models 为响应所依赖的模型，其中任一模型变更后缓存失效；
+    只缓存 200 响应的数据，渲染（JSON/MessagePack、压缩）在缓存之后进行。
+    """
+    cache_models = ()
+
+    def cached_response(self, namespace, build):
+        request = self.request
+        tags = [model_tag(model) for model in self.cache_models]
+        uncached = []
+
+        def compute():
+            response = build()
+            if response.status_code != 200:
+                uncached.append(response)
+                raise _Uncacheable
+            return response.data
+
+        try:
+            data = get_or_compute(namespace, request_params(request), tags, compute)
+        except _Uncacheable:
+            return uncached[0]
+        return Response(data)
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def invalidate_on_change(model, ignore_fields=()):
+    """
+    模型保存或删除后使其标签失效
+    只更新了 ignore_fields 中的字段（如查看次数、最后登录时间）时不失效，这些字段在缓存过期后更新
+    """
+    ignore_fields = frozenset(ignore_fields)
+    tag = model_tag(model)
+
+    def changed(sender, update_fields=None, **kwargs):
+        if update_fields and set(update_fields) <= ignore_fields:
+            return
+        invalidate(tag)
+
+    post_save.connect(changed, sender=model, weak=False, dispatch_uid=f'cache-aside:{tag}:save')
+    post_delete.connect(changed, sender=model, weak=False, dispatch_uid=f'cache-aside:{tag}:delete')
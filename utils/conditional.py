@@ -0,0 +1,91 @@
+"""
+条件请求（ETag / Last-Modified）
+
+验证器由视图提供的少量聚合值（最大 updated_at、数量等）计算，不渲染响应体；
+If-None-Match / If-Modified-Since 匹配时在序列化之前返回 304。
+验证器与响应一样经 cache-aside 缓存（键为 '<命名空间>:validators'），所依赖的模型变更后重新计算。
+
+ETag 是弱验证器：查看次数（views_count）这类不更新 updated_at、也不使缓存失效的计数作为聚合值参与计算，
+在验证器缓存过期（API_CACHE_TIMEOUT）后反映到 ETag，期间客户端保留的计数最多旧一个缓存周期。
+批量 update() 需要同时更新 updated_at（见 touch_fields）。
+"""
+import hashlib
+import json
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from utils import caching
+
+
+def touch_fields(model):
+    """批量 update() 时需要一并更新的 auto_now 字段，如 {'updated_at': now}"""
+    now = timezone.now()
+    return {
+        field.name: now
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+    }
+
+
+def make_validators(values, media_type):
+    """
+    由聚合值计算 (ETag, Last-Modified 时间戳)
+    values 中的 datetime 取最大值作为 Last-Modified；响应格式不同时 ETag 不同
+    """
+    payload = json.dumps([media_type, values], default=str, separators=(',', ':'))
+    etag = f'W/"{hashlib.sha1(payload.encode()).hexdigest()}"'
+    timestamps = [value.timestamp() for value in values if hasattr(value, 'timestamp')]
+    return etag, int(max(timestamps)) if timestamps else None
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # 客户端每次使用前重新验证
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def not_modified(request, etag, last_modified):
+    """请求的验证器匹配时返回带验证器的 304（或 412），否则返回 None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalResponseMixin:
+    """
+    视图集的条件请求支持，与 CachedResponseMixin 一起使用（共用 cache_models）
+
+    conditional_response(namespace, compute_validators, build)：compute_validators 无参数，
+    返回可 JSON 序列化的聚合值列表，资源不存在时返回 None（交给 build 返回 404）；
+    build 生成完整响应，只有 200 响应带验证器。验证器的缓存默认依赖 cache_models，
+    结果因用户而异时在 params 中加入用户；on_not_modified 在返回 304 时调用（如计入查看次数）。
+    """
+
+    def conditional_response(self, namespace, compute_validators, build, models=None, params=(),
+                             on_not_modified=None):
+        request = self.request
+        if request.method not in ('GET', 'HEAD'):
+            return build()
+        tags = [caching.model_tag(model) for model in (models or self.cache_models)]
+        values = caching.get_or_compute(
+            f'{namespace}:validators', caching.request_params(request) + list(params), tags, compute_validators,
+        )
+        if values is None:
+            return build()
+        etag, last_modified = make_validators(values, request.accepted_media_type)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            if on_not_modified is not None and response.status_code == 304:
+                on_not_modified()
+            return response
+        response = build()
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
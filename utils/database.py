@@ -0,0 +1,35 @@
+import os
+
+from django.db import OperationalError, connections
+
+from utils.db_backends.postgresql.base import connection_mode
+
+
+def database_unavailable(exception):
+    """异常是否由获取数据库连接失败引起（连接池耗尽或数据库不可达），而不是查询本身出错"""
+    return isinstance(exception, OperationalError) and any(
+        getattr(connection, 'connect_failed', False) for connection in connections.all(initialized_only=True)
+    )
+
+
+def pool_stats():
+    """
+    当前工作进程各数据库别名的连接配置与连接池状态
+
+    连接池按进程创建，pool_size、requests_waiting 等只反映处理本次请求的进程；
+    跨进程的获取耗时与失败次数见 db_connection_checkout_seconds / db_connection_errors_total 指标。
+    """
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        entry = {
+            'vendor': connections[alias].vendor,
+            'mode': connection_mode(settings_dict),
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+        }
+        pool = getattr(connections[alias], 'pool', None) if entry['mode'] == 'pool' else None
+        if pool is not None:
+            entry['pool'] = pool.get_stats()
+        stats[alias] = entry
+    return {'pid': os.getpid(), 'databases': stats}
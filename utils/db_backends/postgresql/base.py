@@ -0,0 +1,46 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from utils.metrics import registry
+
+CONNECTION_CHECKOUT = registry.histogram(
+    'db_connection_checkout_seconds',
+    '获取数据库连接的耗时（秒）：新建连接，或连接池模式下从池中取出（含排队等待）',
+    labelnames=('alias', 'mode'),
+)
+CONNECTION_ERRORS = registry.counter(
+    'db_connection_errors_total',
+    '获取数据库连接失败次数（连接池等待超时、数据库不可达等）',
+    labelnames=('alias', 'mode'),
+)
+
+
+def connection_mode(settings_dict):
+    """连接模式：pool（psycopg 连接池）、persistent（持久连接）或 none（每个请求新建）"""
+    if settings_dict['OPTIONS'].get('pool'):
+        return 'pool'
+    return 'none' if settings_dict.get('CONN_MAX_AGE', 0) == 0 else 'persistent'
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL 后端，在 Django 自带后端的基础上统计获取连接的耗时与失败次数
+
+    获取连接失败时设置 connect_failed，DatabaseUnavailableMiddleware 据此返回 503。
+    """
+    connect_failed = False
+
+    def get_new_connection(self, conn_params):
+        mode = connection_mode(self.settings_dict)
+        start = time.perf_counter()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            self.connect_failed = True
+            CONNECTION_ERRORS.inc(alias=self.alias, mode=mode)
+            raise
+        finally:
+            CONNECTION_CHECKOUT.observe(time.perf_counter() - start, alias=self.alias, mode=mode)
+        self.connect_failed = False
+        return connection
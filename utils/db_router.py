@@ -0,0 +1,187 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_pin'
+PIN_KEY = 'db:pin:{}'
+
+READ_ROUTING = registry.counter(
+    'db_read_routing_total',
+    '请求的读查询路由：target 为 primary/replica，reason 为选择原因',
+    labelnames=('target', 'reason'),
+)
+
+# 复制延迟（秒）；主库上执行时为 NULL
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+_current_state = ContextVar('db_routing', default=None)
+_jwt = JWTAuthentication()
+
+
+class RoutingState:
+    """
+    单个请求的读写路由状态
+
+    replica 为本请求使用的副本别名（整个请求固定一个副本，避免在不同副本间看到不一致的数据），
+    为 None 时读主库；请求中发生写入后 wrote 为 True，之后的读也改走主库。
+    """
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def activate(state):
+    return _current_state.set(state)
+
+
+def deactivate(token):
+    _current_state.reset(token)
+
+
+def current_state():
+    return _current_state.get()
+
+
+class ReplicaLagMonitor:
+    """
+    副本复制延迟监控
+
+    每个进程缓存各副本的延迟，DB_REPLICA_LAG_CHECK_INTERVAL 秒内最多查询一次；
+    查询失败（副本不可达）时延迟记为 None，在下次检查前不再使用该副本。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lags = {}
+
+    def stale(self):
+        """是否有副本的延迟需要重新测量（需要查询数据库）"""
+        now = time.monotonic()
+        interval = settings.DB_REPLICA_LAG_CHECK_INTERVAL
+        return any(
+            alias not in self._lags or now - self._lags[alias][0] >= interval
+            for alias in settings.DATABASE_REPLICAS
+        )
+
+    def refresh(self):
+        now = time.monotonic()
+        interval = settings.DB_REPLICA_LAG_CHECK_INTERVAL
+        for alias in settings.DATABASE_REPLICAS:
+            with self._lock:
+                checked = self._lags.get(alias)
+                if checked and now - checked[0] < interval:
+                    continue
+                # 先占位，避免多个线程同时测量同一副本
+                self._lags[alias] = (now, checked[1] if checked else None)
+            self._lags[alias] = (now, self.measure(alias))
+
+    @staticmethod
+    def measure(alias):
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            logger.warning('Replica %s unavailable', alias, exc_info=True)
+            return None
+        return float(lag or 0)
+
+    def lag(self, alias):
+        checked = self._lags.get(alias)
+        return checked[1] if checked else None
+
+    def healthy(self):
+        """延迟在 DB_REPLICA_MAX_LAG 以内的副本"""
+        return [
+            alias for alias in settings.DATABASE_REPLICAS
+            if self.lag(alias) is not None and self.lag(alias) <= settings.DB_REPLICA_MAX_LAG
+        ]
+
+
+monitor = ReplicaLagMonitor()
+
+
+def token_uid(request):
+    """从 JWT 读取用户 uid，只校验签名与有效期，不查询数据库"""
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+    try:
+        return _jwt.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def pin_cookie_active(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def choose_replica(request_method, pinned):
+    """
+    选择本请求读查询使用的数据库，返回 (副本别名或 None, 原因)
+    调用前应确保 monitor 中的延迟不过期（monitor.stale() 为 False），本函数不查询数据库。
+    """
+    if request_method not in ('GET', 'HEAD', 'OPTIONS'):
+        return None, 'unsafe_method'
+    if pinned:
+        return None, 'pinned'
+    healthy = monitor.healthy()
+    if not healthy:
+        return None, 'lagging'
+    return random.choice(healthy), 'replica'
+
+
+class PrimaryReplicaRouter:
+    """
+    主从读写路由
+
+    只有 ReplicaRoutingMiddleware 标记过的请求中的读查询才会发往副本；
+    后台任务、管理命令等没有路由状态的代码始终使用主库。
+    写入与迁移只在主库上进行。
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current_state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,150 @@
+"""
+日志处理
+
+QueuedHandler 在请求线程中只把日志记录放入队列，由每个工作进程自己的 QueueListener 线程
+完成格式化与写入（控制台、文件），慢速的 I/O 不再阻塞请求。gunicorn 预加载时主进程中启动的
+监听线程不会被 fork 到工作进程中，工作进程在第一次写日志时按进程号重新创建队列与监听线程。
+
+消息参数在监听线程中才格式化，记录日志时应使用 %-style 参数（logger.info('... %s', value)）
+并只传递已有的普通值，不要为了记录日志而执行查询。
+
+SamplingFilter 按 logger 名称对 INFO 及以下级别的高频日志按比例采样，WARNING 及以上始终保留。
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+from utils.metrics import registry
+
+LOG_DROPPED = registry.counter(
+    'log_records_dropped_total',
+    '日志队列已满而丢弃的日志记录数',
+    labelnames=('level',),
+)
+
+_handlers = weakref.WeakSet()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按 logger 名称采样 INFO 及以下级别的日志
+
+    rates 为 {logger 名称: 保留比例}，按最长的名称前缀匹配（'api' 同时作用于 'api.v1.views.sfpr'），
+    未配置的 logger 全部保留。
+    """
+
+    def __init__(self, rates=None, level=logging.INFO):
+        super().__init__()
+        self.rates = {name: min(1.0, max(0.0, float(rate))) for name, rate in (rates or {}).items()}
+        self.level = logging._checkLevel(level)
+        self._resolved = {}
+
+    def rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > self.level:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class QueuedHandler(QueueHandler):
+    """
+    把日志记录交给后台线程处理的 Handler
+
+    handlers 为 LOGGING 中其他 handler 的名称，配置时取得，由监听线程依次调用；
+    队列满（maxsize 条）时丢弃新记录并计入 log_records_dropped_total，不阻塞请求线程。
+    """
+
+    def __init__(self, handlers=(), maxsize=10000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize))
+        self.handler_names = list(handlers)
+        # 配置时取得目标 handler 并保持强引用：logging 按名称登记 handler 用的是弱引用，
+        # 目标 handler 不直接挂在任何 logger 上，只按名称查找会在垃圾回收后找不到
+        self.targets = [self._resolve(name) for name in self.handler_names]
+        self.maxsize = maxsize
+        self.respect_handler_level = respect_handler_level
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        _handlers.add(self)
+        atexit.register(self.stop)
+
+    @staticmethod
+    def _resolve(name):
+        # dictConfig 按名称顺序配置 handler，目标 handler 的名称需排在本 handler 之前（如 console、file 与 queue）
+        handler = logging._handlers.get(name)
+        if handler is None:
+            raise ValueError(f'QueuedHandler 的目标 handler {name!r} 未配置')
+        return handler
+
+    def start(self):
+        """在当前进程中启动监听线程；fork 出的子进程丢弃继承的队列并重新启动"""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # 子进程中父进程的监听线程不存在，继承的队列（及其中残留的记录）由父进程处理
+            self.queue = queue.Queue(self.maxsize)
+            self.listener = QueueListener(
+                self.queue, *self.targets, respect_handler_level=self.respect_handler_level,
+            )
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """写完队列中剩余的记录后停止监听线程（进程退出时自动调用）"""
+        with self._start_lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def prepare(self, record):
+        # 不在请求线程中格式化：消息、参数与异常信息原样交给监听线程
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc(level=record.levelname)
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            try:
+                self.start()
+            except Exception:
+                # 记录日志不能抛出异常
+                self.handleError(record)
+                return
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def _after_fork_in_child():
+    # fork 时其他线程可能正持有锁，子进程中重新创建
+    for handler in list(_handlers):
+        handler._start_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
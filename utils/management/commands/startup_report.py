@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 在全新的解释器中导入 WSGI 应用并处理第一个请求，阶段之间向 stderr 写入标记以区分各阶段的导入
+CHILD_SCRIPT = r'''
+import io, json, sys, time
+spawned_at = float(sys.argv[1])
+path, host = sys.argv[2], sys.argv[3]
+
+def mark(phase):
+    sys.stderr.write('startup-report: phase=%s\n' % phase)
+    sys.stderr.flush()
+
+mark('wsgi')
+from config.wsgi import application
+ready_at = time.time()
+
+def request():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    start = time.time()
+    body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    b''.join(body)
+    getattr(body, 'close', lambda: None)()
+    return status[0], time.time() - start
+
+mark('first_request')
+status, first = request()
+responded_at = time.time()
+mark('warm_request')
+_, second = request()
+print(json.dumps({
+    'status': status,
+    'ready_seconds': ready_at - spawned_at,
+    'first_response_seconds': responded_at - spawned_at,
+    'first_request_seconds': first,
+    'warm_request_seconds': second,
+}))
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+PHASE_LINE = re.compile(r'^startup-report: phase=(\w+)$')
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 {阶段: [(模块, 自身耗时秒, 累计耗时秒, 嵌套深度)]}"""
+    phases = {'interpreter': []}
+    phase = 'interpreter'
+    for line in stderr.splitlines():
+        match = PHASE_LINE.match(line)
+        if match:
+            phase = match.group(1)
+            phases.setdefault(phase, [])
+            continue
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            phases[phase].append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return phases
+
+
+def summarize_imports(imports, top):
+    """按顶层包汇总自身耗时，并列出累计耗时最长的顶层导入"""
+    packages = {}
+    for module, self_seconds, _, _ in imports:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + self_seconds
+    roots = [entry for entry in imports if entry[3] == 0]
+    children = [entry for entry in imports if entry[3] == 1]
+    if len(roots) == 1 and children:
+        # 只有一个入口模块（如 config.wsgi）时列出它直接导入的模块
+        roots = children
+    roots.sort(key=lambda entry: entry[2], reverse=True)
+    return {
+        'total_seconds': sum(entry[1] for entry in imports),
+        'packages': sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+        'modules': [(module, cumulative) for module, _, cumulative, _ in roots[:top]],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        '启动耗时报告：在新的 Python 进程中导入 WSGI 应用并处理第一个请求，'
+        '输出进程启动到应用就绪、到第一个响应的耗时，以及各阶段按包/模块统计的导入耗时（-X importtime）。'
+        '用于评估工作进程启动与滚动重启的速度；importtime 本身有少量开销。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/v1/users/config/', help='第一个请求的路径')
+        parser.add_argument('--repeat', type=int, default=3, help='启动次数，耗时取中位数')
+        parser.add_argument('--top', type=int, default=15, help='每个阶段列出的包/模块数')
+        parser.add_argument('--output', help='结果写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host and '*' not in host), 'localhost')
+        runs = [self.run_child(options['path'], host) for _ in range(max(1, options['repeat']))]
+        timings, stderr = zip(*runs)
+        result = {
+            key: statistics.median(run[key] for run in timings)
+            for key in ('ready_seconds', 'first_response_seconds', 'first_request_seconds', 'warm_request_seconds')
+        }
+        result['status'] = timings[-1]['status']
+        result['imports'] = {
+            phase: summarize_imports(imports, options['top'])
+            for phase, imports in parse_importtime(stderr[-1]).items() if imports
+        }
+        self.report(result, options)
+
+    def run_child(self, path, host):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT, str(time.time()), path, host],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0 or not proc.stdout.strip():
+            raise CommandError(f'启动失败：\n{proc.stderr[-2000:]}')
+        return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+    def report(self, result, options):
+        self.stdout.write(f'进程启动到 WSGI 应用就绪：{result["ready_seconds"] * 1000:.0f} ms')
+        self.stdout.write(
+            f'进程启动到第一个响应：{result["first_response_seconds"] * 1000:.0f} ms'
+            f'（第一个请求 {result["first_request_seconds"] * 1000:.0f} ms，{result["status"]}；'
+            f'之后的请求 {result["warm_request_seconds"] * 1000:.1f} ms）'
+        )
+        phase_names = {
+            'interpreter': '解释器启动', 'wsgi': '导入 WSGI 应用', 'first_request': '第一个请求（URLconf、视图）',
+            'warm_request': '第二个请求',
+        }
+        for phase, summary in result['imports'].items():
+            self.stdout.write(f'\n[{phase_names.get(phase, phase)}] 导入合计 {summary["total_seconds"] * 1000:.0f} ms')
+            self.stdout.write('  按包（自身耗时）：' + '，'.join(
+                f'{package} {seconds * 1000:.0f} ms' for package, seconds in summary['packages']
+            ))
+            for module, seconds in summary['modules']:
+                self.stdout.write(f'  {seconds * 1000:>8.1f} ms  {module}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'结果已写入 {options["output"]}')
@@ -0,0 +1,149 @@
+"""
+工作进程内存
+
+gunicorn 预加载（preload_app）时主进程导入应用后 fork 出工作进程，导入的模块、类与常量
+以写时复制的方式共享；gc.freeze() 把这些对象移入永久代，子进程的垃圾回收不再改写其引用计数头，
+共享页面因此不会被逐渐复制。RSS 包含共享页面，判断单个进程实际占用应看 USS（独占）或 PSS（按比例分摊）。
+
+MemoryWatchdog 在每个工作进程中定期测量内存并上报（见 /api/v1/monitoring/memory/），
+独占内存超过上限时让工作进程优雅退出，由 gunicorn 主进程补充新的工作进程。
+"""
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+import redis
+from django.conf import settings
+
+from utils.metrics import metrics_redis, registry
+from utils.redis_client import disconnect_all
+
+logger = logging.getLogger(__name__)
+
+REPORT_KEY_PREFIX = 'memory:worker:'
+
+WORKER_RECYCLED = registry.counter(
+    'worker_memory_recycled_total',
+    '因独占内存超过上限而退出的工作进程数',
+)
+
+_local_reports = {}
+
+
+def process_memory(pid='self'):
+    """
+    进程内存（字节）：rss、pss、uss（Private_Clean + Private_Dirty）、shared
+    读取 Linux 的 /proc/<pid>/smaps_rollup；不支持时只返回 ru_maxrss 换算的 rss 峰值
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        # Linux 上 ru_maxrss 的单位为 KB，macOS 为字节
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024, 'pss': None, 'uss': None, 'shared': None}
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }
+
+
+def close_connections():
+    """
+    fork 前关闭主进程中的数据库与 Redis 连接，避免工作进程共用同一个套接字
+    （预加载时导入应用或系统检查可能已经建立了连接）
+    """
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for cache in caches.all(initialized_only=True):
+        # django 的 RedisCache 按服务器地址缓存连接池
+        client = cache.__dict__.get('_cache')
+        for pool in getattr(client, '_pools', {}).values():
+            pool.disconnect()
+    disconnect_all()
+
+
+def report(stats):
+    """上报本进程的内存数据，保留 3 个检查间隔；未配置 METRICS_REDIS_URL 时只保存在本进程"""
+    key = f'{REPORT_KEY_PREFIX}{socket.gethostname()}:{os.getpid()}'
+    ttl = max(1, int(settings.WORKER_MEMORY_CHECK_INTERVAL * 3))
+    if not settings.METRICS_REDIS_URL:
+        _local_reports[key] = (time.monotonic() + ttl, stats)
+        return
+    try:
+        metrics_redis().set(key, json.dumps(stats), ex=ttl)
+    except redis.RedisError:
+        logger.warning('工作进程内存数据写入 Redis 失败', exc_info=True)
+
+
+def worker_reports():
+    """各工作进程最近一次上报的内存数据，按独占内存从大到小排列"""
+    if not settings.METRICS_REDIS_URL:
+        now = time.monotonic()
+        reports = [stats for expires, stats in _local_reports.values() if expires > now]
+    else:
+        client = metrics_redis()
+        keys = list(client.scan_iter(match=f'{REPORT_KEY_PREFIX}*', count=100))
+        reports = [json.loads(value) for value in client.mget(keys) if value] if keys else []
+    return sorted(reports, key=lambda stats: stats.get('uss') or stats['rss'], reverse=True)
+
+
+class MemoryWatchdog(threading.Thread):
+    """
+    工作进程内的内存检查线程
+
+    每 WORKER_MEMORY_CHECK_INTERVAL 秒测量一次并上报；独占内存（不支持时为 RSS）超过
+    WORKER_MAX_MEMORY_MB 时向本进程发送 SIGTERM，gunicorn/uvicorn 工作进程处理完当前请求后退出。
+    """
+
+    def __init__(self, worker_id=None):
+        super().__init__(name='memory-watchdog', daemon=True)
+        self.worker_id = worker_id
+        self.started_at = time.time()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                if self.check():
+                    return
+            except Exception:
+                logger.exception('工作进程内存检查失败')
+            if self._stopped.wait(settings.WORKER_MEMORY_CHECK_INTERVAL):
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        """测量并上报内存，需要回收时返回 True"""
+        memory = process_memory()
+        stats = dict(memory, pid=os.getpid(), host=socket.gethostname(), worker=self.worker_id,
+                     started_at=self.started_at, updated_at=time.time())
+        report(stats)
+
+        limit = settings.WORKER_MAX_MEMORY_MB * 1024 * 1024
+        private = memory['uss'] if memory['uss'] is not None else memory['rss']
+        if not limit or private <= limit:
+            return False
+        logger.warning(
+            'Worker %s private memory %.0f MB exceeds WORKER_MAX_MEMORY_MB=%s, recycling',
+            os.getpid(), private / 1024 / 1024, settings.WORKER_MAX_MEMORY_MB,
+        )
+        WORKER_RECYCLED.inc()
+        registry.flush()
+        os.kill(os.getpid(), signal.SIGTERM)
+        return True
@@ -0,0 +1,274 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'metrics:'
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False, separators=(',', ':'))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}')
+        return _label_key({key: str(value) for key, value in labels.items()})
+
+    def samples(self, series):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.record(self.name, self._labels(labels), {'value': amount})
+
+    def samples(self, series):
+        return [
+            {'labels': labels, 'value': fields.get('value', 0.0)}
+            for labels, fields in series
+        ]
+
+
+class Histogram(Metric):
+    """
+    直方图
+
+    每个观测值只累加所在区间的计数，输出时再转换成 Prometheus 要求的累积桶。
+    """
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets or settings.METRICS_LATENCY_BUCKETS))
+
+    def observe(self, value, **labels):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        self.registry.record(self.name, self._labels(labels), {
+            f'b{index}': 1,
+            'sum': value,
+            'count': 1,
+        })
+
+    def samples(self, series):
+        samples = []
+        bounds = self.buckets + (math.inf,)
+        for labels, fields in series:
+            cumulative = 0.0
+            buckets = []
+            for index, bound in enumerate(bounds):
+                cumulative += fields.get(f'b{index}', 0.0)
+                buckets.append((bound, cumulative))
+            samples.append({
+                'labels': labels,
+                'buckets': buckets,
+                'sum': fields.get('sum', 0.0),
+                'count': fields.get('count', 0.0),
+            })
+        return samples
+
+
+def metrics_redis():
+    """指标专用的 Redis 客户端，带较短的超时"""
+    return get_redis_client(
+        settings.METRICS_REDIS_URL,
+        socket_timeout=settings.METRICS_REDIS_TIMEOUT,
+        socket_connect_timeout=settings.METRICS_REDIS_TIMEOUT,
+    )
+
+
+def estimate_quantile(q, buckets):
+    """按累积桶线性插值估算分位数（与 Prometheus histogram_quantile 一致）"""
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    rank = q * buckets[-1][1]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+class MetricsRegistry:
+    """
+    多进程指标注册表
+
+    每个工作进程先在内存中累加增量，由后台线程每 METRICS_FLUSH_INTERVAL 秒
+    用一次 pipeline 把增量 HINCRBYFLOAT 到 Redis，所有进程的数据因此自然汇总；
+    请求线程只做内存累加，不会因为 Redis 变慢而被拖住。
+    未配置 METRICS_REDIS_URL 时只在本进程内汇总（开发与测试环境）。
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._local = defaultdict(lambda: defaultdict(float))
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # 子进程丢弃从主进程继承的未写出增量，避免重复计数
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        # 线程不会随 fork 复制，子进程在第一次记录时重新启动
+        self._flusher = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f'指标 {metric.name} 已注册')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def record(self, name, labels, fields):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            for field, amount in fields.items():
+                self._pending[(name, labels, field)] += amount
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name='metrics-flush', daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('指标刷新失败')
+
+    def flush(self):
+        """把本进程累计的增量写入共享存储"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+        if not pending:
+            return
+
+        if not settings.METRICS_REDIS_URL:
+            for (name, labels, field), amount in pending.items():
+                self._local[name][f'{labels}|{field}'] += amount
+            return
+
+        try:
+            pipe = metrics_redis().pipeline(transaction=False)
+            for (name, labels, field), amount in pending.items():
+                pipe.hincrbyfloat(KEY_PREFIX + name, f'{labels}|{field}', amount)
+            pipe.execute()
+        except redis.RedisError:
+            logger.warning('指标写入 Redis 失败，将在下次刷新时重试', exc_info=True)
+            # 指标与标签组合是有限的，合并回待写缓冲不会无限增长
+            with self._lock:
+                for key, amount in pending.items():
+                    self._pending[key] += amount
+
+    def _read(self):
+        if not settings.METRICS_REDIS_URL:
+            return {name: dict(values) for name, values in self._local.items()}
+        client = metrics_redis()
+        pipe = client.pipeline(transaction=False)
+        names = list(self._metrics)
+        for name in names:
+            pipe.hgetall(KEY_PREFIX + name)
+        return {
+            name: {key.decode(): float(value) for key, value in values.items()}
+            for name, values in zip(names, pipe.execute())
+        }
+
+    def snapshot(self):
+        """汇总所有进程的数据，返回可直接序列化的指标列表"""
+        self.flush()
+        totals = self._read()
+        result = []
+        for name, metric in self._metrics.items():
+            series = defaultdict(dict)
+            for key, value in totals.get(name, {}).items():
+                labels, field = key.rsplit('|', 1)
+                series[labels][field] = value
+            result.append({
+                'name': name,
+                'type': metric.type,
+                'help': metric.documentation,
+                'samples': metric.samples(
+                    (dict(json.loads(labels)), fields) for labels, fields in series.items()
+                ),
+            })
+        return result
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in items
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus(snapshot):
+    """把 snapshot() 的结果渲染成 Prometheus 文本格式"""
+    lines = []
+    for metric in snapshot:
+        name = metric['name']
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for sample in metric['samples']:
+            labels = sample['labels']
+            if metric['type'] == 'histogram':
+                for bound, count in sample['buckets']:
+                    lines.append(
+                        f'{name}_bucket{_format_labels(labels, {"le": _format_value(bound)})} {_format_value(count)}'
+                    )
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(sample["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {_format_value(sample["count"])}')
+            else:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(sample["value"])}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -1,58 +1,454 @@
+import gzip
 import time
 import logging
 from typing import Callable
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from apps.users.permissions import IsSuperUser
+from utils import db_router, profiling, timing
+from utils.database import database_unavailable
+from utils.metrics import registry
+from utils.queries import QueryBudgetExceeded, record_queries
+
+try:
+    import brotli
+except ImportError:  # 未安装时只使用 gzip
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
-class MiddlewareTimingMiddleware:
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds',
+    '请求处理耗时（秒），按路由统计',
+    labelnames=('method', 'route', 'status'),
+)
+COMPRESSION_BYTES = registry.counter(
+    'http_response_compression_bytes_total',
+    '压缩响应的字节数：stage 为 original（压缩前）或 compressed（压缩后）',
+    labelnames=('encoding', 'stage'),
+)
+DATABASE_UNAVAILABLE = registry.counter(
+    'http_database_unavailable_total',
+    '因无法获取数据库连接返回 503 的请求数',
+    labelnames=('route',),
+)
+
+
+def route_label(request):
+    """路由标签使用 URL 名称（如 player-detail），保证标签数量有限"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unmatched'
+
+
+class HybridMiddleware:
+    """
+    同时支持 WSGI 与 ASGI 的中间件基类
+
+    ASGI 下链路中只要有一个同步中间件，Django 就会把整个请求切到线程中执行，
+    异步视图也就失去了意义；子类实现 __call__ 的同步版本 handle(request)
+    和异步版本 ahandle(request)，由 Django 按 get_response 的类型选择。
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response: Callable):
         self.get_response = get_response
-        self._middleware_classes = None
-        self._start_times = {}
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # 记录请求开始时间
-        request_start = time.time()
-        request._start_time = request_start
-        
-        # 获取所有中间件类（仅在第一次调用时执行）
-        if self._middleware_classes is None:
-            self._middleware_classes = [m.split('.')[-1] for m in settings.MIDDLEWARE]
-        
-        # 记录当前中间件开始时间
-        current_middleware = self.__class__.__name__
-        self._start_times[current_middleware] = time.time()
-        
-        # 执行请求
-        response = self.get_response(request)
-        
-        # 计算并记录时间
-        end_time = time.time()
-        total_time = end_time - request_start
-        middleware_time = end_time - self._start_times[current_middleware]
-        
-        # 只在DEBUG模式下或请求时间超过阈值时记录性能日志
-        if settings.DEBUG or total_time > 1.0:  # 超过1秒的请求记录日志
-            if hasattr(request, '_view_time'):
-                view_time = request._view_time
-                logger.info(f"Request: {request.method} {request.path} - Total: {total_time:.3f}s, View: {view_time:.3f}s")
-        
-        return response
-
-class ViewTimingMiddleware:
+        if self.async_mode:
+            return self.ahandle(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def ahandle(self, request):
+        raise NotImplementedError
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """
+    请求耗时统计
+
+    - 响应头 Server-Timing 给出 db、cache、view、serialize 和 total 分段（毫秒）
+    - 按路由记录延迟直方图，由 utils.metrics 跨工作进程汇总
+    - 超过 SLOW_REQUEST_THRESHOLD 秒的请求记录日志
+
+    计时数据保存在每个请求自己的 contextvar 中，多线程工作进程下互不干扰；
+    db 分段由 utils.queries.instrument 按 contextvar 计入。
+    view 为视图函数耗时（含其中的 db/cache），serialize 为响应渲染耗时。
+    应放在 MIDDLEWARE 的第一位以覆盖其它中间件的耗时。
+    """
+
     def __init__(self, get_response: Callable):
-        self.get_response = get_response
+        super().__init__(get_response)
+        if self.async_mode:
+            # 同步的 process_view 会被 Django 包装成 sync_to_async，每个请求多一次线程切换
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def handle(self, request):
+        timings, token = timing.activate()
+        try:
+            response = self.get_response(request)
+            total = self._finish(request, timings)
+        finally:
+            timing.deactivate(token)
+        return self._report(request, response, timings, total)
+
+    async def ahandle(self, request):
+        timings, token = timing.activate()
+        try:
+            response = await self.get_response(request)
+            total = self._finish(request, timings)
+        finally:
+            timing.deactivate(token)
+        return self._report(request, response, timings, total)
+
+    def _finish(self, request, timings):
+        view_start = getattr(request, '_view_start', None)
+        if view_start is not None and 'view' not in timings.durations:
+            # 非模板响应：视图返回后不再经过渲染
+            timings.add('view', time.perf_counter() - view_start)
+        return timings.elapsed()
+
+    def _report(self, request, response, timings, total):
+        route = route_label(request)
+        REQUEST_LATENCY.observe(
+            total,
+            method=request.method,
+            route=route,
+            status=f'{response.status_code // 100}xx',
+        )
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.header(total)
+        if total > settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Slow request: %s %s (%s) - %s',
+                request.method, request.path, route, timings.header(total),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+
+    def process_template_response(self, request, response):
+        return self._template_response(request, response)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+
+    async def _aprocess_template_response(self, request, response):
+        return self._template_response(request, response)
+
+    def _view_started(self, request):
+        request._view_start = time.perf_counter()
+        timings = timing.current_timings()
+        if timings is not None:
+            timings.route = route_label(request)
+
+    def _template_response(self, request, response):
+        timings = timing.current_timings()
+        if timings is None:
+            return response
+        render_start = time.perf_counter()
+        view_start = getattr(request, '_view_start', None)
+        if view_start is not None:
+            timings.add('view', render_start - view_start)
+
+        def record_render(rendered):
+            timings.add('serialize', time.perf_counter() - render_start)
+
+        response.add_post_render_callback(record_render)
+        return response
+
+
+def negotiate_encoding(accept_encoding):
+    """按 Accept-Encoding 选择 br 或 gzip（q 值相同时优先 br），都不接受时返回 None"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        params = params.strip()
+        try:
+            weight = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            weight = 0.0
+        weights[coding.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for coding in ('br', 'gzip') if brotli else ('gzip',):
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """
+    响应压缩
+
+    超过 COMPRESSION_MIN_SIZE 字节的 JSON/MessagePack/文本响应按客户端的 Accept-Encoding
+    使用 brotli（已安装时）或 gzip 压缩，压缩耗时计入 Server-Timing 的 compress 分段。
+    流式响应、已有 Content-Encoding 的响应以及压缩后没有变小的响应原样返回。
+    应放在 ServerTimingMiddleware 之后、其它中间件之前。
+    """
+    compressible_types = ('text/', 'application/json', 'application/msgpack', 'application/javascript')
+
+    def __init__(self, get_response: Callable):
+        if not settings.COMPRESSION_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        return self._compress(request, self.get_response(request))
+
+    async def ahandle(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if not response.get('Content-Type', '').startswith(self.compressible_types):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        with timing.timed('compress'):
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            else:
+                compressed = gzip.compress(response.content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+        if len(compressed) >= len(response.content):
+            return response
+
+        COMPRESSION_BYTES.inc(len(response.content), encoding=encoding, stage='original')
+        COMPRESSION_BYTES.inc(len(compressed), encoding=encoding, stage='compressed')
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # 与 GZipMiddleware 一致：压缩后的内容与原 ETag 不再逐字节对应，改为弱 ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class QueryAccountingMiddleware(HybridMiddleware):
+    """
+    SQL 查询统计与 N+1 检测
+
+    统计每个请求的查询次数与耗时，同一形态的查询执行次数达到
+    QUERY_REPEAT_THRESHOLD 时视为疑似 N+1，记录日志并通过响应头报告：
+    X-Query-Count（查询次数）、X-Query-Repeated（疑似 N+1 的查询形态数）。
+
+    QUERY_BUDGETS 按路由名称配置查询预算，超出时记录日志；
+    QUERY_BUDGET_STRICT 为 True（测试中）时改为抛出 QueryBudgetExceeded。
+    """
+
+    def handle(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self._report(request, response, recorder)
+
+    async def ahandle(self, request):
+        with record_queries() as recorder:
+            response = await self.get_response(request)
+        return self._report(request, response, recorder)
+
+    def _report(self, request, response, recorder):
+        route = route_label(request)
+        repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if settings.QUERY_STATS_HEADER:
+            response['X-Query-Count'] = str(recorder.count)
+            response['X-Query-Repeated'] = str(len(repeated))
+        for shape, count in repeated:
+            logger.warning(
+                'Possible N+1: %s %s (%s) ran %d times: %s',
+                request.method, request.path, route, count, shape[:500],
+            )
+
+        budget = settings.QUERY_BUDGETS.get(route)
+        if budget is not None and recorder.count > budget:
+            message = (
+                f'{request.method} {request.path} ({route}) 执行了 {recorder.count} 次查询，'
+                f'超出预算 {budget}'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning('%s', message)
+        return response
+
+
+class DatabaseUnavailableMiddleware(HybridMiddleware):
+    """
+    数据库连接池耗尽或数据库不可达时返回 503
+
+    只处理获取连接失败（见 utils.database.database_unavailable），查询本身的错误仍按 500 处理；
+    响应带 Retry-After（DB_UNAVAILABLE_RETRY_AFTER 秒），客户端与负载均衡可据此退避重试。
+    """
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        return await self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not database_unavailable(exception):
+            return None
+        route = route_label(request)
+        DATABASE_UNAVAILABLE.inc(route=route)
+        logger.warning('Database unavailable: %s %s (%s): %s', request.method, request.path, route, exception)
+        response = JsonResponse(
+            {'detail': '服务繁忙，请稍后重试'},
+            status=503,
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Retry-After'] = str(settings.DB_UNAVAILABLE_RETRY_AFTER)
+        return response
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    读写分离与读己之写
+
+    GET/HEAD/OPTIONS 请求的读查询发往延迟在 DB_REPLICA_MAX_LAG 以内的副本（见 utils.db_router）；
+    写请求成功后，DB_REPLICA_STICKY_SECONDS 秒内该用户的读请求固定走主库：
+    登录用户按 JWT 中的 uid 在缓存中记录，匿名用户（如刚注册）通过 db_pin Cookie 记录。
+    未配置副本时不启用。
+    """
+
+    def __init__(self, get_response: Callable):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        uid = db_router.token_uid(request)
+        pinned = db_router.pin_cookie_active(request) or (uid is not None and cache.get(db_router.PIN_KEY.format(uid)))
+        if db_router.monitor.stale():
+            db_router.monitor.refresh()
+        state, token = self._begin(request, pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        if self._should_pin(request, response, state):
+            if uid is not None:
+                cache.set(db_router.PIN_KEY.format(uid), 1, settings.DB_REPLICA_STICKY_SECONDS)
+            self._set_cookie(response)
+        return response
+
+    async def ahandle(self, request):
+        uid = db_router.token_uid(request)
+        pinned = db_router.pin_cookie_active(request) or (
+            uid is not None and await cache.aget(db_router.PIN_KEY.format(uid))
+        )
+        if db_router.monitor.stale():
+            await sync_to_async(db_router.monitor.refresh)()
+        state, token = self._begin(request, pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.deactivate(token)
+        if self._should_pin(request, response, state):
+            if uid is not None:
+                await cache.aset(db_router.PIN_KEY.format(uid), 1, settings.DB_REPLICA_STICKY_SECONDS)
+            self._set_cookie(response)
+        return response
+
+    @staticmethod
+    def _begin(request, pinned):
+        replica, reason = db_router.choose_replica(request.method, pinned)
+        db_router.READ_ROUTING.inc(target='replica' if replica else 'primary', reason=reason)
+        state = db_router.RoutingState(replica)
+        return state, db_router.activate(state)
+
+    @staticmethod
+    def _should_pin(request, response, state):
+        return state.wrote and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400
+
+    @staticmethod
+    def _set_cookie(response):
+        sticky = settings.DB_REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            db_router.PIN_COOKIE, str(int(time.time() + sticky)),
+            max_age=sticky, httponly=True, samesite='Lax',
+        )
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    按需分析单个请求
+
+    请求带 X-Profile 头或 _profile 查询参数（值为 sample 或 cprofile，其它值按 sample 处理）
+    且经认证为超级管理员时，在分析器下执行该请求，结果按请求 ID 保存到缓存，
+    响应头 X-Profile-Id 给出 ID，可通过 /api/v1/monitoring/profiles/<id>/ 查看。
+    未带标记的请求只多一次字典查找。应放在 MIDDLEWARE 的最后。
+    """
+
+    def handle(self, request):
+        mode = self._mode(request)
+        if mode is None or not self._is_superuser(request):
+            return self.get_response(request)
+        response, data = profiling.profile_call(mode, self.get_response, request)
+        return self._save(request, response, mode, data)
+
+    async def ahandle(self, request):
+        mode = self._mode(request)
+        if mode is None or not await sync_to_async(self._is_superuser)(request):
+            return await self.get_response(request)
+        response, data = await profiling.aprofile_call(mode, self.get_response, request)
+        return self._save(request, response, mode, data)
+
+    @staticmethod
+    def _mode(request):
+        flag = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not flag or not settings.PROFILING_ENABLED:
+            return None
+        return 'cprofile' if flag == 'cprofile' else 'sample'
+
+    def _save(self, request, response, mode, data):
+        request_id = profiling.request_id_for(request)
+        profiling.save_profile(request_id, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'route': route_label(request),
+            'status': response.status_code,
+            'user': request.user.uid,
+            'mode': mode,
+            'duration_ms': data['duration_ms'],
+        }, data)
+        response['X-Profile-Id'] = request_id
+        return response
+
+    def _is_superuser(self, request):
+        """使用 DRF 配置的认证类（JWT）认证，并复用 IsSuperUser 权限判断"""
+        drf_request = Request(
+            request,
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            return IsSuperUser().has_permission(drf_request, None)
+        except APIException:
+            return False
 
-    def __call__(self, request):
-        # 记录视图开始时间
-        view_start = time.time()
-        
-        # 执行视图
-        response = self.get_response(request)
-        
-        # 计算视图执行时间
-        view_time = time.time() - view_start
-        request._view_time = view_time
-        
-        return response 
\ No newline at end of file
@@ -0,0 +1,125 @@
+from django.db import models
+
+DEFERRED = models.DEFERRED
+
+
+class DirtyFieldsMixin:
+    """
+    模型字段变更追踪
+
+    从数据库加载时记录各字段的原始值（一个元组，文件字段只记文件名），
+    保存时自动只更新发生变化的列；没有任何变化时只更新 auto_now 字段（没有时按 Django 默认写所有列），
+    仍然发送 pre_save/post_save，缓存失效等依赖信号的逻辑照常执行。
+    确定不需要副作用时可以 save(skip_if_clean=True)，没有变化就直接跳过写库与信号。
+    通过 has_changed('avatar') 判断字段是否真正变化，用于控制副作用。
+    """
+
+    @classmethod
+    def _dirty_tracked_fields(cls):
+        """返回需要追踪的字段 (name, attname, 是否文件字段)，按类缓存"""
+        fields = cls.__dict__.get('_tracked_fields_cache')
+        if fields is None:
+            fields = tuple(
+                (field.name, field.attname, isinstance(field, models.FileField))
+                for field in cls._meta.concrete_fields
+                if not field.primary_key
+            )
+            cls._tracked_fields_cache = fields
+            cls._auto_now_fields_cache = tuple(
+                field.name for field in cls._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            )
+        return fields
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._take_snapshot()
+        return instance
+
+    @staticmethod
+    def _snapshot_value(value, is_file):
+        if is_file and value is not DEFERRED:
+            # FieldFile / 上传文件对象都只比较文件名，避免持有文件对象
+            return getattr(value, 'name', value) or None
+        return value
+
+    def _take_snapshot(self, field_names=None):
+        """记录当前字段值；指定 field_names 时只更新这些字段的快照"""
+        values = self.__dict__
+        tracked = self._dirty_tracked_fields()
+        previous = values.get('_loaded_values')
+        if field_names is None or previous is None:
+            field_names = None
+        else:
+            field_names = set(field_names)
+        self._loaded_values = tuple(
+            self._snapshot_value(values.get(attname, DEFERRED), is_file)
+            if field_names is None or name in field_names or attname in field_names
+            else previous[index]
+            for index, (name, attname, is_file) in enumerate(tracked)
+        )
+
+    def get_dirty_fields(self):
+        """
+        返回发生变化的字段及其原始值 {字段名: 原始值}
+        未从数据库加载过的实例视为所有已赋值字段都发生了变化
+        """
+        loaded = self.__dict__.get('_loaded_values')
+        values = self.__dict__
+        dirty = {}
+        for index, (name, attname, is_file) in enumerate(self._dirty_tracked_fields()):
+            current = values.get(attname, DEFERRED)
+            if current is DEFERRED:
+                # 延迟加载且未赋值的字段不会变化
+                continue
+            if loaded is None:
+                dirty[name] = None
+                continue
+            original = loaded[index]
+            if original is DEFERRED:
+                dirty[name] = None
+            elif self._snapshot_value(current, is_file) != original:
+                dirty[name] = original
+        return dirty
+
+    def has_changed(self, field_name):
+        """字段值是否与加载时不同"""
+        return field_name in self.get_dirty_fields()
+
+    def get_original_value(self, field_name):
+        """字段加载时的原始值（文件字段为文件名）"""
+        loaded = self.__dict__.get('_loaded_values')
+        for index, (name, _, _) in enumerate(self._dirty_tracked_fields()):
+            if name == field_name:
+                if loaded is None or loaded[index] is DEFERRED:
+                    return None
+                return loaded[index]
+        raise ValueError(f'{type(self).__name__} 没有字段 {field_name}')
+
+    def save(self, *args, skip_if_clean=False, **kwargs):
+        tracked = (
+            not args
+            and not self._state.adding
+            and self.__dict__.get('_loaded_values') is not None
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and kwargs.get('using', self._state.db) == self._state.db
+        )
+        if tracked:
+            dirty = self.get_dirty_fields()
+            if not dirty and skip_if_clean:
+                return
+            # auto_now 字段（如 updated_at）随任何变更一起更新；update_fields 为空时 Django 不写库也不发送信号
+            update_fields = list(dirty) + [
+                name for name in self._auto_now_fields_cache if name not in dirty
+            ]
+            if update_fields:
+                kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._take_snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get('fields', args[1] if len(args) > 1 else None)
+        self._take_snapshot(fields)
@@ -0,0 +1,203 @@
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+PROFILE_KEY = 'profile:{}'
+RECENT_KEY = 'profile:recent'
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_site_prefixes = sorted(
+    {os.path.dirname(os.path.dirname(os.__file__))} | {p for p in sys.path if p.endswith('site-packages')},
+    key=len, reverse=True,
+)
+
+
+def _short_path(filename):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        return os.path.relpath(filename, base)
+    for prefix in _site_prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+
+def request_id_for(request):
+    """沿用合法的 X-Request-ID，否则生成新的请求 ID"""
+    request_id = request.headers.get('X-Request-ID', '')
+    if _REQUEST_ID_RE.match(request_id):
+        return request_id
+    return uuid.uuid4().hex
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    后台线程按固定间隔读取目标线程的调用栈（sys._current_frames），
+    只记录开始分析的帧以下的部分，结果为 {调用栈元组: 采样次数}。
+    在协程中使用时，事件循环线程上不经过开始帧的栈（其它请求的协程）不计入；
+    协程挂起等待（如 sync_to_async 中的数据库查询）期间没有样本。
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._labels = {}
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+            )
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and frame is not self._root:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack and frame is not None:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self, root):
+        """开始采样当前线程，只记录 root 帧以下的调用栈"""
+        self._target = threading.get_ident()
+        self._root = root
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __enter__(self):
+        return self.start(sys._getframe(1))
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._root = None
+
+    def folded(self):
+        """flamegraph.pl / speedscope 使用的折叠栈格式"""
+        return '\n'.join(f'{";".join(stack)} {count}' for stack, count in self.stacks.most_common())
+
+    def call_tree(self):
+        """嵌套调用树 {name, value, children}，可直接用于 d3-flame-graph"""
+        root = {'name': 'root', 'value': 0, 'children': {}}
+        for stack, count in self.stacks.items():
+            root['value'] += count
+            node = root
+            for name in stack:
+                child = node['children'].get(name)
+                if child is None:
+                    child = node['children'][name] = {'name': name, 'value': 0, 'children': {}}
+                child['value'] += count
+                node = child
+
+        def freeze(node):
+            children = sorted(node['children'].values(), key=lambda c: c['value'], reverse=True)
+            return {'name': node['name'], 'value': node['value'], 'children': [freeze(c) for c in children]}
+
+        return freeze(root)
+
+
+def _cprofile_stats(profile, limit):
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({_short_path(filename)}:{line})',
+            'calls': nc,
+            'primitive_calls': cc,
+            'tottime_ms': round(tt * 1000, 3),
+            'cumtime_ms': round(ct * 1000, 3),
+            'callers': sorted(
+                f'{caller[2]} ({_short_path(caller[0])}:{caller[1]})' for caller in callers
+            )[:10],
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+class _Profiler:
+    """profile_call 与 aprofile_call 共用的分析器：进入时开始，退出后通过 data 取结果"""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = SamplingProfiler(settings.PROFILING_SAMPLE_INTERVAL).start(sys._getframe(1))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == 'cprofile':
+            self._profile.disable()
+            data = {'functions': _cprofile_stats(self._profile, settings.PROFILING_MAX_FUNCTIONS)}
+        else:
+            self._sampler.__exit__(*exc_info)
+            data = {
+                'sample_interval_ms': settings.PROFILING_SAMPLE_INTERVAL * 1000,
+                'samples': sum(self._sampler.stacks.values()),
+                'call_tree': self._sampler.call_tree(),
+                'folded': self._sampler.folded(),
+            }
+        data['duration_ms'] = round((time.perf_counter() - self._start) * 1000, 3)
+        data['mode'] = self.mode
+        self.data = data
+
+
+def profile_call(mode, func, *args):
+    """
+    在分析器下执行 func(*args)，返回 (结果, 分析数据)
+    mode 为 sample（采样，含调用树和折叠栈）或 cprofile（确定性，函数耗时表）
+    """
+    with _Profiler(mode) as profiler:
+        result = func(*args)
+    return result, profiler.data
+
+
+async def aprofile_call(mode, func, *args):
+    """
+    profile_call 的协程版本，用于 ASGI 下的异步中间件链
+
+    cprofile 模式会统计事件循环线程上同时执行的其它协程，结果仅供参考。
+    """
+    with _Profiler(mode) as profiler:
+        result = await func(*args)
+    return result, profiler.data
+
+
+def save_profile(request_id, summary, data):
+    """按请求 ID 保存分析结果，并维护最近的分析列表"""
+    summary = dict(summary, id=request_id, created_at=timezone.now().isoformat())
+    cache.set(PROFILE_KEY.format(request_id), dict(data, **summary), settings.PROFILING_TTL)
+    recent = [item for item in cache.get(RECENT_KEY, []) if item['id'] != request_id]
+    recent.insert(0, summary)
+    cache.set(RECENT_KEY, recent[:settings.PROFILING_MAX_STORED], settings.PROFILING_TTL)
+
+
+def get_profile(request_id):
+    return cache.get(PROFILE_KEY.format(request_id))
+
+
+def recent_profiles():
+    """最近的分析摘要（新到旧），其中个别记录可能已过期"""
+    return cache.get(RECENT_KEY, [])
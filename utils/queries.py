@@ -0,0 +1,77 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from utils import timing
+
+# IN (%s, %s, ...) 的参数个数不同仍视为同一形态
+_PLACEHOLDER_LIST_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+# 事务保存点名称每次不同
+_SAVEPOINT_RE = re.compile(r'"s\d+_x\d+"')
+
+# 当前上下文中正在记录的 QueryRecorder（可嵌套，查询计入所有层）
+_active_recorders = ContextVar('query_recorders', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """严格模式下请求的查询数超出预算"""
+
+
+def normalize_sql(sql):
+    """把 SQL 归一化为形态：参数个数、保存点名称等差异不影响比较"""
+    sql = _PLACEHOLDER_LIST_RE.sub('%s...', sql)
+    return _SAVEPOINT_RE.sub('"sp"', sql)
+
+
+class QueryRecorder:
+    """统计查询次数、耗时和各形态的执行次数"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def add(self, sql, duration):
+        self.duration += duration
+        self.count += 1
+        self.shapes[normalize_sql(sql)] += 1
+
+    def repeated(self, threshold):
+        """执行次数达到阈值的查询形态（疑似 N+1），按次数降序"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def instrument(execute, sql, params, many, context):
+    """
+    execute_wrapper：把查询计入当前上下文的 QueryRecorder 和请求计时的 db 分段
+
+    由 utils 应用在连接创建时安装到每个连接上，按 contextvar 而不是按连接分发：
+    ASGI 下异步 ORM 在 sync_to_async 的线程中执行，上下文随调用复制过去，
+    查询仍能计入发起它的请求。
+    """
+    recorders = _active_recorders.get()
+    timings = timing.current_timings()
+    if not recorders and timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings.add('db', elapsed)
+        for recorder in recorders:
+            recorder.add(sql, elapsed)
+
+
+@contextmanager
+def record_queries():
+    """记录代码块内（当前上下文中）执行的所有查询"""
+    recorder = QueryRecorder()
+    token = _active_recorders.set(_active_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _active_recorders.reset(token)
@@ -0,0 +1,31 @@
+import threading
+
+import redis
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis_client(url, **options):
+    """
+    按 URL 获取共享的 Redis 客户端
+
+    redis-py 的连接池会在 fork 后检测进程号并重建连接，
+    因此 gunicorn 预加载时在主进程创建的客户端也可以在工作进程中使用。
+    options（如 socket_timeout）原样传给 Redis.from_url，参数不同的客户端各用各的连接池，
+    这样给指标加的短超时不会影响同一 URL 上阻塞订阅的连接。
+    """
+    key = (url, tuple(sorted(options.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = redis.Redis.from_url(url, **options)
+    return client
+
+
+def disconnect_all():
+    """断开所有共享客户端的连接（如 fork 前），之后的命令会按需重新连接"""
+    for client in list(_clients.values()):
+        client.connection_pool.disconnect()
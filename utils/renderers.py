@@ -0,0 +1,82 @@
+"""
+API 渲染器
+
+ORJSONRenderer 与 DRF JSONRenderer 输出相同的紧凑 JSON，编码改用 orjson；
+MessagePackRenderer 供原生客户端通过 Accept: application/msgpack 获取更小的二进制响应。
+"""
+import math
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:  # 未安装时不注册 MessagePackRenderer（见 MSGPACK_RENDERER_ENABLED）
+    msgpack = None
+
+# 日期时间、Decimal 等交给 DRF 的编码器处理，保证与 JSONRenderer 的输出一致
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+_encoder = JSONEncoder()
+
+
+def has_non_finite_float(obj):
+    """数据中是否含有 NaN/Infinity（只检查值，不检查键）"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        obj = obj.values()
+    elif not isinstance(obj, (list, tuple)):
+        return False
+    for item in obj:
+        if has_non_finite_float(item):
+            return True
+    return False
+
+
+def encode_default(obj):
+    """orjson/msgpack 无法直接编码的类型（惰性翻译字符串、Decimal、datetime 等）"""
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    基于 orjson 的 JSON 渲染器
+
+    紧凑输出（默认情况）由 orjson 编码，除浮点数的写法（如 1e16 与 1e+16）外与 JSONRenderer 逐字节一致；
+    需要缩进（可浏览 API、Accept 中带 indent）、关闭了 COMPACT_JSON/UNICODE_JSON/STRICT_JSON
+    或 orjson 无法编码（如超出 64 位的整数）时交给 JSONRenderer。
+    orjson 会把 NaN/Infinity 写成 null，而 JSONRenderer（STRICT_JSON）会抛出 ValueError；
+    输出中出现 null 时检查数据，含非有限浮点数则同样交给 JSONRenderer 抛出异常。
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent is not None or not self.compact or self.ensure_ascii or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and has_non_finite_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # 与 JSONRenderer 一致：转义 U+2028/U+2029，使输出可直接嵌入 JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack 渲染器，客户端需显式请求 application/msgpack（或 ?format=msgpack）"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
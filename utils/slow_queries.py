@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from utils import timing
+from utils.metrics import registry
+from utils.queries import normalize_sql
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'slow_queries'
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+SLOW_QUERIES = registry.counter(
+    'db_slow_queries_total',
+    '超过阈值的慢查询次数，flag 为执行计划中的顺序扫描/排序',
+    labelnames=('route', 'flag'),
+)
+
+# 这些模块是查询的包装层，不作为查询来源
+_INSTRUMENTATION_FILES = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('slow_queries.py', 'queries.py', 'middleware.py', 'timing.py', 'cache_backends.py')
+}
+
+_local_buffer = deque()
+_state = threading.local()
+
+
+class _RateLimiter:
+    """进程内令牌桶：每分钟最多 capacity 次捕获"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._updated = time.monotonic()
+
+    def allow(self, capacity):
+        with self._lock:
+            now = time.monotonic()
+            if self._tokens is None:
+                self._tokens = float(capacity)
+            self._tokens = min(capacity, self._tokens + (now - self._updated) * capacity / 60)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_limiter = _RateLimiter()
+# 查询形态 -> (上次捕获时间, 执行计划标记)，同一形态在去重窗口内只捕获一次
+_recent_shapes = {}
+_recent_lock = threading.Lock()
+
+
+def params_shape(params, many=False):
+    """只记录参数的类型和长度，不记录参数值"""
+    if params is None:
+        return None
+    if many:
+        params = list(params)
+        return {'rows': len(params), 'row': params_shape(params[0]) if params else None}
+    if isinstance(params, dict):
+        return {key: params_shape([value])[0] for key, value in params.items()}
+
+    shape = []
+    for value in params:
+        if value is None:
+            shape.append('None')
+        elif isinstance(value, (str, bytes)):
+            shape.append(f'{type(value).__name__}({len(value)})')
+        elif isinstance(value, (list, tuple)):
+            shape.append(f'{type(value).__name__}[{len(value)}]')
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+
+def query_origin(limit=5):
+    """调用栈中最近的几帧项目代码（跳过 Django 与包装层）"""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    origin = []
+    while frame is not None and len(origin) < limit:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and filename not in _INSTRUMENTATION_FILES:
+            origin.append(f'{os.path.relpath(filename, base)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return origin
+
+
+def plan_flags(plan):
+    """从 JSON 执行计划中找出顺序扫描和排序，如 seq_scan:sfpr_record、sort:sfpr_player"""
+    flags = []
+
+    def relations(node):
+        found = [node['Relation Name']] if 'Relation Name' in node else []
+        for child in node.get('Plans', []):
+            found.extend(relations(child))
+        return found
+
+    def walk(node):
+        node_type = node.get('Node Type', '')
+        if node_type == 'Seq Scan':
+            flags.append(f'seq_scan:{node.get("Relation Name")}')
+        elif node_type in ('Sort', 'Incremental Sort'):
+            flags.extend(f'sort:{name}' for name in sorted(set(relations(node))) or ['?'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    for entry in plan or []:
+        if 'Plan' in entry:
+            walk(entry['Plan'])
+    return sorted(set(flags))
+
+
+def explain(connection, sql, params):
+    """
+    获取 EXPLAIN (ANALYZE off) 执行计划，仅支持 PostgreSQL
+
+    直接使用底层 DB-API 游标，不经过 execute_wrapper，不计入请求的查询数；
+    在事务中时包一层保存点，EXPLAIN 出错也不会中止外层事务。
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    in_transaction = not connection.get_autocommit()
+    with connection.connection.cursor() as cursor:
+        if in_transaction:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(f'EXPLAIN (ANALYZE off, FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        except connection.Database.Error:
+            if in_transaction:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            logger.debug('EXPLAIN 失败: %s', sql[:200], exc_info=True)
+            return None
+        if in_transaction:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def store(entry):
+    """写入环形缓冲：配置了 SLOW_QUERY_REDIS_URL 时为所有进程共享的 Redis 列表"""
+    size = settings.SLOW_QUERY_BUFFER_SIZE
+    if not settings.SLOW_QUERY_REDIS_URL:
+        _local_buffer.appendleft(entry)
+        while len(_local_buffer) > size:
+            _local_buffer.pop()
+        return
+    try:
+        pipe = get_redis_client(settings.SLOW_QUERY_REDIS_URL).pipeline(transaction=False)
+        pipe.lpush(BUFFER_KEY, json.dumps(entry, ensure_ascii=False, default=str))
+        pipe.ltrim(BUFFER_KEY, 0, size - 1)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning('慢查询写入 Redis 失败', exc_info=True)
+
+
+def recent_slow_queries(route=None, flag=None):
+    """环形缓冲中的慢查询，新到旧；可按路由名称与执行计划标记前缀过滤"""
+    if not settings.SLOW_QUERY_REDIS_URL:
+        entries = list(_local_buffer)
+    else:
+        raw = get_redis_client(settings.SLOW_QUERY_REDIS_URL).lrange(BUFFER_KEY, 0, -1)
+        entries = [json.loads(item) for item in raw]
+    if route:
+        entries = [entry for entry in entries if entry['route'] == route]
+    if flag:
+        entries = [entry for entry in entries if any(f.startswith(flag) for f in entry['flags'])]
+    return entries
+
+
+def _should_capture(shape, now):
+    """按形态去重，再经过采样和限速；返回 (是否捕获, 该形态上次的计划标记)"""
+    with _recent_lock:
+        last = _recent_shapes.get(shape)
+        if last and now - last[0] < settings.SLOW_QUERY_DEDUP_SECONDS:
+            return False, last[1]
+    if random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+        return False, None
+    return _limiter.allow(settings.SLOW_QUERY_MAX_PER_MINUTE), None
+
+
+def capture_slow_query(execute, sql, params, many, context):
+    """
+    execute_wrapper：记录超过 SLOW_QUERY_THRESHOLD_MS 的查询
+
+    每次慢查询都计入 db_slow_queries_total 指标；同一形态在去重窗口内只捕获一次，
+    捕获还要经过采样（SLOW_QUERY_SAMPLE_RATE）与限速（SLOW_QUERY_MAX_PER_MINUTE）。
+    """
+    if getattr(_state, 'capturing', False):
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS or not settings.SLOW_QUERY_ENABLED:
+        return result
+
+    _state.capturing = True
+    try:
+        timings = timing.current_timings()
+        route = getattr(timings, 'route', None) or 'none'
+        shape = normalize_sql(sql)
+        now = time.monotonic()
+        capture, flags = _should_capture(shape, now)
+        if capture:
+            connection = context['connection']
+            plan = None
+            if not many and sql.lstrip().upper().startswith(EXPLAINABLE):
+                plan = explain(connection, sql, params)
+            flags = plan_flags(plan)
+            with _recent_lock:
+                if len(_recent_shapes) > 1000:
+                    _recent_shapes.clear()
+                _recent_shapes[shape] = (now, flags)
+            store({
+                'time': timezone.now().isoformat(),
+                'duration_ms': round(duration * 1000, 2),
+                'database': connection.alias,
+                'route': route,
+                'origin': query_origin(),
+                'sql': sql[:4000],
+                'params_shape': params_shape(params, many),
+                'plan': plan,
+                'flags': flags,
+            })
+            logger.warning('Slow query %.1fms (%s) %s: %s', duration * 1000, route, flags, sql[:300])
+        for flag in flags or ['none']:
+            SLOW_QUERIES.inc(route=route, flag=flag)
+    except Exception:
+        # 捕获过程中的任何问题都不能影响业务查询
+        logger.exception('慢查询捕获失败')
+    finally:
+        _state.capturing = False
+    return result
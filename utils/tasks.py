@@ -0,0 +1,200 @@
+"""
+Celery 任务基础设施
+
+队列按任务特点划分，由不同的 worker 进程消费（见 docker-compose 中的 celery_worker_* 服务），
+慢的图片处理不会占住发送验证码邮件的 worker：
+
+    email        邮件，延迟敏感，prefetch 1
+    default      未归类的任务
+    images       图片处理，耗时长，单独的 worker、prefetch 1
+    counters     计数等高频短任务，不需要 acks_late，prefetch 较大
+    maintenance  清理、删除账号等后台维护
+
+任务按基类的 default_queue 进入队列（route_task），CELERY_TASK_ROUTES 中按名称配置的路由优先；
+不在任务类上设置 Celery 的 queue 属性，否则它会覆盖路由表。
+任务耗时、排队等待时间与各队列积压（queue depth）记录在 /api/v1/monitoring/metrics/ 中。
+"""
+import hashlib
+import json
+import logging
+import smtplib
+import time
+
+import redis
+from celery import Task
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+
+from utils.metrics import registry
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUES = ('email', 'default', 'images', 'counters', 'maintenance')
+
+TASK_DURATION = registry.histogram(
+    'celery_task_duration_seconds',
+    'Celery 任务执行耗时（秒），state 为 SUCCESS/FAILURE/RETRY 等',
+    labelnames=('task', 'queue', 'state'),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0),
+)
+TASK_QUEUE_WAIT = registry.histogram(
+    'celery_task_queue_wait_seconds',
+    'Celery 任务从发布到开始执行的等待时间（秒）',
+    labelnames=('queue',),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+TASK_SKIPPED = registry.counter(
+    'celery_task_idempotent_skips_total',
+    '幂等任务因相同参数的任务已完成或正在执行而跳过的次数',
+    labelnames=('task',),
+)
+
+# kombu 的 Redis transport 按优先级把消息放在 queue、queue\x06\x163 等多个列表中
+_PRIORITY_SEPARATOR = '\x06\x16'
+_PRIORITY_STEPS = (0, 3, 6, 9)
+
+
+class BaseTask(Task):
+    """
+    任务基类：执行完成后才确认消息（acks_late），worker 进程异常退出时消息重新入队，
+    因此任务必须可以安全地重复执行。
+    """
+    abstract = True
+    default_queue = 'default'
+    acks_late = True
+    reject_on_worker_lost = True
+
+
+class IdempotentTask(BaseTask):
+    """
+    幂等任务
+
+    以任务名与参数（或 idempotency_key() 的返回值）为键：同一个键的任务同时只执行一个，
+    成功后 idempotency_timeout 秒内不再重复执行（重复投递、worker 重启后重新入队等情况）。
+    执行失败时释放锁，重试可以再次执行。
+    """
+    abstract = True
+    idempotency_timeout = 3600
+    # 锁的有效期应大于任务的最长执行时间
+    lock_timeout = 600
+
+    def idempotency_key(self, args, kwargs):
+        return json.dumps([self.name, args, kwargs], sort_keys=True, default=str)
+
+    def __call__(self, *args, **kwargs):
+        digest = hashlib.sha1(self.idempotency_key(args, kwargs).encode()).hexdigest()
+        key = f'task:idempotency:{self.name}:{digest}'
+        if cache.get(f'{key}:done') or not cache.add(f'{key}:lock', self.request.id or 1, self.lock_timeout):
+            TASK_SKIPPED.inc(task=self.name)
+            logger.info('跳过重复的任务 %s %s', self.name, self.request.id)
+            return None
+        try:
+            result = super().__call__(*args, **kwargs)
+            cache.set(f'{key}:done', 1, self.idempotency_timeout)
+            return result
+        finally:
+            cache.delete(f'{key}:lock')
+
+
+class EmailTask(IdempotentTask):
+    """邮件任务：SMTP 与网络错误按指数退避重试"""
+    abstract = True
+    default_queue = 'email'
+    autoretry_for = (smtplib.SMTPException, ConnectionError, TimeoutError)
+    retry_backoff = True
+    retry_backoff_max = 300
+    max_retries = 5
+    soft_time_limit = 30
+
+
+class ImageTask(IdempotentTask):
+    """图片处理任务"""
+    abstract = True
+    default_queue = 'images'
+    soft_time_limit = 120
+    time_limit = 180
+
+
+class CounterTask(BaseTask):
+    """计数任务：高频、可丢失，收到即确认，不保存结果"""
+    abstract = True
+    default_queue = 'counters'
+    acks_late = False
+    reject_on_worker_lost = False
+    ignore_result = True
+
+
+class MaintenanceTask(BaseTask):
+    """维护任务：清理、批量删除等，可以重复执行"""
+    abstract = True
+    default_queue = 'maintenance'
+    soft_time_limit = 3600
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """CELERY_TASK_ROUTES 中的最后一个路由：按任务基类的 default_queue 选择队列"""
+    queue = getattr(task, 'default_queue', None)
+    return {'queue': queue} if queue else None
+
+
+def _queue_name(task, delivery_info=None):
+    queue = (delivery_info or {}).get('routing_key') or getattr(task, 'default_queue', None)
+    return queue or settings.CELERY_TASK_DEFAULT_QUEUE
+
+
+@before_task_publish.connect(dispatch_uid='utils.tasks.published_at')
+def record_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect(dispatch_uid='utils.tasks.prerun')
+def record_task_start(task=None, **kwargs):
+    task.request.started_at = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at:
+        queue = _queue_name(task, task.request.delivery_info)
+        TASK_QUEUE_WAIT.observe(max(0.0, time.time() - float(published_at)), queue=queue)
+
+
+@task_postrun.connect(dispatch_uid='utils.tasks.postrun')
+def record_task_duration(task=None, state=None, **kwargs):
+    started_at = getattr(task.request, 'started_at', None)
+    if started_at is None:
+        return
+    TASK_DURATION.observe(
+        time.perf_counter() - started_at,
+        task=task.name, queue=_queue_name(task, task.request.delivery_info), state=state or 'UNKNOWN',
+    )
+
+
+def queue_depths():
+    """各队列中等待执行的消息数；broker 不是 Redis 时返回空字典"""
+    broker_url = settings.CELERY_BROKER_URL
+    if not broker_url or not broker_url.startswith(('redis://', 'rediss://')):
+        return {}
+    pipe = get_redis_client(broker_url).pipeline(transaction=False)
+    for queue in TASK_QUEUES:
+        for step in _PRIORITY_STEPS:
+            pipe.llen(f'{queue}{_PRIORITY_SEPARATOR}{step}' if step else queue)
+    lengths = iter(pipe.execute())
+    return {queue: sum(next(lengths) for _ in _PRIORITY_STEPS) for queue in TASK_QUEUES}
+
+
+def queue_depth_metric():
+    """供指标端点输出的队列积压 gauge；broker 不可用时返回 None，不影响其他指标"""
+    try:
+        depths = queue_depths()
+    except redis.RedisError:
+        logger.warning('读取任务队列长度失败', exc_info=True)
+        return None
+    if not depths:
+        return None
+    return {
+        'name': 'celery_queue_depth',
+        'type': 'gauge',
+        'help': 'Celery 各队列中等待执行的消息数',
+        'samples': [{'labels': {'queue': queue}, 'value': depth} for queue, depth in depths.items()],
+    }
@@ -0,0 +1,101 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path, resolve
+from rest_framework.test import APIClient
+
+from api.v1 import urls as v1_urls
+from api.v1.views import async_views
+from apps.sfpr.models import Player, Record
+from utils import throttling
+
+User = get_user_model()
+
+# 启用异步视图时的 URLconf（默认配置下 ASYNC_VIEWS_ENABLED 关闭）
+urlpatterns = [
+    path('api/v1/', include(async_views.async_urlpatterns(v1_urls.router.urls) + v1_urls.urlpatterns)),
+]
+
+
+@override_settings(QUERY_STATS_HEADER=True, API_CACHE_ENABLED=False, THROTTLE_ENABLED=False)
+class AsyncViewTests(TestCase):
+    """异步视图的响应应与同步视图逐字节一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='submitter', email='submitter@example.com', password='pass12345')
+        cls.players = []
+        for i in range(25):
+            player = Player.objects.create(nickname='同名玩家', game_id=f'id{i}', server=i % 30 + 1)
+            for status in ('approved', 'pending'):
+                Record.objects.create(player=player, description=f'记录{i}', status=status, submitter=cls.user)
+            cls.players.append(player)
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def async_get(self, path, params=None, headers=None):
+        with self.settings(ROOT_URLCONF=__name__):
+            return async_to_sync(self.async_client.get)(path, params, headers=headers)
+
+    def assertSameResponse(self, path, params=None, status_code=200, headers=None):
+        expected = self.client.get(path, params, headers=headers)
+        actual = self.async_get(path, params, headers=headers)
+        self.assertEqual(expected.status_code, status_code)
+        self.assertEqual(actual.status_code, status_code)
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_player_search(self):
+        self.assertEqual(resolve('/api/v1/players/search/', urlconf=__name__).func.__name__, 'player_search')
+        for params in ({'nickname': '同名玩家'}, {'nickname': '同名玩家', 'page': 2},
+                       {'nickname': '同名玩家', 'game_id': 'id3'}, {'nickname': '不存在'}):
+            self.assertSameResponse('/api/v1/players/search/', params)
+        self.assertSameResponse('/api/v1/players/search/', status_code=400)
+
+    def test_record_list(self):
+        player = self.players[0]
+        for params in (None, {'page': 3}, {'status': 'pending'}, {'ordering': 'created_at,bogus'},
+                       {'player': str(player.id)}):
+            self.assertSameResponse('/api/v1/records/', params)
+
+    def test_record_list_fallback(self):
+        """无效的页码和过滤参数交给同步视图，错误响应同样一致"""
+        self.assertSameResponse('/api/v1/records/', {'page': 99}, status_code=404)
+        self.assertSameResponse('/api/v1/records/', {'status': 'unknown'}, status_code=400)
+        self.assertSameResponse('/api/v1/records/', {'player': 'not-a-uuid'}, status_code=400)
+
+    def test_config_and_invalid_token(self):
+        self.assertSameResponse('/api/v1/users/config/')
+        self.assertSameResponse('/api/v1/users/config/', status_code=401,
+                                headers={'Authorization': 'Bearer invalid'})
+
+    def test_async_middleware_accounting(self):
+        """ASGI 下异步 ORM 在线程中执行的查询仍计入请求"""
+        response = self.async_get('/api/v1/players/search/', {'nickname': '同名玩家'})
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    @override_settings(THROTTLE_ENABLED=True, THROTTLE_REDIS_URL='')
+    def test_send_verify_code(self):
+        throttling.local_buckets.clear()
+
+        def post(email):
+            with self.settings(ROOT_URLCONF=__name__):
+                return async_to_sync(self.async_client.post)(
+                    '/api/v1/users/send_verify_code/', json.dumps({'email': email}), content_type='application/json'
+                )
+
+        response = post('new@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(cache.get('email_verify_code_new@example.com'))
+        throttled = post('new@example.com')
+        self.assertEqual(throttled.status_code, 429)
+        self.assertIn('Retry-After', throttled)
+        self.assertEqual(post('submitter@example.com').status_code, 400)
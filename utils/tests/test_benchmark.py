@@ -0,0 +1,102 @@
+import os
+import random
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from django.core.management import CommandError
+from django.test import Client, SimpleTestCase, TransactionTestCase
+
+from utils.benchmark import (
+    HttpClient, Scenario, build_schedule, compare, header_query_count, percentile, summarize,
+)
+
+
+class BenchmarkHelpersTests(SimpleTestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_schedule_is_reproducible(self):
+        scenarios = [Scenario('a', 3, None), Scenario('b', 1, None)]
+        first = [s.name for s in build_schedule(scenarios, 50, seed=1)]
+        second = [s.name for s in build_schedule(scenarios, 50, seed=1)]
+        self.assertEqual(first, second)
+
+    def test_compare_flags_regressions(self):
+        samples = {'players_list': [(0.010, 2, 200)] * 10}
+        baseline = summarize(samples, wall_time=1.0)
+        current = summarize({'players_list': [(0.020, 3, 200)] * 10}, wall_time=1.0)
+        _, regressed = compare(baseline, current, tolerance=0.1)
+        self.assertTrue(regressed)
+        _, regressed = compare(baseline, baseline, tolerance=0.1)
+        self.assertFalse(regressed)
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = f'{self.path}|{self.headers.get("Authorization")}'.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Query-Count', '3')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(SimpleTestCase):
+    def test_get_with_params_and_headers(self):
+        """测试 HTTP 客户端与测试客户端参数一致，并复用连接"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _EchoHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        client = HttpClient(f'http://127.0.0.1:{server.server_address[1]}/prefix')
+        for _ in range(2):
+            response = client.get('/api/v1/players/', {'page': 2}, HTTP_AUTHORIZATION='Bearer token')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'/prefix/api/v1/players/?page=2|Bearer token')
+            self.assertEqual(header_query_count(response), 3)
+        client.close()
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """压测请求都来自同一地址，超出匿名预算后的 429 不能混入结果"""
+
+    def setUp(self):
+        from apps.sfpr.management.commands.benchmark_api import seed_dataset
+        self.dataset = seed_dataset(random.Random(1), players=5, records_per_player=1, users=2, blacklists=0)
+        self.options = {
+            'scenarios': ['players_search'], 'read_only': True, 'warmup': 0, 'seed': 1,
+            'requests': 60, 'concurrency': 1,
+        }
+
+    def test_in_process_run_is_not_throttled(self):
+        from apps.sfpr.management.commands.benchmark_api import Command
+        with self.settings(THROTTLE_ENABLED=True):
+            result = Command().run_in_process(self.dataset, self.options)
+        self.assertEqual(result['overall']['requests'], 60)
+        self.assertEqual(result['overall']['errors'], 0)
+
+    def test_throttled_run_fails(self):
+        from apps.sfpr.management.commands.benchmark_api import Command
+        command = Command(stdout=StringIO())
+        with self.settings(THROTTLE_ENABLED=True):
+            result = command.run_scenarios(self.dataset, self.options, Client)
+        self.assertGreater(result['scenarios']['players_search']['throttled'], 0)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            with self.assertRaises(CommandError):
+                command.report(result, {**self.options, 'output': output, 'compare': None,
+                                        'players': 5, 'records_per_player': 1, 'users': 2,
+                                        'blacklists': 0, 'url': None})
+            self.assertFalse(os.path.exists(output))
@@ -0,0 +1,229 @@
+import json
+import os
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.sfpr.admin import RecordAdmin
+from apps.sfpr.models import Player, Record
+from utils import caching
+from utils.cache_backends import CACHE_TIER_REQUESTS, TieredCache
+from utils.metrics import registry
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'caching-tests'},
+    'hot': {'BACKEND': 'utils.cache_backends.TieredCache', 'LOCATION': 'default'},
+}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, API_CACHE_ENABLED=True, API_CACHE_TIMEOUT=60,
+    API_CACHE_LOCK_WAIT=0.05, API_CACHE_EARLY_RECOMPUTE_BETA=1.0,
+)
+class CacheAsideTests(TestCase):
+    def setUp(self):
+        caching.get_cache().clear()
+        self.compute = mock.Mock(return_value={'value': 1})
+
+    def test_hit_and_invalidate(self):
+        self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute), {'value': 1})
+        self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute), {'value': 1})
+        self.assertEqual(self.compute.call_count, 1)
+
+        caching.invalidate('sfpr.player')
+        caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute)
+        self.assertEqual(self.compute.call_count, 2)
+        # 其他标签的缓存不受影响
+        caching.get_or_compute('ns', ['a'], ['sfpr.record'], self.compute)
+        caching.invalidate('sfpr.player')
+        caching.get_or_compute('ns', ['a'], ['sfpr.record'], self.compute)
+        self.assertEqual(self.compute.call_count, 3)
+
+    def test_waits_for_lock_holder(self):
+        key = caching.make_key('ns', ['a'], caching.tag_versions(['sfpr.player']))
+        caching.get_cache().add(f'{key}:lock', 1)
+        # 持锁的请求未在等待时间内写入结果时自行计算，但不写入缓存
+        self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute), {'value': 1})
+        self.assertIsNone(caching.get_cache().get(key))
+
+        entry = ({'value': 2}, time.time() + 60, 0.1)
+        with mock.patch.object(caching.get_cache(), 'get', side_effect=[None, entry]), \
+                mock.patch('utils.caching.time.sleep'):
+            self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute), {'value': 2})
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_early_recompute(self):
+        self.assertFalse(caching._should_recompute_early(time.time() + 60, 0.01))
+        self.assertTrue(caching._should_recompute_early(time.time() - 1, 0.01))
+
+        caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute)
+        with mock.patch.object(caching, '_should_recompute_early', return_value=True):
+            key = caching.make_key('ns', ['a'], caching.tag_versions(['sfpr.player']))
+            caching.get_cache().add(f'{key}:lock', 1)
+            # 其他请求正在重算时继续使用旧值
+            self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], mock.Mock()), {'value': 1})
+            caching.get_cache().delete(f'{key}:lock')
+            self.compute.return_value = {'value': 3}
+            self.assertEqual(caching.get_or_compute('ns', ['a'], ['sfpr.player'], self.compute), {'value': 3})
+
+    def test_cached_queryset(self):
+        Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        queryset = Player.objects.filter(server=1)
+        self.assertEqual(len(caching.cached_queryset('players', queryset)), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(caching.cached_queryset('players', queryset)), 1)
+        Player.objects.create(nickname='玩家2', game_id='id2', server=1)
+        self.assertEqual(len(caching.cached_queryset('players', queryset)), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, API_CACHE_ENABLED=True, API_CACHE_EARLY_RECOMPUTE_BETA=0, THROTTLE_ENABLED=False)
+class CachedEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='submitter', email='submitter@example.com', password='pass12345')
+        cls.player = Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        cls.record = Record.objects.create(player=cls.player, description='记录', submitter=cls.user, status='pending')
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client = APIClient()
+
+    def test_player_list(self):
+        first = self.client.get('/api/v1/players/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/players/').content, first.content)
+        # 查看次数不使缓存失效
+        self.player.increment_views()
+        with self.assertNumQueries(0):
+            self.client.get('/api/v1/players/')
+
+        Player.objects.create(nickname='新玩家', game_id='id2', server=2)
+        self.assertEqual(self.client.get('/api/v1/players/').json()['count'], 2)
+
+    def test_search_validation_not_cached(self):
+        self.assertEqual(self.client.get('/api/v1/players/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/players/search/', {'nickname': '玩家'}).json()['count'], 1)
+        self.player.delete()
+        self.assertEqual(self.client.get('/api/v1/players/search/', {'nickname': '玩家'}).json()['count'], 0)
+
+    def test_async_lookup(self):
+        """异步视图读取同步视图写入的缓存"""
+        request = RequestFactory().get('/api/v1/players/search/', {'nickname': '玩家'})
+        tags = ['sfpr.player', 'sfpr.record']
+        self.assertIsNone(async_to_sync(caching.aget)('player-search', caching.request_params(request), tags))
+        response = self.client.get('/api/v1/players/search/', {'nickname': '玩家'})
+        data = async_to_sync(caching.aget)('player-search', caching.request_params(request), tags)
+        self.assertEqual(data, response.json())
+
+    def test_async_conditional(self):
+        """异步视图使用同步视图缓存的验证器"""
+        response = self.client.get('/api/v1/players/search/', {'nickname': '玩家'})
+        with self.settings(ROOT_URLCONF='utils.tests.test_async_views'):
+            get = async_to_sync(self.async_client.get)
+            cached = get('/api/v1/players/search/', {'nickname': '玩家'})
+            not_modified = get('/api/v1/players/search/', {'nickname': '玩家'}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_record_list_invalidation(self):
+        path = '/api/v1/records/?status=approved'
+        self.assertEqual(self.client.get(path).json()['count'], 0)
+        # 管理后台的批量审核通过 update() 修改，不触发信号
+        with mock.patch.object(RecordAdmin, 'message_user'):
+            RecordAdmin(Record, None).approve_records(None, Record.objects.all())
+        self.assertEqual(self.client.get(path).json()['count'], 1)
+
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        self.assertEqual(self.client.get(path).json()['results'][0]['submitter_username'], 'submitter')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.client.get(path).json()['results'][0]['submitter_username'], 'renamed')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, METRICS_ENABLED=True, METRICS_REDIS_URL='')
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        self.l2 = caches['default']
+        self.l2.clear()
+        self.cache = TieredCache('default', {'OPTIONS': {'L1_TIMEOUT': 30, 'MAX_ENTRIES': 2}})
+
+    def test_l1_in_front_of_l2(self):
+        self.cache.set('a', {'value': 1})
+        self.assertEqual(self.cache.get('a'), {'value': 1})
+        with mock.patch.object(self.l2, 'get') as l2_get:
+            value = self.cache.get('a')
+            value['value'] = 2
+            self.assertEqual(self.cache.get('a'), {'value': 1})
+        l2_get.assert_not_called()
+
+        # 通过本实例写入时丢弃 L1；其他进程直接写入 L2 时 L1 在收到通知前保留旧值
+        self.cache.set('a', 3)
+        self.assertEqual(self.cache.get('a'), 3)
+        self.l2.set('a', 4)
+        self.assertEqual(self.cache.get('a'), 3)
+        self.cache._l1_discard([self.l2.make_key('a')])
+        self.assertEqual(self.cache.get('a'), 4)
+
+    def test_lru_and_ttl(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(self.cache._entries), 2)
+        with mock.patch('utils.cache_backends.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertIsNone(self.cache._l1_get(self.l2.make_key('c')))
+
+    def test_no_backfill_after_concurrent_invalidation(self):
+        self.l2.set('a', 1)
+        original_get = self.l2.get
+
+        def invalidated_during_read(*args, **kwargs):
+            value = original_get(*args, **kwargs)
+            self.cache._l1_discard([self.l2.make_key('a')])
+            return value
+
+        with mock.patch.object(self.l2, 'get', side_effect=invalidated_during_read):
+            self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache._entries, {})
+
+    def test_listener_applies_remote_invalidations(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        key = self.l2.make_key('a')
+        messages = [
+            {'data': json.dumps({'sender': self.cache._sender, 'keys': ['other']})},
+            {'data': json.dumps({'sender': 'other-process', 'keys': [key]})},
+        ]
+
+        def listen():
+            yield messages[0]
+            # 订阅建立时已清空 L1，重新写入后验证远程通知只丢弃对应的键
+            self.cache._l1_set(key, 1, None, self.cache._generation)
+            yield messages[1]
+            self.cache._listener_pid = None
+
+        client = mock.Mock()
+        client.pubsub.return_value.listen.side_effect = listen
+        self.cache._listener_pid = os.getpid()
+        with mock.patch('utils.cache_backends.get_redis_client', return_value=client), \
+                mock.patch.object(TieredCache, 'redis_url', 'redis://cache'):
+            self.cache._listen()
+        client.pubsub.return_value.subscribe.assert_called_once_with('cache:invalidate:default')
+        self.assertNotIn(key, self.cache._entries)
+
+    def test_tier_metrics(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('a')
+        self.cache.get('missing')
+        registry.flush()
+        samples = next(m for m in registry.snapshot() if m['name'] == CACHE_TIER_REQUESTS.name)['samples']
+        counts = {(s['labels']['tier'], s['labels']['result']): s['value'] for s in samples}
+        self.assertGreaterEqual(counts[('l1', 'hit')], 1)
+        self.assertGreaterEqual(counts[('l2', 'miss')], 1)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, connections
+from django.db.backends.postgresql import base as postgresql_base
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from utils.database import database_unavailable
+from utils.db_backends.postgresql.base import CONNECTION_ERRORS, DatabaseWrapper, connection_mode
+from utils.metrics import registry
+
+User = get_user_model()
+
+
+class ConnectionModeTests(SimpleTestCase):
+    def test_connection_mode(self):
+        self.assertEqual(connection_mode({'OPTIONS': {}, 'CONN_MAX_AGE': 0}), 'none')
+        self.assertEqual(connection_mode({'OPTIONS': {}, 'CONN_MAX_AGE': 60}), 'persistent')
+        self.assertEqual(connection_mode({'OPTIONS': {}, 'CONN_MAX_AGE': None}), 'persistent')
+        self.assertEqual(connection_mode({'OPTIONS': {'pool': {'max_size': 4}}, 'CONN_MAX_AGE': 0}), 'pool')
+
+    @override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='')
+    def test_backend_flags_failed_checkout(self):
+        """测试获取连接失败时标记连接并计数"""
+        wrapper = DatabaseWrapper({'NAME': 'bench', 'OPTIONS': {}, 'CONN_MAX_AGE': 0}, alias='flaky')
+        with mock.patch.object(postgresql_base.DatabaseWrapper, 'get_new_connection',
+                               side_effect=wrapper.Database.OperationalError('pool timeout')):
+            with self.assertRaises(wrapper.Database.OperationalError):
+                wrapper.get_new_connection({})
+        self.assertTrue(wrapper.connect_failed)
+        registry.flush()
+        errors = next(m for m in registry.snapshot() if m['name'] == CONNECTION_ERRORS.name)
+        self.assertIn({'alias': 'flaky', 'mode': 'none'}, [sample['labels'] for sample in errors['samples']])
+
+        with mock.patch.object(postgresql_base.DatabaseWrapper, 'get_new_connection', return_value=object()):
+            wrapper.get_new_connection({})
+        self.assertFalse(wrapper.connect_failed)
+
+
+class DatabaseUnavailableTests(TestCase):
+    def test_only_connection_failures(self):
+        """测试只有获取连接失败才视为数据库不可用"""
+        connection.ensure_connection()
+        self.assertFalse(database_unavailable(OperationalError('statement timeout')))
+        with mock.patch.object(connection, 'connect_failed', True, create=True):
+            self.assertTrue(database_unavailable(OperationalError('pool timeout')))
+            self.assertFalse(database_unavailable(ValueError()))
+
+    def test_returns_503(self):
+        client = APIClient()
+        with mock.patch.object(connection, 'connect_failed', True, create=True), \
+                mock.patch('api.v1.views.sfpr.PlayerViewSet.list', side_effect=OperationalError('pool timeout')):
+            response = client.get('/api/v1/players/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(response.json(), {'detail': '服务繁忙，请稍后重试'})
+
+    def _pool_endpoint(self, **overrides):
+        """按给定的连接配置覆盖 default 别名后请求连接池监控接口"""
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_min': 2, 'pool_max': 4, 'pool_size': 2, 'pool_available': 1}
+        with mock.patch.dict(connections.settings, {'default': {**connections.settings['default'], **overrides}}), \
+                mock.patch.object(type(connections['default']), 'pool', new_callable=mock.PropertyMock,
+                                  return_value=pool, create=True):
+            response = client.get('/api/v1/monitoring/db-pool/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['databases']['default']
+
+    @override_settings(DB_CONNECTION_MODE='pool')
+    def test_pool_endpoint_pool_mode(self):
+        entry = self._pool_endpoint(
+            CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, OPTIONS={'pool': {'min_size': 2, 'max_size': 4}}
+        )
+        self.assertEqual(entry['mode'], 'pool')
+        self.assertEqual(entry['conn_max_age'], 0)
+        self.assertIs(entry['health_checks'], True)
+        self.assertEqual(entry['pool'], {'pool_min': 2, 'pool_max': 4, 'pool_size': 2, 'pool_available': 1})
+
+    @override_settings(DB_CONNECTION_MODE='persistent')
+    def test_pool_endpoint_persistent_mode(self):
+        entry = self._pool_endpoint(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True, OPTIONS={})
+        self.assertEqual(entry['mode'], 'persistent')
+        self.assertEqual(entry['conn_max_age'], 60)
+        self.assertIs(entry['health_checks'], True)
+        self.assertNotIn('pool', entry)
@@ -0,0 +1,113 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils import db_router
+
+User = get_user_model()
+
+
+def read_view(request):
+    return JsonResponse({'db': router.db_for_read(User)})
+
+
+@csrf_exempt
+def write_view(request):
+    router.db_for_write(User)
+    return JsonResponse({'db': router.db_for_read(User)}, status=int(request.GET.get('status', 200)))
+
+
+urlpatterns = [
+    path('read/', read_view),
+    path('write/', write_view),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, DATABASE_REPLICAS=['replica'], DB_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        db_router.monitor._lags.clear()
+        patcher = mock.patch.object(db_router.ReplicaLagMonitor, 'measure', return_value=0.1)
+        self.measure = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, **extra):
+        return self.client.get('/read/', **extra).json()['db']
+
+    def test_reads_use_replica(self):
+        self.assertEqual(self.read(), 'replica')
+        self.measure.assert_called_once_with('replica')
+        # 检查间隔内不重复测量延迟
+        self.read()
+        self.assertEqual(self.measure.call_count, 1)
+
+    def test_lagging_replica_falls_back(self):
+        self.measure.return_value = 30.0
+        self.assertEqual(self.read(), 'default')
+        self.measure.return_value = None
+        db_router.monitor._lags.clear()
+        self.assertEqual(self.read(), 'default')
+
+    def test_write_forces_primary(self):
+        """请求中写入后的读查询走主库，写请求始终不使用副本"""
+        response = self.client.get('/write/')
+        self.assertEqual(response.json()['db'], 'default')
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+    def test_read_your_writes_cookie(self):
+        """匿名写请求成功后通过 Cookie 固定读主库"""
+        self.assertIn(db_router.PIN_COOKIE, self.client.post('/write/').cookies)
+        self.assertEqual(self.read(), 'default')
+
+        # 失败的写请求不固定
+        self.client.cookies.clear()
+        self.assertNotIn(db_router.PIN_COOKIE, self.client.post('/write/?status=400').cookies)
+        self.assertEqual(self.read(), 'replica')
+
+    def test_read_your_writes_token(self):
+        """登录用户写入后，从其他客户端（无 Cookie）的读请求同样固定走主库"""
+        user = User.objects.create_user(username='writer', email='writer@example.com', password='pass12345')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        self.client.post('/write/', **auth)
+        self.client.cookies.clear()
+        self.assertEqual(self.read(**auth), 'default')
+        self.assertEqual(self.read(), 'replica')
+
+        cache.delete(db_router.PIN_KEY.format(user.uid))
+        self.assertEqual(self.read(**auth), 'replica')
+
+    def test_async_routing(self):
+        def request(method, url):
+            return async_to_sync(getattr(self.async_client, method))(url)
+
+        self.assertEqual(json.loads(request('get', '/read/').content)['db'], 'replica')
+        response = request('post', '/write/')
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_router(self):
+        primary_router = db_router.PrimaryReplicaRouter()
+        # 没有路由状态（后台任务、管理命令）时始终使用主库
+        self.assertEqual(primary_router.db_for_read(User), 'default')
+        self.assertIs(primary_router.allow_migrate('replica', 'users'), False)
+        self.assertIsNone(primary_router.allow_migrate('default', 'users'))
+
+        token = db_router.activate(db_router.RoutingState('replica'))
+        try:
+            self.assertEqual(primary_router.db_for_read(User), 'replica')
+            self.assertEqual(primary_router.db_for_write(User), 'default')
+            self.assertEqual(primary_router.db_for_read(User), 'default')
+        finally:
+            db_router.deactivate(token)
@@ -0,0 +1,106 @@
+import gc
+import logging
+import threading
+from logging.handlers import QueueListener
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from utils.log import LOG_DROPPED, QueuedHandler, SamplingFilter
+from utils.metrics import registry
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.threads = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.threads.append(threading.current_thread().name)
+
+
+def make_record(name, level, msg='event %s', args=(1,)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class SamplingFilterTests(SimpleTestCase):
+    def test_longest_prefix(self):
+        sampling = SamplingFilter({'api': 0.5, 'api.v1.views.sfpr': 0, 'django.server': 2})
+        self.assertEqual(sampling.rate('api.v1.views.sfpr'), 0)
+        self.assertEqual(sampling.rate('api.v1.views.users'), 0.5)
+        self.assertEqual(sampling.rate('django.server'), 1.0)
+        self.assertEqual(sampling.rate('apps.sfpr'), 1.0)
+
+    def test_only_samples_info_and_below(self):
+        sampling = SamplingFilter({'api': 0})
+        self.assertFalse(sampling.filter(make_record('api.v1', logging.INFO)))
+        self.assertFalse(sampling.filter(make_record('api.v1', logging.DEBUG)))
+        self.assertTrue(sampling.filter(make_record('api.v1', logging.WARNING)))
+        self.assertTrue(sampling.filter(make_record('apps.sfpr', logging.INFO)))
+
+        with mock.patch('utils.log.random.random', side_effect=[0.2, 0.8]):
+            sampling = SamplingFilter({'api': 0.5})
+            self.assertTrue(sampling.filter(make_record('api.v1', logging.INFO)))
+            self.assertFalse(sampling.filter(make_record('api.v1', logging.INFO)))
+
+
+class QueuedHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.target = RecordingHandler()
+        self.target.name = 'test-queue-target'
+        self.handler = QueuedHandler(handlers=['test-queue-target'], maxsize=2)
+        self.addCleanup(self.target.close)
+        self.addCleanup(self.handler.close)
+
+    def test_formats_in_listener_thread(self):
+        self.handler.handle(make_record('api.v1', logging.INFO, 'player %s created', (42,)))
+        self.handler.stop()
+        self.assertEqual(self.target.messages, ['player 42 created'])
+        self.assertNotEqual(self.target.threads[0], threading.current_thread().name)
+
+    def test_restarts_after_fork(self):
+        self.handler.handle(make_record('api.v1', logging.INFO))
+        inherited, parent_listener = self.handler.queue, self.handler.listener
+        self.addCleanup(parent_listener.stop)
+        # 模拟 fork 出的子进程：记录的进程号与当前进程不同
+        self.handler._pid = -1
+        self.handler.handle(make_record('api.v1', logging.INFO))
+        self.assertIsNot(self.handler.queue, inherited)
+        self.handler.stop()
+        self.assertIn('event 1', self.target.messages)
+
+    def test_keeps_targets_alive(self):
+        # 目标 handler 只按名称登记（弱引用），垃圾回收后仍能写入
+        target = RecordingHandler()
+        target.name = 'test-queue-collected'
+        handler = QueuedHandler(handlers=['test-queue-collected'])
+        self.addCleanup(handler.close)
+        del target
+        gc.collect()
+        handler.handle(make_record('api.v1', logging.INFO))
+        handler.stop()
+        self.assertEqual(handler.targets[0].messages, ['event 1'])
+
+    def test_start_failure_does_not_raise(self):
+        with mock.patch.object(QueueListener, 'start', side_effect=RuntimeError), \
+                mock.patch.object(self.handler, 'handleError') as handle_error:
+            self.handler.handle(make_record('api.v1', logging.ERROR))
+        handle_error.assert_called_once()
+
+    def test_missing_target(self):
+        with self.assertRaises(ValueError):
+            QueuedHandler(handlers=['test-queue-missing'])
+
+    @override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='')
+    def test_drops_when_full(self):
+        # 监听线程停止后队列不再被消费
+        self.handler.start()
+        self.handler.listener.stop()
+        self.handler.listener = None
+        for _ in range(3):
+            self.handler.handle(make_record('api.v1', logging.ERROR))
+        registry.flush()
+        dropped = next(m for m in registry.snapshot() if m['name'] == LOG_DROPPED.name)
+        self.assertIn({'level': 'ERROR'}, [sample['labels'] for sample in dropped['samples']])
@@ -0,0 +1,59 @@
+import os
+import signal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from utils import memory
+
+User = get_user_model()
+
+
+@override_settings(METRICS_REDIS_URL='', WORKER_MEMORY_CHECK_INTERVAL=30)
+class MemoryWatchdogTests(SimpleTestCase):
+    def setUp(self):
+        memory._local_reports.clear()
+
+    def test_process_memory(self):
+        stats = memory.process_memory()
+        self.assertGreater(stats['rss'], 0)
+        if stats['uss'] is not None:
+            self.assertLessEqual(stats['uss'], stats['rss'])
+
+    @override_settings(WORKER_MAX_MEMORY_MB=0)
+    def test_reports_without_limit(self):
+        with mock.patch('os.kill') as kill:
+            self.assertFalse(memory.MemoryWatchdog(worker_id=3).check())
+        kill.assert_not_called()
+        [report] = memory.worker_reports()
+        self.assertEqual((report['pid'], report['worker']), (os.getpid(), 3))
+
+    @override_settings(WORKER_MAX_MEMORY_MB=1)
+    def test_recycles_over_limit(self):
+        with mock.patch.object(memory, 'process_memory',
+                               return_value={'rss': 300 << 20, 'pss': 200 << 20, 'uss': 2 << 20, 'shared': 0}), \
+                mock.patch('os.kill') as kill:
+            self.assertTrue(memory.MemoryWatchdog().check())
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+
+    @override_settings(WORKER_MAX_MEMORY_MB=100)
+    def test_shared_memory_not_counted(self):
+        """RSS 中的共享页面不计入回收判断"""
+        with mock.patch.object(memory, 'process_memory',
+                               return_value={'rss': 300 << 20, 'pss': 120 << 20, 'uss': 50 << 20, 'shared': 250 << 20}), \
+                mock.patch('os.kill') as kill:
+            self.assertFalse(memory.MemoryWatchdog().check())
+        kill.assert_not_called()
+
+
+class WorkerMemoryViewTests(TestCase):
+    def test_endpoint(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/monitoring/memory/').status_code, 401)
+        client.force_authenticate(user=admin)
+        response = client.get('/api/v1/monitoring/memory/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['current']['pid'], os.getpid())
@@ -0,0 +1,87 @@
+from unittest import mock
+
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from utils.metrics import MetricsRegistry, estimate_quantile, metrics_redis, render_prometheus
+from utils.redis_client import get_redis_client
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='', METRICS_FLUSH_INTERVAL=60)
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.histogram = self.registry.histogram(
+            'test_latency_seconds', '测试延迟', labelnames=('route',), buckets=(0.1, 0.5, 1.0)
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        """测试直方图输出累积桶"""
+        for value in (0.05, 0.2, 0.3, 2.0):
+            self.histogram.observe(value, route='player-list')
+        sample = self.registry.snapshot()[0]['samples'][0]
+        self.assertEqual(sample['labels'], {'route': 'player-list'})
+        self.assertEqual([count for _, count in sample['buckets']], [1, 3, 3, 4])
+        self.assertEqual(sample['count'], 4)
+        self.assertAlmostEqual(sample['sum'], 2.55)
+
+    def test_quantile_estimate(self):
+        """测试分位数线性插值"""
+        buckets = [(0.1, 50.0), (0.5, 100.0), (float('inf'), 100.0)]
+        self.assertAlmostEqual(estimate_quantile(0.5, buckets), 0.1)
+        self.assertAlmostEqual(estimate_quantile(0.75, buckets), 0.3)
+        self.assertIsNone(estimate_quantile(0.5, []))
+
+    def test_render_prometheus(self):
+        """测试 Prometheus 文本格式"""
+        self.histogram.observe(0.2, route='player-list')
+        text = render_prometheus(self.registry.snapshot())
+        self.assertIn('# TYPE test_latency_seconds histogram', text)
+        self.assertIn('test_latency_seconds_bucket{route="player-list",le="0.5"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="player-list",le="+Inf"} 1', text)
+        self.assertIn('test_latency_seconds_count{route="player-list"} 1', text)
+
+    def test_labels_must_match(self):
+        with self.assertRaises(ValueError):
+            self.histogram.observe(0.1, method='GET')
+
+    @override_settings(METRICS_REDIS_URL='redis://metrics')
+    def test_flush_to_redis_batches_and_retries(self):
+        """测试增量通过一次 pipeline 写入 Redis，失败时保留待下次写入"""
+        client = mock.Mock()
+        pipe = client.pipeline.return_value
+        pipe.execute.side_effect = redis.ConnectionError
+        with mock.patch('utils.metrics.get_redis_client', return_value=client):
+            self.histogram.observe(0.2, route='player-list')
+            self.registry.flush()
+            self.assertEqual(pipe.hincrbyfloat.call_count, 3)
+
+            pipe.execute.side_effect = None
+            pipe.reset_mock()
+            self.registry.flush()
+        keys = {call.args[0] for call in pipe.hincrbyfloat.call_args_list}
+        self.assertEqual(keys, {'metrics:test_latency_seconds'})
+        self.assertEqual(pipe.hincrbyfloat.call_count, 3)
+        pipe.execute.assert_called_once()
+
+    def test_record_does_not_flush_inline(self):
+        """测试请求线程只累加增量，写入交给后台线程"""
+        with override_settings(METRICS_FLUSH_INTERVAL=0), \
+                mock.patch.object(self.registry, 'flush') as flush, \
+                mock.patch('utils.metrics.threading.Thread') as thread:
+            self.histogram.observe(0.2, route='player-list')
+            self.histogram.observe(0.3, route='player-list')
+        flush.assert_not_called()
+        thread.assert_called_once()
+        self.assertTrue(thread.call_args.kwargs['daemon'])
+        thread.return_value.start.assert_called_once()
+
+    @override_settings(METRICS_REDIS_URL='redis://metrics', METRICS_REDIS_TIMEOUT=0.25)
+    def test_metrics_client_has_short_timeouts(self):
+        """测试指标客户端带超时，且不与同一 URL 的共享客户端共用连接池"""
+        client = metrics_redis()
+        kwargs = client.connection_pool.connection_kwargs
+        self.assertEqual(kwargs['socket_timeout'], 0.25)
+        self.assertEqual(kwargs['socket_connect_timeout'], 0.25)
+        self.assertIsNot(client, get_redis_client('redis://metrics'))
+        self.assertIsNone(get_redis_client('redis://metrics').connection_pool.connection_kwargs.get('socket_timeout'))
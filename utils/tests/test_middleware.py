@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from utils import timing
+from utils.cache_backends import InstrumentedLocMemCache
+from utils.metrics import registry
+
+User = get_user_model()
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='')
+class ServerTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _request_count(self, route):
+        for metric in registry.snapshot():
+            if metric['name'] == 'http_request_duration_seconds':
+                return sum(
+                    sample['count'] for sample in metric['samples']
+                    if sample['labels']['route'] == route
+                )
+        return 0
+
+    def test_server_timing_header(self):
+        """测试响应包含各分段耗时"""
+        before = self._request_count('player-list')
+        response = self.client.get('/api/v1/players/')
+        self.assertEqual(response.status_code, 200)
+        header = response['Server-Timing']
+        for name in ('db', 'view', 'serialize', 'total'):
+            self.assertIn(f'{name};dur=', header)
+        self.assertEqual(self._request_count('player-list'), before + 1)
+
+    def test_unmatched_route(self):
+        response = self.client.get('/api/v1/does-not-exist/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_cache_timing_not_double_counted(self):
+        """测试缓存方法内部互相调用时只计一次"""
+        cache = InstrumentedLocMemCache('timing-test', {})
+        timings, token = timing.activate()
+        try:
+            cache.get_or_set('key', 'value')
+        finally:
+            timing.deactivate(token)
+        self.assertEqual(timings.counts['cache'], 1)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='', METRICS_SCRAPE_TOKEN='secret-token')
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/v1/monitoring/metrics/'
+
+    def test_requires_token_or_superuser(self):
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+        response = self.client.get(self.url, HTTP_X_METRICS_TOKEN='wrong')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_prometheus_format_with_token(self):
+        self.client.get('/api/v1/players/')
+        response = self.client.get(self.url, HTTP_X_METRICS_TOKEN='secret-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds_bucket{', response.content)
+
+    def test_json_format_for_superuser(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.client.force_authenticate(user=admin)
+        self.client.get('/api/v1/players/')
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        latency = next(m for m in response.json() if m['name'] == 'http_request_duration_seconds')
+        sample = next(s for s in latency['samples'] if s['labels']['route'] == 'player-list')
+        self.assertIn('p99', sample)
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from utils.management.commands.startup_report import parse_importtime, summarize_imports
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+startup-report: phase=wsgi
+import time:      2000 |       2000 |     django.db
+import time:      3000 |       5000 |   django.core.wsgi
+import time:      1000 |       1000 |   PIL
+import time:       500 |       6500 | config.wsgi
+Traceback line that is not an import
+startup-report: phase=first_request
+import time:      4000 |       4000 | api.v1.urls
+"""
+
+
+class OpenAPISchemaTests(TestCase):
+    def setUp(self):
+        self.schema_file = os.path.join(tempfile.mkdtemp(), 'openapi', 'schema.json')
+
+    def test_generate_and_serve(self):
+        with override_settings(OPENAPI_SCHEMA_FILE=self.schema_file):
+            live = self.client.get('/api/docs/', {'format': 'openapi'})
+            self.assertEqual(live.status_code, 200)
+
+            call_command('generate_openapi_schema', stdout=StringIO())
+            with open(self.schema_file, 'rb') as f:
+                content = f.read()
+            response = self.client.get('/api/docs/', {'format': 'openapi'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['Content-Type'], 'application/openapi+json')
+        # 与实时生成的内容一致（预生成的 schema 不含请求相关的 host/schemes）
+        expected = json.loads(live.content)
+        expected.pop('host', None)
+        expected.pop('schemes', None)
+        self.assertEqual(json.loads(content), expected)
+
+    def test_ui(self):
+        response = self.client.get('/api/docs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'swagger', response.content.lower())
+
+
+class StartupReportTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        phases = parse_importtime(IMPORTTIME_OUTPUT)
+        self.assertEqual([module for module, *_ in phases['wsgi']], ['django.db', 'django.core.wsgi', 'PIL', 'config.wsgi'])
+        summary = summarize_imports(phases['wsgi'], top=5)
+        self.assertAlmostEqual(summary['total_seconds'], 0.0065)
+        self.assertEqual(summary['packages'][0], ('django', 0.005))
+        # 只有一个入口模块时列出它直接导入的模块
+        self.assertEqual([module for module, _ in summary['modules']], ['django.core.wsgi', 'PIL'])
+        self.assertEqual(summarize_imports(phases['first_request'], top=5)['modules'], [('api.v1.urls', 0.004)])
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from utils.profiling import SamplingProfiler
+
+User = get_user_model()
+
+
+def busy_loop():
+    total = 0
+    for i in range(200000):
+        total += i * i
+    return total
+
+
+class SamplingProfilerTests(TestCase):
+    def test_collects_stacks_below_root(self):
+        with SamplingProfiler(0.0005) as profiler:
+            busy_loop()
+        self.assertTrue(profiler.stacks)
+        tree = profiler.call_tree()
+        self.assertEqual(tree['value'], sum(profiler.stacks.values()))
+        self.assertTrue(tree['children'][0]['name'].startswith('busy_loop'))
+        self.assertIn('busy_loop', profiler.folded())
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.user = User.objects.create_user(username='normal', email='normal@example.com', password='pass12345')
+
+    def _token(self, user):
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    def test_ignored_for_anonymous_and_regular_users(self):
+        response = self.client.get('/api/v1/players/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get('/api/v1/players/?_profile=1', HTTP_AUTHORIZATION=self._token(self.user))
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_superuser_request_is_profiled(self):
+        response = self.client.get(
+            '/api/v1/players/', HTTP_X_PROFILE='1', HTTP_X_REQUEST_ID='req-123',
+            HTTP_AUTHORIZATION=self._token(self.admin),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile-Id'], 'req-123')
+
+        self.client.force_authenticate(user=self.admin)
+        listing = self.client.get('/api/v1/monitoring/profiles/').json()
+        self.assertEqual(listing[0]['id'], 'req-123')
+        self.assertEqual(listing[0]['route'], 'player-list')
+
+        detail = self.client.get('/api/v1/monitoring/profiles/req-123/').json()
+        self.assertEqual(detail['mode'], 'sample')
+        self.assertIn('call_tree', detail)
+        folded = self.client.get('/api/v1/monitoring/profiles/req-123/', {'format': 'folded'})
+        self.assertEqual(folded.status_code, 200)
+        self.assertEqual(folded.content.decode(), detail['folded'])
+
+    def test_cprofile_mode(self):
+        response = self.client.get(
+            '/api/v1/players/?_profile=cprofile', HTTP_AUTHORIZATION=self._token(self.admin)
+        )
+        self.client.force_authenticate(user=self.admin)
+        detail = self.client.get(f'/api/v1/monitoring/profiles/{response["X-Profile-Id"]}/').json()
+        self.assertEqual(detail['mode'], 'cprofile')
+        self.assertTrue(detail['functions'])
+
+    def test_profile_endpoints_require_superuser(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/api/v1/monitoring/profiles/').status_code, 403)
+        self.assertEqual(self.client.get('/api/v1/monitoring/profiles/missing/').status_code, 403)
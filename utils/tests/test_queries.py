@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from utils.queries import normalize_sql, record_queries
+
+User = get_user_model()
+
+
+class QueryRecorderTests(TestCase):
+    def test_normalize_placeholder_lists(self):
+        """测试 IN 参数个数不同的查询归为同一形态"""
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            normalize_sql('SELECT * FROM t WHERE id IN (%s)'.replace('(%s)', '(%s,%s)')),
+        )
+
+    def test_repeated_shapes(self):
+        """测试相同形态的查询被识别为疑似 N+1"""
+        users = [
+            User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pass12345')
+            for i in range(5)
+        ]
+        with record_queries() as recorder:
+            for user in users:
+                User.objects.get(pk=user.pk)
+            User.objects.count()
+        self.assertEqual(recorder.count, 6)
+        repeated = recorder.repeated(5)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 5)
+        self.assertGreater(recorder.duration, 0)
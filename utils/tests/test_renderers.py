@@ -0,0 +1,107 @@
+import datetime
+import gzip
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import brotli
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.sfpr.models import Player, Record
+from utils import middleware
+from utils.middleware import negotiate_encoding
+from utils.renderers import ORJSONRenderer
+
+User = get_user_model()
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_same_output_as_json_renderer(self):
+        data = {
+            'id': uuid.uuid4(),
+            'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'amount': Decimal('1.50'),
+            'label': _('昵称'),
+            'error': [ErrorDetail('无效', code='invalid')],
+            'text': '行\u2028分隔\u2029"引号" \\ 玩家',
+            'nested': {1: [True, None, 0, -3]},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indent_falls_back(self):
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+        self.assertEqual(ORJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+
+    def test_non_finite_float_raises(self):
+        """测试 NaN/Infinity 与 JSONRenderer 一样抛出异常，而不是输出 null"""
+        for value in (float('nan'), float('inf'), float('-inf')):
+            data = {'results': [{'score': None, 'ratio': value}]}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                ORJSONRenderer().render(data)
+        data = {'score': None, 'ratio': 0.5}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class NegotiateEncodingTests(SimpleTestCase):
+    def test_negotiate(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=0, *'), 'gzip')
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding(''))
+        with mock.patch.object(middleware, 'brotli', None):
+            self.assertEqual(negotiate_encoding('br, gzip'), 'gzip')
+            self.assertIsNone(negotiate_encoding('br'))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class ResponseEncodingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='submitter', email='submitter@example.com', password='pass12345')
+        player = Player.objects.create(nickname='玩家', game_id='id1', server=1)
+        for i in range(20):
+            Record.objects.create(player=player, description=f'神人事迹{i}' * 5, submitter=user,
+                                  image_1=f'records/{player.id}/{i}/image.jpg')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_compression(self):
+        plain = self.client.get('/api/v1/records/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        for encoding, decompress in (('gzip', gzip.decompress), ('br', brotli.decompress)):
+            response = self.client.get('/api/v1/records/', HTTP_ACCEPT_ENCODING=f'{encoding}')
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(int(response['Content-Length']), len(response.content))
+            self.assertLess(len(response.content), len(plain.content) / 3)
+            self.assertEqual(decompress(response.content), plain.content)
+            self.assertIn('compress;dur=', response['Server-Timing'])
+
+    def test_small_response_not_compressed(self):
+        response = self.client.get('/api/v1/users/config/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_msgpack(self):
+        expected = self.client.get('/api/v1/records/').json()
+        response = self.client.get('/api/v1/records/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+        # 未显式请求时仍返回 JSON
+        self.assertEqual(self.client.get('/api/v1/records/', HTTP_ACCEPT='*/*')['Content-Type'], 'application/json')
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from utils import slow_queries
+
+User = get_user_model()
+
+SAMPLE_PLAN = [{
+    'Plan': {
+        'Node Type': 'Sort',
+        'Plans': [{
+            'Node Type': 'Hash Join',
+            'Plans': [
+                {'Node Type': 'Seq Scan', 'Relation Name': 'sfpr_record'},
+                {'Node Type': 'Index Scan', 'Relation Name': 'sfpr_player'},
+            ],
+        }],
+    },
+}]
+
+
+@override_settings(
+    SLOW_QUERY_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1.0,
+    SLOW_QUERY_MAX_PER_MINUTE=1000, SLOW_QUERY_DEDUP_SECONDS=60, SLOW_QUERY_REDIS_URL='', API_CACHE_ENABLED=False,
+)
+class SlowQueryCaptureTests(TestCase):
+    def setUp(self):
+        slow_queries._local_buffer.clear()
+        slow_queries._recent_shapes.clear()
+        slow_queries._limiter = slow_queries._RateLimiter()
+
+    def test_plan_flags(self):
+        self.assertEqual(
+            slow_queries.plan_flags(SAMPLE_PLAN),
+            ['seq_scan:sfpr_record', 'sort:sfpr_player', 'sort:sfpr_record'],
+        )
+
+    def test_params_shape_hides_values(self):
+        shape = slow_queries.params_shape(['secret@example.com', 3, None, [1, 2]])
+        self.assertEqual(shape, ['str(18)', 'int', 'None', 'list[2]'])
+
+    def test_captures_query_with_origin_and_dedup(self):
+        with mock.patch.object(slow_queries, 'explain', return_value=SAMPLE_PLAN):
+            User.objects.filter(email='secret@example.com').exists()
+            User.objects.filter(email='other@example.com').exists()
+        entries = [e for e in slow_queries.recent_slow_queries() if 'users_user' in e['sql']]
+        # 同一形态在去重窗口内只捕获一次
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertIn('seq_scan:sfpr_record', entry['flags'])
+        self.assertIn('str(18)', entry['params_shape'])
+        self.assertNotIn('secret@example.com', str(entry))
+        self.assertTrue(entry['origin'][0].startswith('utils/tests/test_slow_queries.py'))
+
+    @override_settings(SLOW_QUERY_MAX_PER_MINUTE=1, SLOW_QUERY_DEDUP_SECONDS=0)
+    def test_rate_limited(self):
+        User.objects.count()
+        User.objects.exists()
+        User.objects.filter(username='x').exists()
+        self.assertEqual(len(slow_queries.recent_slow_queries()), 1)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=10_000)
+    def test_fast_queries_ignored(self):
+        User.objects.count()
+        self.assertEqual(slow_queries.recent_slow_queries(), [])
+
+    def test_admin_endpoint(self):
+        client = APIClient()
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        user = User.objects.create_user(username='normal', email='normal@example.com', password='pass12345')
+        client.force_authenticate(user=user)
+        self.assertEqual(client.get('/api/v1/monitoring/slow-queries/').status_code, 403)
+
+        client.force_authenticate(user=admin)
+        client.get('/api/v1/players/')
+        response = client.get('/api/v1/monitoring/slow-queries/', {'route': 'player-list'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json())
+        self.assertTrue(all(entry['route'] == 'player-list' for entry in response.json()))
+
+    def test_admin_page(self):
+        """测试后台只读页面展示执行计划，仅超级管理员可访问"""
+        slow_queries.store({
+            'time': '2024-05-01T12:00:00+00:00', 'duration_ms': 812.5, 'database': 'default',
+            'route': 'record-list', 'origin': ['api/v1/views/sfpr.py:10 in list'],
+            'sql': 'SELECT * FROM sfpr_record ORDER BY created_at', 'params_shape': [],
+            'plan': SAMPLE_PLAN, 'flags': slow_queries.plan_flags(SAMPLE_PLAN),
+        })
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass12345',
+                                         is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/admin/slow-queries/').status_code, 403)
+
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/slow-queries/', {'flag': 'seq_scan'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'SELECT * FROM sfpr_record ORDER BY created_at')
+        self.assertContains(response, '&quot;Node Type&quot;: &quot;Hash Join&quot;')
+        response = self.client.get('/admin/slow-queries/', {'route': 'player-list'})
+        self.assertContains(response, '暂无慢查询')
+
+        self.client.logout()
+        self.assertEqual(self.client.get('/admin/slow-queries/').status_code, 302)
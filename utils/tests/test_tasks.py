@@ -0,0 +1,97 @@
+from unittest import mock
+
+from celery.app.routes import Router, prepare
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from apps.users.tasks import delete_user_account
+from config.celery import app
+from utils import tasks
+from utils.metrics import registry
+
+calls = []
+
+
+@app.task(base=tasks.ImageTask, name='utils.tests.resize_image')
+def resize_image(name, size):
+    calls.append((name, size))
+    if size < 0:
+        raise ValueError(size)
+    return size
+
+
+@app.task(base=tasks.CounterTask, name='utils.tests.count')
+def count():
+    return 1
+
+
+class TaskRoutingTests(SimpleTestCase):
+    def route(self, task, router=None):
+        # 与 apply_async 相同：任务类上的选项再经过路由表
+        router = router or app.amqp.router
+        return router.route(task._get_exec_options(), task.name, task_type=task)['queue'].name
+
+    def test_queues(self):
+        self.assertEqual(self.route(resize_image), 'images')
+        self.assertEqual(self.route(count), 'counters')
+        self.assertEqual(self.route(delete_user_account), 'maintenance')
+        # 按名称配置的路由优先于基类的队列
+        routes = prepare(({'utils.tests.count': {'queue': 'maintenance'}}, 'utils.tasks.route_task'))
+        router = Router(routes, app.amqp.queues, app=app)
+        self.assertEqual(self.route(count, router), 'maintenance')
+
+    def test_ack_settings(self):
+        self.assertTrue(resize_image.acks_late)
+        self.assertTrue(delete_user_account.acks_late)
+        self.assertFalse(count.acks_late)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='')
+class IdempotentTaskTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        calls.clear()
+
+    def test_skips_completed_and_running(self):
+        self.assertEqual(resize_image.apply(args=('a.png', 64)).get(), 64)
+        self.assertIsNone(resize_image.apply(args=('a.png', 64)).get())
+        self.assertEqual(resize_image.apply(args=('b.png', 64)).get(), 64)
+        self.assertEqual(calls, [('a.png', 64), ('b.png', 64)])
+
+        with mock.patch.object(cache, 'add', return_value=False):
+            self.assertIsNone(resize_image.apply(args=('c.png', 64)).get())
+        self.assertEqual(len(calls), 2)
+
+    def test_failure_releases_lock(self):
+        self.assertEqual(resize_image.apply(args=('a.png', -1)).state, 'FAILURE')
+        self.assertEqual(resize_image.apply(args=('a.png', -1)).state, 'FAILURE')
+        self.assertEqual(len(calls), 2)
+
+    def test_duration_metrics(self):
+        resize_image.apply(args=('a.png', 32))
+        registry.flush()
+        samples = next(m for m in registry.snapshot() if m['name'] == tasks.TASK_DURATION.name)['samples']
+        labels = [sample['labels'] for sample in samples]
+        self.assertIn({'task': 'utils.tests.resize_image', 'queue': 'images', 'state': 'SUCCESS'}, labels)
+
+
+class QueueDepthTests(SimpleTestCase):
+    @override_settings(CELERY_BROKER_URL='redis://broker:6379/2')
+    def test_sums_priority_lists(self):
+        client = mock.Mock()
+        pipe = client.pipeline.return_value
+        lengths = {'email': 2, 'email\x06\x163': 1, 'images': 5}
+        pipe.llen.side_effect = lambda name: lengths.setdefault(name, 0)
+        pipe.execute.side_effect = lambda: [lengths[call.args[0]] for call in pipe.llen.call_args_list]
+        with mock.patch('utils.tasks.get_redis_client', return_value=client):
+            depths = tasks.queue_depths()
+            metric = tasks.queue_depth_metric()
+        self.assertEqual(depths['email'], 3)
+        self.assertEqual(depths['images'], 5)
+        self.assertEqual(depths['maintenance'], 0)
+        self.assertEqual(metric['type'], 'gauge')
+
+    @override_settings(CELERY_BROKER_URL='memory://')
+    def test_non_redis_broker(self):
+        self.assertEqual(tasks.queue_depths(), {})
+        self.assertIsNone(tasks.queue_depth_metric())
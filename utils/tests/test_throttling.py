@@ -0,0 +1,111 @@
+import time
+from unittest import mock
+
+import redis
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from utils import throttling
+from utils.metrics import registry
+
+User = get_user_model()
+
+BUDGETS = {
+    'default': {'anon': ('60/min', 2), 'user': ('60/min', 3), 'superuser': None},
+    'player-search': {'anon': ('1/min', 1)},
+    'verify-code-email': ('1/min', 1),
+}
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_REDIS_URL='', THROTTLE_BUDGETS=BUDGETS)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        throttling.local_buckets.clear()
+
+    def test_budgets(self):
+        self.assertEqual(throttling.parse_rate('30/min'), 0.5)
+        self.assertEqual(throttling.parse_rate('2/s'), 2)
+        self.assertEqual(throttling.get_budget('player-search', 'anon'), (1 / 60, 1))
+        # 范围中未配置的身份与未配置的范围使用 default
+        self.assertEqual(throttling.get_budget('player-search', 'user'), (1, 3))
+        self.assertEqual(throttling.get_budget('record-list', 'anon'), (1, 2))
+        self.assertIsNone(throttling.get_budget('record-list', 'superuser'))
+        self.assertEqual(throttling.get_budget('verify-code-email', 'user'), (1 / 60, 1))
+
+    def test_burst_and_refill(self):
+        now = time.monotonic()
+        with mock.patch('utils.throttling.time.monotonic', return_value=now):
+            self.assertTrue(throttling.consume('record-list', '1.2.3.4').allowed)
+            self.assertTrue(throttling.consume('record-list', '1.2.3.4').allowed)
+            decision = throttling.consume('record-list', '1.2.3.4')
+            self.assertFalse(decision.allowed)
+            self.assertAlmostEqual(decision.wait, 1)
+            self.assertEqual(throttling.retry_after(decision), '1')
+            # 不同 IP 的桶互不影响
+            self.assertTrue(throttling.consume('record-list', '5.6.7.8').allowed)
+        with mock.patch('utils.throttling.time.monotonic', return_value=now + 1):
+            self.assertTrue(throttling.consume('record-list', '1.2.3.4').allowed)
+
+    @override_settings(THROTTLE_REDIS_URL='redis://throttle', METRICS_ENABLED=True, METRICS_REDIS_URL='')
+    def test_redis(self):
+        script = mock.Mock(return_value=[0, '2.5', '0.5'])
+        client = mock.Mock()
+        client.register_script.return_value = script
+        with mock.patch('utils.throttling.get_redis_client', return_value=client), \
+                mock.patch.dict(throttling._scripts, clear=True):
+            decision = throttling.consume('player-search', 'u1', 'user')
+            self.assertEqual(decision, (False, 2.5, 0.5))
+            script.assert_called_once_with(keys=['throttle:player-search:user:u1'], args=[1, 3, 1])
+
+            # Redis 不可用时放行
+            script.side_effect = redis.ConnectionError
+            self.assertIsNone(throttling.consume('player-search', 'u1', 'user'))
+        registry.flush()
+        samples = next(m for m in registry.snapshot() if m['name'] == throttling.THROTTLE_REQUESTS.name)['samples']
+        results = {sample['labels']['result'] for sample in samples if sample['labels']['scope'] == 'player-search'}
+        self.assertLessEqual({'throttled', 'error'}, results)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_REDIS_URL='', THROTTLE_BUDGETS=BUDGETS, API_CACHE_ENABLED=False)
+class ThrottledEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user', email='user@example.com', password='pass12345')
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pass12345')
+
+    def setUp(self):
+        throttling.local_buckets.clear()
+        self.client = APIClient()
+
+    def test_anonymous(self):
+        path = '/api/v1/players/search/'
+        self.assertEqual(self.client.get(path, {'nickname': 'a'}).status_code, 200)
+        response = self.client.get(path, {'nickname': 'a'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        # 按客户端 IP 限流，代理追加在 X-Forwarded-For 最后的地址
+        response = self.client.get(path, {'nickname': 'a'}, HTTP_X_FORWARDED_FOR='10.0.0.1, 10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_users_and_superusers(self):
+        self.client.force_authenticate(self.user)
+        statuses = [self.client.get('/api/v1/players/search/', {'nickname': 'a'}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+        self.client.force_authenticate(self.admin)
+        statuses = [self.client.get('/api/v1/players/search/', {'nickname': 'a'}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200] * 4)
+
+    def test_verify_code_per_email(self):
+        path = '/api/v1/users/send_verify_code/'
+        self.assertEqual(self.client.post(path, {'email': 'new@example.com'}).status_code, 200)
+        response = self.client.post(path, {'email': 'new@example.com'}, HTTP_X_FORWARDED_FOR='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # 重置密码与注册共用同一邮箱的额度
+        response = self.client.post('/api/v1/users/send_reset_code/', {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/v1/users/send_reset_code/', {'email': 'user@example.com'},
+                                    HTTP_X_FORWARDED_FOR='10.0.0.4')
+        self.assertEqual(response.status_code, 400)
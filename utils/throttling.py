@@ -0,0 +1,194 @@
+"""
+基于 Redis 的分布式限流（令牌桶）
+
+每个 (范围, 身份等级, 用户或 IP) 一个桶：容量为突发额度，按速率补充令牌，请求消耗一个令牌，
+没有令牌时返回 429 与 Retry-After。补充、检查与扣减在一个 Lua 脚本中完成，时间取 Redis 服务器时间，
+每次检查只有一次 Redis 往返，所有工作进程与容器共享同一组桶。
+
+范围默认是路由名称（如 player-search），预算见 THROTTLE_BUDGETS：
+    {范围: {'anon' | 'user' | 'superuser': (速率, 突发额度) 或 None（不限制）}}
+也可以直接写 (速率, 突发额度)，对所有身份生效；未配置的范围或身份使用 'default' 中的预算。
+
+THROTTLE_REDIS_URL 为空时使用进程内的桶（本地开发与测试）；Redis 不可用时放行并记录指标，
+限流故障不影响接口可用性。
+"""
+import logging
+import math
+import threading
+import time
+from typing import NamedTuple
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from utils.metrics import registry
+from utils.middleware import route_label
+from utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'throttle:'
+
+THROTTLE_REQUESTS = registry.counter(
+    'throttle_requests_total',
+    '限流检查：result 为 allowed、throttled 或 error（Redis 不可用时放行）',
+    labelnames=('scope', 'tier', 'result'),
+)
+
+# KEYS[1] 桶；ARGV 为每秒补充的令牌数、容量与本次消耗的令牌数。
+# 返回 {是否放行, 需要等待的秒数, 剩余令牌数}，小数以字符串返回（Lua 数字转换为 Redis 整数时会截断）
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(wait), tostring(tokens)}
+"""
+
+_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class Budget(NamedTuple):
+    rate: float  # 每秒补充的令牌数
+    burst: int  # 桶容量
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    wait: float
+    remaining: float
+
+
+def parse_rate(rate):
+    """'30/min' -> 每秒 0.5 个；单位取首字母（s/m/h/d），与 DRF 的写法一致"""
+    count, _, period = rate.partition('/')
+    return int(count) / _PERIODS[period.strip()[0]]
+
+
+def get_budget(scope, tier):
+    """范围与身份对应的预算，None 表示不限制"""
+    budgets = settings.THROTTLE_BUDGETS
+    default = budgets['default']
+    budget = budgets.get(scope, default)
+    if isinstance(budget, dict):
+        budget = budget.get(tier, default.get(tier))
+    if budget is None:
+        return None
+    rate, burst = budget
+    return Budget(parse_rate(rate), int(burst))
+
+
+def user_tier(user):
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    return 'superuser' if user.is_superuser else 'user'
+
+
+class LocalBuckets:
+    """进程内的令牌桶，算法与 Lua 脚本相同"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, budget, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (budget.burst, now))
+            tokens = min(budget.burst, tokens + max(0.0, now - ts) * budget.rate)
+            if tokens >= cost:
+                decision = Decision(True, 0.0, tokens - cost)
+            else:
+                decision = Decision(False, (cost - tokens) / budget.rate, tokens)
+            self._buckets[key] = (decision.remaining, now)
+        return decision
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+local_buckets = LocalBuckets()
+_scripts = {}
+
+
+def _redis_consume(url, key, budget, cost):
+    script = _scripts.get(url)
+    if script is None:
+        # register_script 使用 EVALSHA，脚本未加载时自动改用 EVAL
+        script = _scripts[url] = get_redis_client(url).register_script(TOKEN_BUCKET_SCRIPT)
+    allowed, wait, remaining = script(keys=[key], args=[budget.rate, budget.burst, cost])
+    return Decision(bool(allowed), float(wait), float(remaining))
+
+
+def consume(scope, ident, tier='anon', cost=1):
+    """从 (scope, tier, ident) 的桶中取 cost 个令牌；不限制时返回 None"""
+    if not settings.THROTTLE_ENABLED:
+        return None
+    budget = get_budget(scope, tier)
+    if budget is None:
+        return None
+    key = f'{KEY_PREFIX}{scope}:{tier}:{ident}'
+    url = settings.THROTTLE_REDIS_URL
+    try:
+        if url:
+            decision = _redis_consume(url, key, budget, cost)
+        else:
+            decision = local_buckets.consume(key, budget, cost)
+    except redis.RedisError:
+        logger.warning('限流检查失败，放行请求 %s', scope, exc_info=True)
+        THROTTLE_REQUESTS.inc(scope=scope, tier=tier, result='error')
+        return None
+    THROTTLE_REQUESTS.inc(scope=scope, tier=tier, result='allowed' if decision.allowed else 'throttled')
+    return decision
+
+
+aconsume = sync_to_async(consume, thread_sensitive=False)
+
+
+def retry_after(decision):
+    """Retry-After 头的值（整秒，向上取整）"""
+    return str(max(1, math.ceil(decision.wait)))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF 限流类：范围为视图的 throttle_scope，未设置时为路由名称；
+    已登录用户按用户限流，匿名请求按 IP（NUM_PROXIES 个代理之后的地址）限流
+    """
+
+    def __init__(self):
+        self.decision = None
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None) or route_label(request._request)
+
+    def allow_request(self, request, view):
+        # 异步视图已检查过的请求交给同步视图处理时不再重复扣减
+        if getattr(request._request, 'throttle_checked', False):
+            return True
+        user = request.user
+        tier = user_tier(user)
+        ident = user.pk if tier != 'anon' else self.get_ident(request)
+        self.decision = consume(self.get_scope(request, view), ident, tier)
+        return self.decision is None or self.decision.allowed
+
+    def wait(self):
+        return self.decision.wait if self.decision is not None else None
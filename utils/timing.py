@@ -0,0 +1,68 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    单个请求的分段耗时（秒）
+
+    通过 contextvar 绑定到当前请求，线程/协程之间互不干扰。
+    同名分段嵌套时只统计最外层，避免缓存方法互相调用时重复计时。
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route = None
+        self.durations = {}
+        self.counts = {}
+        self._active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def header(self, total=None):
+        """生成 Server-Timing 头，单位毫秒"""
+        parts = [
+            f'{name};dur={seconds * 1000:.1f}'
+            for name, seconds in self.durations.items()
+        ]
+        if total is not None:
+            parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def activate():
+    """为当前上下文创建新的计时对象，返回 (timings, token)"""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def deactivate(token):
+    _current_timings.reset(token)
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+@contextmanager
+def timed(name):
+    """统计代码块耗时到当前请求的指定分段；不在请求中时不做任何事"""
+    timings = _current_timings.get()
+    if timings is None or name in timings._active:
+        yield
+        return
+    timings._active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._active.discard(name)
+        timings.add(name, time.perf_counter() - start)